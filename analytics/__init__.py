@@ -0,0 +1 @@
+from .pitch_analytics import PitchAnalytics
\ No newline at end of file
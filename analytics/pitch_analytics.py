@@ -0,0 +1,224 @@
+import numpy as np
+import hashlib
+import sys
+sys.path.append('../')
+from view_transformer.view_transformer import DEFAULT_CALIBRATION
+
+TEAMS = [1, 2]
+
+class PitchAnalytics:
+    def __init__(self, num_frames, frame, track_id, team, position, fps=24, court_length=None, court_width=None, cell_size=1.0, chunk_frames=500, batch_frames=100, cache=None, memory_chunks=8):
+        # One row per player and frame with its transformed position in metres, rows outside the
+        # calibrated part of the pitch have no position and are left out
+        self.num_frames = num_frames
+        self.fps = fps
+        self.court_length = DEFAULT_CALIBRATION["court_length"] if court_length is None else court_length
+        self.court_width = DEFAULT_CALIBRATION["court_width"] if court_width is None else court_width
+        self.cell_size = cell_size
+        self.chunk_frames = chunk_frames
+        self.batch_frames = batch_frames
+
+        position = np.asarray(position, dtype=np.float64).reshape(-1,2)
+        valid = ~np.isnan(position).any(axis=1)
+        order = np.argsort(np.asarray(frame)[valid], kind='stable')
+        self.frame = np.asarray(frame, dtype=np.int64)[valid][order]
+        self.track_id = np.asarray(track_id, dtype=np.int64)[valid][order]
+        self.team = np.asarray(team, dtype=np.int8)[valid][order]
+        self.position = position[valid][order]
+
+        # Rows of frame f are bounds[f]:bounds[f+1]
+        self.bounds = np.searchsorted(self.frame, np.arange(num_frames+1))
+
+        # Cell of every row, positions just past the lines are counted in the edge cells
+        self.nx = int(np.ceil(self.court_length/cell_size))
+        self.ny = int(np.ceil(self.court_width/cell_size))
+        self.num_cells = self.nx*self.ny
+        ix = np.clip(np.floor(self.position[:,0]/cell_size).astype(np.int64), 0, self.nx-1)
+        iy = np.clip(np.floor(self.position[:,1]/cell_size).astype(np.int64), 0, self.ny-1)
+        self.cell = iy*self.nx + ix
+
+        # Pitch control per chunk of chunk_frames frames, the most recently used ones stay in memory
+        # and all of them go to the result cache when one is given
+        self.cache = cache
+        self.cache_key = None
+        if cache is not None:
+            self.cache_key = cache.stage_key("pitch_control", data=self.digest(), cell_size=cell_size, court=[self.court_length, self.court_width])
+        self.memory_chunks = memory_chunks
+        self.chunks = {}
+        self.results = {}
+        self.computed = 0
+
+    @classmethod
+    def from_table(cls, table, fps=24, **kwargs):
+        players = table.class_mask("players")
+        return cls(table.num_frames, table.frame[players], table.track_id[players], table.team[players], table.transformed_position[players], fps, **kwargs)
+
+    @classmethod
+    def from_store(cls, store, fps=24, **kwargs):
+        # Same analytics from an exported match, without running the pipeline again
+        rows = store.query(["frame", "track_id", "team", "transformed_position"], obj="players")
+        return cls(store.num_frames, rows["frame"], rows["track_id"], rows["team"], rows["transformed_position"], fps, **kwargs)
+
+    def digest(self):
+        digest = hashlib.sha1()
+        for column in [self.frame, self.track_id, self.team, self.position]:
+            digest.update(np.ascontiguousarray(column).tobytes())
+        digest.update(str(self.num_frames).encode())
+        return digest.hexdigest()
+
+    def frame_range(self, start, end):
+        end = self.num_frames if end is None else min(end, self.num_frames)
+        return max(start, 0), end
+
+    def cached(self, name, start, end, compute):
+        # Results are kept per frame range, overlays and the export ask for the same ones
+        start, end = self.frame_range(start, end)
+        if (name, start, end) not in self.results:
+            self.results[(name, start, end)] = compute(start, end)
+        return self.results[(name, start, end)]
+
+    def team_heatmaps(self, start=0, end=None):
+        # Seconds each team spent in every cell over frames [start, end), {team: (ny, nx)}
+        return self.cached("team_heatmaps", start, end, self.compute_team_heatmaps)
+
+    def compute_team_heatmaps(self, start, end):
+        rows = slice(self.bounds[start], self.bounds[end])
+        team, cell = self.team[rows].astype(np.int64), self.cell[rows]
+        assigned = team > 0
+        counts = np.bincount((team[assigned]-1)*self.num_cells + cell[assigned], minlength=len(TEAMS)*self.num_cells)
+        counts = counts.reshape(len(TEAMS), self.ny, self.nx)/self.fps
+        return {team: counts[i] for i, team in enumerate(TEAMS)}
+
+    def player_heatmaps(self, start=0, end=None):
+        # Track ids and the seconds each of them spent in every cell, (tracks, ny, nx)
+        return self.cached("player_heatmaps", start, end, self.compute_player_heatmaps)
+
+    def compute_player_heatmaps(self, start, end):
+        rows = slice(self.bounds[start], self.bounds[end])
+        track_ids, inverse = np.unique(self.track_id[rows], return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1)*self.num_cells + self.cell[rows], minlength=len(track_ids)*self.num_cells)
+        return track_ids, counts.reshape(len(track_ids), self.ny, self.nx)/self.fps
+
+    def compute_control(self, start, end):
+        # Team of the player nearest to every cell centre for frames [start, end), a Voronoi split of
+        # the pitch between the two teams. Frames without a player of either team are 0
+        num_frames = end - start
+        rows = slice(self.bounds[start], self.bounds[end])
+        frame, team, position = self.frame[rows] - start, self.team[rows], self.position[rows]
+
+        # Players of each team padded to (frames, most players in a frame), missing ones are infinitely far
+        padded = []
+        for t in TEAMS:
+            team_rows = team == t
+            team_frame = frame[team_rows]
+            slot = np.arange(len(team_frame)) - np.searchsorted(team_frame, team_frame)
+            players = np.full((num_frames, slot.max() + 1 if len(slot) > 0 else 1, 2), np.inf)
+            players[team_frame, slot] = position[team_rows]
+            padded.append(players)
+
+        # With about ten players a team, the squared distance from every player to every cell and a
+        # min over the players is much faster than a nearest neighbour search. It is separable,
+        # (x, y) distances are added up over (ny, nx) from per-column and per-row terms
+        xs = (np.arange(self.nx) + 0.5)*self.cell_size
+        ys = (np.arange(self.ny) + 0.5)*self.cell_size
+        grid = np.zeros((num_frames, self.ny, self.nx), dtype=np.int8)
+        for first in range(0, num_frames, self.batch_frames):
+            batch = slice(first, first + self.batch_frames)
+            nearest = []
+            for players in padded:
+                dx = (xs - players[batch,:,0,None])**2
+                dy = (ys - players[batch,:,1,None])**2
+                nearest.append((dy[:,:,:,None] + dx[:,:,None,:]).min(axis=1))
+            grid[batch] = np.where(nearest[0] <= nearest[1], TEAMS[0], TEAMS[1])
+            grid[batch][np.isinf(np.minimum(nearest[0], nearest[1]))] = 0
+
+        self.computed += num_frames
+        return grid
+
+    def control_chunk(self, chunk_start):
+        if chunk_start in self.chunks:
+            # Most recently used last, the first one is evicted
+            self.chunks[chunk_start] = self.chunks.pop(chunk_start)
+            return self.chunks[chunk_start]
+
+        chunk_end = min(chunk_start + self.chunk_frames, self.num_frames)
+        grid = None
+        if self.cache is not None:
+            arrays = self.cache.get_chunk(self.cache_key, chunk_start, chunk_end - chunk_start)
+            if arrays is not None:
+                grid = np.asarray(arrays["control"])
+        if grid is None:
+            grid = self.compute_control(chunk_start, chunk_end)
+            if self.cache is not None:
+                self.cache.put_chunk(self.cache_key, chunk_start, chunk_end - chunk_start, {"control": grid})
+
+        self.chunks[chunk_start] = grid
+        if len(self.chunks) > self.memory_chunks:
+            del self.chunks[next(iter(self.chunks))]
+        return grid
+
+    def control_chunks(self, start=0, end=None):
+        # (first frame, grids) over frames [start, end), one chunk in memory at a time
+        start, end = self.frame_range(start, end)
+        for chunk_start in range(start - start % self.chunk_frames, end, self.chunk_frames):
+            grid = self.control_chunk(chunk_start)
+            first = max(start, chunk_start)
+            yield first, grid[first - chunk_start:end - chunk_start]
+
+    def control(self, start=0, end=None):
+        # Pitch control grids of frames [start, end), (frames, ny, nx) holding 0, 1 or 2
+        grids = [grid for _, grid in self.control_chunks(start, end)]
+        return np.concatenate(grids) if len(grids) > 0 else np.zeros((0, self.ny, self.nx), dtype=np.int8)
+
+    def control_frame(self, frame_num):
+        # One frame for the overlay, served from the chunk it is in
+        chunk_start = frame_num - frame_num % self.chunk_frames
+        return self.control_chunk(chunk_start)[frame_num - chunk_start]
+
+    def control_share(self, start=0, end=None):
+        # Share of the cells each team controls per frame, (frames, 2)
+        return self.cached("control_stats", start, end, self.compute_control_stats)[0]
+
+    def dominance(self, start=0, end=None):
+        # Share of frames each team controlled every cell, {team: (ny, nx)}
+        return self.cached("control_stats", start, end, self.compute_control_stats)[1]
+
+    def compute_control_stats(self, start, end):
+        # Both from one pass over the grids, a full match does not fit in memory at once
+        shares = np.zeros((end - start, len(TEAMS)))
+        counts = np.zeros((len(TEAMS), self.ny, self.nx), dtype=np.int64)
+        for first, grid in self.control_chunks(start, end):
+            for i, team in enumerate(TEAMS):
+                controlled = grid == team
+                shares[first - start:first - start + len(grid), i] = controlled.reshape(len(grid), -1).mean(axis=1)
+                counts[i] += controlled.sum(axis=0)
+        return shares, {team: counts[i]/max(end - start, 1) for i, team in enumerate(TEAMS)}
+
+    def summary(self, start=0, end=None):
+        shares = self.control_share(start, end)
+        heatmaps = self.team_heatmaps(start, end)
+        summary = {"teams": {}}
+        for i, team in enumerate(TEAMS):
+            # Where the team spent most of its time, as the centre of its busiest cell in metres
+            busiest = np.unravel_index(np.argmax(heatmaps[team]), heatmaps[team].shape)
+            summary["teams"][team] = {
+                "control": float(shares[:,i].mean()) if len(shares) > 0 else 0.0,
+                "seconds": float(heatmaps[team].sum()),
+                "busiest_cell": [float((busiest[1] + 0.5)*self.cell_size), float((busiest[0] + 0.5)*self.cell_size)]
+            }
+        return summary
+
+    def save(self, path, start=0, end=None):
+        # Heatmaps and dominance over frames [start, end), per-frame control goes into the track export
+        track_ids, player_heatmaps = self.player_heatmaps(start, end)
+        team_heatmaps = self.team_heatmaps(start, end)
+        dominance = self.dominance(start, end)
+        np.savez_compressed(
+            path,
+            cell_size=self.cell_size,
+            court=np.array([self.court_length, self.court_width]),
+            track_ids=track_ids,
+            player_heatmaps=player_heatmaps,
+            team_heatmaps=np.stack([team_heatmaps[team] for team in TEAMS]),
+            dominance=np.stack([dominance[team] for team in TEAMS])
+        )
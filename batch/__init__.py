@@ -0,0 +1,2 @@
+from .job_state import JobState
+from .batch_runner import run_batch, find_jobs
\ No newline at end of file
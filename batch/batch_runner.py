@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import traceback
+import json
+import time
+import sys
+import os
+sys.path.append('../')
+from trackers import Tracker
+from profiling import Profiler
+from .job_state import JobState
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+def find_jobs(source, output_dir):
+    # A directory of videos, a text manifest with one video per line, or a JSON list of
+    # videos or {"video": ..., "output": ...} entries
+    if os.path.isdir(source):
+        entries = [{"video": os.path.join(source, file_name)} for file_name in sorted(os.listdir(source)) if file_name.lower().endswith(VIDEO_EXTENSIONS)]
+    elif source.endswith('.json'):
+        with open(source) as f:
+            entries = [entry if isinstance(entry, dict) else {"video": entry} for entry in json.load(f)]
+    else:
+        with open(source) as f:
+            entries = [{"video": line.strip()} for line in f if line.strip() and not line.startswith('#')]
+
+    # The job name keys its state file and default output, repeated file names get a suffix
+    jobs = []
+    names = set()
+    for entry in entries:
+        name = base_name = os.path.splitext(os.path.basename(entry["video"]))[0]
+        suffix = 1
+        while name in names:
+            suffix += 1
+            name = f"{base_name}_{suffix}"
+        names.add(name)
+        jobs.append({"name": name, "video": entry["video"], "output": entry.get("output", os.path.join(output_dir, f"{name}.avi"))})
+    return jobs
+
+# Loaded once per worker process by init_worker and reused for every match it runs
+worker_tracker = None
+
+def init_worker(model_path, tracker_params):
+    global worker_tracker
+    worker_tracker = Tracker(model_path, **tracker_params)
+
+def run_job(process, job, state_dir, process_params, profile_dir=None):
+    state = JobState(state_dir, job["name"], job["video"], job["output"])
+    state.start()
+
+    # Every stage main reports through the profiler is timed for the batch report
+    if profile_dir is not None:
+        profiler = Profiler(True, os.path.join(profile_dir, job["name"]), on_stage=state.add_stage)
+    else:
+        profiler = Profiler(on_stage=state.add_stage)
+    try:
+        os.makedirs(os.path.dirname(job["output"]) or '.', exist_ok=True)
+        process(video_path=job["video"], output_path=job["output"], tracker=worker_tracker, profiler=profiler, **process_params)
+    except Exception as e:
+        traceback.print_exc()
+        state.fail(e)
+        return state.data
+
+    state.finish()
+    return state.data
+
+def run_batch(process, jobs, model_path, workers=2, state_dir='batch_state', tracker_params=None, process_params=None, profile_dir=None):
+    # process is main or main_stream, called once per match with its video, output and the worker's tracker
+    tracker_params = tracker_params or {}
+    process_params = process_params or {}
+
+    # Finished matches are skipped, failed and interrupted ones run again from the start and get
+    # their camera movement and detection chunks back from the result cache
+    pending = []
+    skipped = []
+    for job in jobs:
+        state = JobState(state_dir, job["name"], job["video"], job["output"])
+        if state.done():
+            skipped.append(state.data)
+        else:
+            if state.data["status"] != "pending":
+                print(f"Resuming {job['name']} ({state.data['status']} after {state.data['attempts']} attempts)")
+            pending.append(job)
+    print(f"Batch: {len(jobs)} matches, {len(skipped)} already done, {len(pending)} to process on {workers} workers")
+
+    results = []
+    crashed = []
+    start = time.perf_counter()
+    if len(pending) > 0:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path, tracker_params)) as executor:
+            futures = {executor.submit(run_job, process, job, state_dir, process_params, profile_dir): job for job in pending}
+            for future in as_completed(futures):
+                # A worker that dies takes the pool with it, its job stays "running" and is resumed next time
+                try:
+                    result = future.result()
+                except Exception as e:
+                    crashed.append(futures[future]["name"])
+                    print(f"{futures[future]['name']}: worker crashed ({e!r})")
+                    continue
+                results.append(result)
+                print(f"[{len(results)}/{len(pending)}] {result['name']}: {result['status']}, {result['frames']} frames in {result['seconds']:.1f}s")
+    elapsed = time.perf_counter() - start
+
+    # Throughput over every match processed in this run, and where the time went across all of them
+    done = [result for result in results if result["status"] == "done"]
+    frames = sum(result["frames"] for result in done)
+    stage_seconds = {}
+    for result in done:
+        for stage, stage_record in result["stages"].items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + stage_record["seconds"]
+
+    summary = {
+        "matches": len(jobs),
+        "processed": len(done),
+        "failed": [result["name"] for result in results if result["status"] != "done"] + crashed,
+        "skipped": len(skipped),
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames/elapsed if elapsed > 0 else 0.0,
+        "stage_seconds": stage_seconds
+    }
+    os.makedirs(state_dir, exist_ok=True)
+    with open(os.path.join(state_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Batch done: {len(done)}/{len(pending)} matches, {frames} frames in {elapsed:.1f}s, {summary['fps']:.1f} fps across all matches")
+    for stage, seconds in sorted(stage_seconds.items(), key=lambda item: -item[1]):
+        print(f"  {stage:<20}{seconds:>10.1f}s")
+    if len(summary["failed"]) > 0:
+        print(f"Failed: {', '.join(summary['failed'])}, run the batch again to resume them")
+    return summary
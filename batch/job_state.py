@@ -0,0 +1,55 @@
+import json
+import time
+import os
+
+class JobState:
+    def __init__(self, state_dir, name, video_path, output_path):
+        # Status of one match, resume works per job: anything not done runs again from the start
+        self.path = os.path.join(state_dir, f"{name}.json")
+        self.data = {
+            "name": name,
+            "video": video_path,
+            "output": output_path,
+            "status": "pending",
+            "attempts": 0,
+            "stages": {},
+            "frames": 0,
+            "seconds": 0.0,
+            "error": None
+        }
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            # A different input or output is a different job, its old progress does not apply
+            if saved.get("video") == video_path and saved.get("output") == output_path:
+                self.data.update(saved)
+
+    def done(self):
+        return self.data["status"] == "done" and os.path.exists(self.data["output"])
+
+    def start(self):
+        # Detection and camera movement chunks of an earlier attempt come back from the result cache,
+        # stage timings are only kept for the attempt that finishes
+        self.data.update(status="running", error=None, started=time.time(), stages={}, frames=0)
+        self.data["attempts"] += 1
+        self.save()
+
+    def add_stage(self, record):
+        # Timings for the batch report, saved with the final status
+        self.data["stages"][record["stage"]] = {"seconds": record["seconds"], "frames": record["frames"]}
+        self.data["frames"] = max(self.data["frames"], record["frames"])
+
+    def finish(self):
+        self.data.update(status="done", seconds=time.time() - self.data["started"])
+        self.save()
+
+    def fail(self, error):
+        self.data.update(status="failed", error=repr(error), seconds=time.time() - self.data["started"])
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
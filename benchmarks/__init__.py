@@ -0,0 +1 @@
+from .synthetic import generate_match, load_ground_truth, ground_truth_tracks
\ No newline at end of file
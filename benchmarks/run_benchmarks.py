@@ -0,0 +1,216 @@
+import numpy as np
+import platform
+import tempfile
+import json
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils import read_video, save_video
+from trackers import Tracker, TrackTable
+from team_assigner import TeamAssigner
+from player_ball_assignment import PlayerBallAssigner, PossessionStats
+from camera_movement import CameraMovementEstimator, compare_camera_movement
+from view_transformer import ViewTransformer
+from speed_dis_estimator import SpeedDisEstimator
+from renderer import Renderer
+from benchmarks.synthetic import generate_match, load_ground_truth, ground_truth_tracks
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def get_match(num_frames, num_players, seed=0):
+    # Clips are generated once and reused, the same seed always gives the same footage
+    path = os.path.join(DATA_DIR, f"match_{num_frames}_{num_players}_{seed}.avi")
+    if os.path.exists(path):
+        return path, load_ground_truth(path)
+    return path, generate_match(path, num_frames, num_players, seed)
+
+def time_best(function, repeats, min_time=0.2, setup=None):
+    # Best of at least repeats runs, fast components keep running until min_time has passed
+    # so their best run is not down to a single scheduler hiccup. setup is not timed, its result
+    # is passed to function, for components that change their input in place
+    best = float('inf')
+    result = None
+    runs = 0
+    total = 0.0
+    while runs < repeats or total < min_time:
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+    return best, result
+
+def calibrate(repeats):
+    # A fixed NumPy and Python workload timed next to every match, throughput is compared relative to it
+    # so a slower or busier machine does not read as a regression
+    values = np.random.default_rng(0).random(1<<18)
+    def workload():
+        np.sort(values)
+        return sum(range(100000))
+    seconds, _ = time_best(workload, repeats)
+    return seconds
+
+def benchmark_match(num_frames, num_players, repeats=3):
+    # The table based components main and main_stream run, in the order they run them
+    path, ground_truth = get_match(num_frames, num_players)
+    frames = read_video(path)
+    fps = int(ground_truth["fps"])
+    tracks = ground_truth_tracks(ground_truth, ball_drop=0.3)
+    tracker = Tracker(None)
+    results = []
+
+    def record(component, seconds, items, unit, **metrics):
+        results.append({"component": component, "frames": num_frames, "players": num_players, "seconds": seconds, "items": items,
+                        "throughput": items/seconds if seconds > 0 else float('inf'), "unit": unit, "calibration": calibrate(repeats), **metrics})
+
+    # Camera movement over the whole clip, compared with the pan that generated it
+    def camera_movement():
+        return CameraMovementEstimator(frames[0]).get_camera_movement(frames)
+    seconds, camera_mvmt_frame = time_best(camera_movement, repeats)
+    error = compare_camera_movement(ground_truth["camera_mvmt"], camera_mvmt_frame)
+    record("get_camera_movement", seconds, num_frames, "frames/s", mean_error_x=error["mean_error_x"], within_tolerance=error["within_tolerance"])
+
+    # Positions and their pitch coordinates, as process_table computes them
+    table = TrackTable.from_tracks(tracks)
+    tracker.add_position_to_table(table)
+    CameraMovementEstimator(frames[0]).adjust_positions_table(table, camera_mvmt_frame)
+    view_transformer = ViewTransformer()
+    seconds, _ = time_best(lambda: view_transformer.add_transform_to_table(table), repeats)
+    record("add_transform_to_table", seconds, num_frames, "frames/s")
+
+    # Ball smoothing over detections with 30% of the frames missing, on a fresh copy of the table every run
+    def interpolate_ball(ball_table):
+        tracker.interpolate_ball_table(ball_table)
+        return ball_table
+    seconds, table = time_best(interpolate_ball, repeats, setup=lambda: table.take(np.ones(len(table), dtype=bool)))
+    ball = table.bbox[table.class_mask("ball")][np.argsort(table.frame[table.class_mask("ball")])]
+    ball_error = np.hypot(*((ball[:,:2]+ball[:,2:])/2 - (ground_truth["ball"][:,:2]+ground_truth["ball"][:,2:])/2).T)
+    record("interpolate_ball_table", seconds, num_frames, "frames/s", mean_error_px=float(ball_error.mean()))
+
+    speed_dis_estimator = SpeedDisEstimator(fps=fps)
+    seconds, _ = time_best(lambda: speed_dis_estimator.speed_dis_to_table(table), repeats)
+    record("speed_dis_to_table", seconds, num_frames, "frames/s")
+
+    # Teams of every player row, each run starts with an empty vote cache and the colors fitted on the first frame
+    fitted = TeamAssigner()
+    fitted.assign_team_color(frames[0], tracks["players"][0])
+    def assign_teams():
+        team_assigner = TeamAssigner()
+        team_assigner.kmeans = fitted.kmeans
+        team_assigner.team_colors = fitted.team_colors
+        team_assigner.assign_teams_to_table(table, frames)
+        return team_assigner
+    seconds, team_assigner = time_best(assign_teams, repeats)
+    players = table.class_mask("players")
+    predicted = table.team[players]
+    expected = ground_truth["teams"][table.track_id[players]-1]
+    accuracy = max((predicted == expected).mean(), (predicted != expected).mean())
+    record("assign_teams_to_table", seconds, num_frames, "frames/s", team_accuracy=float(accuracy))
+
+    player_assigner = PlayerBallAssigner()
+    seconds, team_ball_control = time_best(lambda: player_assigner.assign_ball_to_table(table), repeats)
+    record("assign_ball_to_table", seconds, num_frames, "frames/s")
+
+    # Drawing and encoding, frames are annotated in place so later repeats draw over earlier ones
+    possession = PossessionStats(team_ball_control, player_assigner.get_ball_player(table), fps)
+    renderer = Renderer(tracker, table.to_tracks(team_assigner.team_colors), possession, camera_mvmt_frame, frames[0].shape)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'out.avi')
+        seconds, _ = time_best(lambda: save_video(renderer.render_frames([frames]), output_path, fps), repeats)
+    record("draw_encode", seconds, num_frames, "frames/s")
+
+    return results
+
+def run_benchmarks(lengths=(120, 480), player_counts=(10, 22), repeats=3):
+    results = []
+    for num_frames in lengths:
+        for num_players in player_counts:
+            print(f"Benchmarking {num_frames} frames with {num_players} players...")
+            results += benchmark_match(num_frames, num_players, repeats)
+
+    return {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "results": results
+    }
+
+def compare_results(baseline, current, threshold=0.2):
+    # Components whose throughput dropped by more than threshold against the baseline run
+    baseline_results = {(r["component"], r["frames"], r["players"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_results.get((result["component"], result["frames"], result["players"]))
+        if reference is None:
+            continue
+        # Scaled by how much faster the calibration workload ran for the baseline
+        ratio = result["throughput"]/reference["throughput"] * result["calibration"]/reference["calibration"]
+        if ratio < 1 - threshold:
+            regressions.append({"component": result["component"], "frames": result["frames"], "players": result["players"],
+                                "baseline": reference["throughput"], "current": result["throughput"], "ratio": ratio})
+    return regressions
+
+def print_results(report):
+    print(f"{'component':<26}{'frames':>8}{'players':>9}{'seconds':>10}{'throughput':>14}  unit")
+    for r in report["results"]:
+        print(f"{r['component']:<26}{r['frames']:>8}{r['players']:>9}{r['seconds']:>10.3f}{r['throughput']:>14.1f}  {r['unit']}")
+
+if __name__ == '__main__':
+    lengths = (120, 480)
+    player_counts = (10, 22)
+    repeats = 3
+    threshold = 0.2
+    baseline_path = BASELINE_PATH
+    output_path = os.path.join(RESULTS_DIR, f"run-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    for arg in sys.argv:
+        if arg.startswith('--lengths='):
+            lengths = [int(v) for v in arg.split('=')[1].split(',')]
+        if arg.startswith('--players='):
+            player_counts = [int(v) for v in arg.split('=')[1].split(',')]
+        if arg.startswith('--repeats='):
+            repeats = int(arg.split('=')[1])
+        if arg.startswith('--threshold='):
+            threshold = float(arg.split('=')[1])
+        if arg.startswith('--baseline='):
+            baseline_path = arg.split('=', 1)[1]
+        if arg.startswith('--output='):
+            output_path = arg.split('=', 1)[1]
+
+    report = run_benchmarks(lengths, player_counts, repeats)
+    print_results(report)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    # --update-baseline stores this run as the reference for later gates
+    if '--update-baseline' in sys.argv:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated at {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        # Calibration evens out machine speed, not every difference between machines
+        if baseline["machine"] != report["machine"]:
+            print(f"Baseline was recorded on {baseline['machine']}, this run on {report['machine']}, --update-baseline gives a like for like gate")
+        regressions = compare_results(baseline, report, threshold)
+
+        # A regression has to show up again when its match is run a second time, one noisy run does not fail the gate
+        if len(regressions) > 0:
+            sizes = sorted({(r["frames"], r["players"]) for r in regressions})
+            print(f"Rerunning {len(sizes)} matches to confirm {len(regressions)} regressions...")
+            rerun = {"results": [result for num_frames, num_players in sizes for result in benchmark_match(num_frames, num_players, repeats)]}
+            confirmed = {(r["component"], r["frames"], r["players"]) for r in compare_results(baseline, rerun, threshold)}
+            regressions = [r for r in regressions if (r["component"], r["frames"], r["players"]) in confirmed]
+        for r in regressions:
+            print(f"REGRESSION {r['component']} ({r['frames']} frames, {r['players']} players): {r['current']:.1f} vs {r['baseline']:.1f}, {r['ratio']*100:.0f}% of baseline")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f"No regressions beyond {threshold*100:.0f}% against {baseline_path}")
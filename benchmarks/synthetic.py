@@ -0,0 +1,104 @@
+import numpy as np
+import cv2
+import os
+
+TEAM_COLORS = [(0,0,220), (220,0,0)]
+REFEREE_COLOR = (0,230,230)
+
+def make_pitch(width, height, margin, rng):
+    # Grass with mowing bands and a smooth noise texture, unlike repeated marks it gives
+    # optical flow nothing to alias onto
+    pitch = np.zeros((height+2*margin, width+2*margin, 3), dtype=np.float32)
+    pitch[:] = (40,140,40)
+    for x in range(0, pitch.shape[1], 240):
+        pitch[:,x:x+120] = (50,155,50)
+    noise = rng.normal(0, 1, (pitch.shape[0]//2, pitch.shape[1]//2)).astype(np.float32)
+    noise = cv2.resize(noise, (pitch.shape[1], pitch.shape[0]), interpolation=cv2.INTER_CUBIC)
+    pitch += 50*noise[:,:,None]
+    return np.clip(pitch, 0, 255).astype(np.uint8)
+
+def generate_match(path, num_frames=120, num_players=22, seed=0, fps=24, frame_size=(1920,1080), pan=200, pan_period=20):
+    # Writes a synthetic clip and returns its ground truth: player, referee and ball boxes,
+    # player teams and the per-frame camera movement in the sign convention of CameraMovementEstimator.
+    # The pan peaks at pan/pan_period pixels per frame, above the estimator's 5 pixel threshold
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    margin = pan + 20
+    pitch = make_pitch(width, height, margin, rng)
+
+    positions = rng.uniform([100,200], [width-100,height-60], (num_players,2))
+    velocities = rng.normal(0, 2, (num_players,2))
+    teams = np.arange(num_players) % 2 + 1
+    referee = np.array([width/2, height/2])
+    ball = positions[0] + [25.0, -5.0]
+    ball_velocity = np.array([6.0, 2.0])
+
+    players_gt = np.zeros((num_frames,num_players,4))
+    referee_gt = np.zeros((num_frames,4))
+    ball_gt = np.zeros((num_frames,4))
+    pan_x = np.zeros(num_frames)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for frame_num in range(num_frames):
+        pan_x[frame_num] = margin + pan*np.sin(frame_num/pan_period)
+        x0 = int(round(pan_x[frame_num]))
+        frame = pitch[margin:margin+height, x0:x0+width].copy()
+
+        positions += velocities
+        bounce = (positions < [60,120]) | (positions > [width-60,height-20])
+        velocities[bounce] *= -1
+        positions = np.clip(positions, [60,120], [width-60,height-20])
+
+        ball += ball_velocity
+        for axis, limit in enumerate([width, height]):
+            if ball[axis] < 100 or ball[axis] > limit-100:
+                ball_velocity[axis] *= -1
+        referee += rng.normal(0, 1, 2)
+
+        # Players are a shirt over dark shorts, the box is the whole blob
+        for i, (x, y) in enumerate(positions.astype(int)):
+            cv2.rectangle(frame, (x-12,y-50), (x+12,y-25), TEAM_COLORS[teams[i]-1], -1)
+            cv2.rectangle(frame, (x-12,y-25), (x+12,y), (20,20,20), -1)
+            players_gt[frame_num,i] = [x-12, y-50, x+12, y]
+
+        x, y = referee.astype(int)
+        cv2.rectangle(frame, (x-12,y-50), (x+12,y-25), REFEREE_COLOR, -1)
+        cv2.rectangle(frame, (x-12,y-25), (x+12,y), (20,20,20), -1)
+        referee_gt[frame_num] = [x-12, y-50, x+12, y]
+
+        x, y = ball.astype(int)
+        cv2.circle(frame, (x,y), 6, (255,255,255), -1)
+        ball_gt[frame_num] = [x-6, y-6, x+6, y+6]
+
+        out.write(frame)
+    out.release()
+
+    camera_mvmt = np.zeros((num_frames,2))
+    camera_mvmt[1:,0] = np.diff(np.round(pan_x))
+
+    ground_truth = {"players": players_gt, "teams": teams, "referee": referee_gt, "ball": ball_gt, "camera_mvmt": camera_mvmt, "fps": fps}
+    np.savez(os.path.splitext(path)[0] + '_gt.npz', **ground_truth)
+    return ground_truth
+
+def load_ground_truth(path):
+    data = np.load(os.path.splitext(path)[0] + '_gt.npz')
+    return {name: data[name] for name in data.files}
+
+def ground_truth_tracks(ground_truth, ball_drop=0.0, seed=0):
+    # Tracks in the nested per-frame shape the pipeline uses, optionally with missed ball detections
+    rng = np.random.default_rng(seed)
+    players_gt = ground_truth["players"].tolist()
+    teams = ground_truth["teams"].tolist()
+    num_frames = len(players_gt)
+
+    tracks = {"players": [], "refs": [], "ball": []}
+    for frame_num in range(num_frames):
+        tracks["players"].append({track_id+1: {"bbox": bbox, "team": teams[track_id]} for track_id, bbox in enumerate(players_gt[frame_num])})
+        tracks["refs"].append({100: {"bbox": ground_truth["referee"][frame_num].tolist()}})
+        tracks["ball"].append({} if rng.random() < ball_drop else {1: {"bbox": ground_truth["ball"][frame_num].tolist()}})
+
+    # The first and last frames keep their ball so interpolation has both ends
+    for frame_num in [0, num_frames-1]:
+        tracks["ball"][frame_num] = {1: {"bbox": ground_truth["ball"][frame_num].tolist()}}
+    return tracks
@@ -1 +1 @@
-from .camera_movement_estimator import CameraMovementEstimator
\ No newline at end of file
+from .camera_movement_estimator import CameraMovementEstimator, estimate_movement_chunk, compare_camera_movement
\ No newline at end of file
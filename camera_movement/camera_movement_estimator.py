@@ -1,15 +1,20 @@
-import pickle
 import cv2
 import numpy as np
 import sys
-import os
+from concurrent.futures import ProcessPoolExecutor
 sys.path.append('../')
 from utils import measure_distance, measure_xy_distance
+from result_cache import file_digest
 
 class CameraMovementEstimator():
-    def __init__(self, frame):
+    def __init__(self, frame, scale=0.5, strip_margin=40):
         self.min_dis = 5
 
+        # Fast mode only looks at the masked edge strips, downscaled by scale
+        self.scale = scale
+        self.strip_margin = strip_margin
+        self.strip_columns = [(0,20), (900,1050)]
+
         self.lk_params = dict(
             winSize = (15, 15),
             maxLevel = 2,
@@ -18,8 +23,8 @@ class CameraMovementEstimator():
 
         first_frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         mask_features = np.zeros_like(first_frame_gray)
-        mask_features[:,0:20]=1
-        mask_features[:,900:1050]=1
+        for x1, x2 in self.strip_columns:
+            mask_features[:,x1:x2]=1
 
         self.features = dict(
             maxCorners = 100,
@@ -29,45 +34,179 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
-    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
-        # read from stub
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path, 'rb') as f:
-                return pickle.load(f)
-
-        camera_movement = [[0,0]]*len(frames)
-
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
-
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)
-            new_features, _, _ = cv2.calcOpticalFlowPyrLK(old_gray, frame_gray, old_features, None, **self.lk_params)
-
-            max_dis = 0
-            mvmt_x, mvmt_y = 0, 0
-
-            for i, (new,old) in enumerate(zip(new_features, old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
-
-                dis = measure_distance(new_features_point, old_features_point)
-                if dis > max_dis:
-                    max_dis = dis
-                    mvmt_x, mvmt_y = measure_xy_distance(old_features_point, new_features_point)
-            
-            if max_dis>self.min_dis:
-                camera_movement[frame_num] = [mvmt_x, mvmt_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
-            
-            old_gray = frame_gray.copy()
-
-        if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(camera_movement, f)
-                
+        self.strips = self.get_strips(first_frame_gray.shape[1])
+
+        self.reset()
+
+    def reset(self):
+        self.old_gray = None
+        self.old_features = None
+        self.old_strips = None
+        self.old_strip_features = None
+
+    def get_strips(self, frame_width):
+        # Crop bounds with room around the mask for the flow window, and the mask inside each crop
+        strips = []
+        for x1, x2 in self.strip_columns:
+            x1, x2 = min(x1, frame_width), min(x2, frame_width)
+            if x1 >= x2:
+                continue
+
+            crop_x1 = max(x1 - self.strip_margin, 0)
+            crop_x2 = min(x2 + self.strip_margin, frame_width)
+            mask_x1 = int(round((x1 - crop_x1)*self.scale))
+            mask_x2 = max(int(round((x2 - crop_x1)*self.scale)), mask_x1 + 1)
+            strips.append((crop_x1, crop_x2, mask_x1, mask_x2))
+
+        return strips
+
+    def get_strip_grays(self, frame):
+        strip_grays = []
+        for crop_x1, crop_x2, _, _ in self.strips:
+            strip_gray = cv2.cvtColor(frame[:,crop_x1:crop_x2], cv2.COLOR_BGR2GRAY)
+            if self.scale != 1:
+                strip_gray = cv2.resize(strip_gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            strip_grays.append(strip_gray)
+        return strip_grays
+
+    def get_strip_features(self, strip_grays):
+        strip_features = []
+        for strip_gray, (_, _, mask_x1, mask_x2) in zip(strip_grays, self.strips):
+            mask = np.zeros_like(strip_gray)
+            mask[:,mask_x1:mask_x2] = 1
+            features = dict(self.features, mask=mask, minDistance=max(1, int(self.features["minDistance"]*self.scale)))
+            strip_features.append(cv2.goodFeaturesToTrack(strip_gray, **features))
+        return strip_features
+
+    def get_frame_movement_fast(self, frame):
+        strip_grays = self.get_strip_grays(frame)
+
+        if self.old_strips is None:
+            self.old_strips = strip_grays
+            self.old_strip_features = self.get_strip_features(strip_grays)
+            return [0,0]
+
+        displacements = []
+        for old_gray, new_gray, old_features in zip(self.old_strips, strip_grays, self.old_strip_features):
+            if old_features is None:
+                continue
+            new_features, status, _ = cv2.calcOpticalFlowPyrLK(old_gray, new_gray, old_features, None, **self.lk_params)
+            tracked = status.ravel() == 1
+            displacements.append((old_features - new_features).reshape(-1,2)[tracked])
+
+        self.old_strips = strip_grays
+
+        displacements = np.concatenate(displacements) if len(displacements) > 0 else np.zeros((0,2))
+        if len(displacements) == 0:
+            return [0,0]
+
+        # Median over every tracked feature instead of the single largest displacement
+        mvmt_x, mvmt_y = (np.median(displacements, axis=0)/self.scale).tolist()
+
+        if np.hypot(mvmt_x, mvmt_y)>self.min_dis:
+            self.old_strip_features = self.get_strip_features(strip_grays)
+            return [mvmt_x, mvmt_y]
+
+        return [0,0]
+
+    def get_frame_movement(self, frame):
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.old_gray is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(self.old_gray,**self.features)
+            return [0,0]
+
+        new_features, _, _ = cv2.calcOpticalFlowPyrLK(self.old_gray, frame_gray, self.old_features, None, **self.lk_params)
+
+        max_dis = 0
+        mvmt_x, mvmt_y = 0, 0
+
+        for i, (new,old) in enumerate(zip(new_features, self.old_features)):
+            new_features_point = new.ravel()
+            old_features_point = old.ravel()
+
+            dis = measure_distance(new_features_point, old_features_point)
+            if dis > max_dis:
+                max_dis = dis
+                mvmt_x, mvmt_y = measure_xy_distance(old_features_point, new_features_point)
+
+        self.old_gray = frame_gray
+
+        if max_dis>self.min_dis:
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+            return [mvmt_x, mvmt_y]
+
+        return [0,0]
+
+    def cache_key(self, cache, video_path, fast=False, **params):
+        features = {k: v for k, v in self.features.items() if k != "mask"}
+        if fast:
+            params.update(scale=self.scale, strip_margin=self.strip_margin)
+        stage = "camera_movement_fast" if fast else "camera_movement"
+        return cache.stage_key(stage, video=file_digest(video_path), min_dis=self.min_dis, lk_params=self.lk_params, features=features, strip_columns=self.strip_columns, **params)
+
+    def get_camera_movement(self, frames, cache=None, video_path=None, chunk_size=100):
+        chunks = (frames[i:i+chunk_size] for i in range(0, len(frames), chunk_size))
+        return self.get_camera_movement_chunks(chunks, cache=cache, video_path=video_path)
+
+    def get_camera_movement_chunks(self, chunks, cache=None, video_path=None):
+        key = self.cache_key(cache, video_path) if cache is not None and video_path is not None else None
+
+        camera_movement = []
+
+        # Grayscale frame and features are carried over from one chunk to the next
+        self.reset()
+        start_frame = 0
+        for frames in chunks:
+            arrays = cache.get_chunk(key, start_frame, len(frames)) if key is not None else None
+            if arrays is not None:
+                camera_movement += np.asarray(arrays["movement"]).tolist()
+
+                # Restore the state the next chunk starts from
+                self.old_gray = cv2.cvtColor(frames[-1], cv2.COLOR_BGR2GRAY)
+                self.old_features = np.array(arrays["features"]) if arrays["features"].size > 0 else None
+            else:
+                chunk_movement = [self.get_frame_movement(frame) for frame in frames]
+                camera_movement += chunk_movement
+                if key is not None:
+                    features = self.old_features if self.old_features is not None else np.zeros((0,1,2), dtype=np.float32)
+                    cache.put_chunk(key, start_frame, len(frames), {"movement": np.array(chunk_movement, dtype=np.float64).reshape(-1,2), "features": features})
+
+            start_frame += len(frames)
+
         return camera_movement
 
+    def get_camera_movement_fast(self, video_path, chunk_size=250, workers=None, cache=None):
+        cap = cv2.VideoCapture(video_path)
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        # Every chunk re-reads the frame before its start so chunks overlap by one frame.
+        # The frame count from the container can be off, so the last chunk reads to the end.
+        starts = list(range(0, max(num_frames, 1), chunk_size))
+        ends = starts[1:] + [None]
+        key = self.cache_key(cache, video_path, fast=True, chunk_size=chunk_size) if cache is not None else None
+
+        # Chunks are independent, so only the ones missing from the cache are computed
+        chunk_movement = {}
+        if key is not None:
+            for start, end in zip(starts, ends):
+                arrays = cache.get_chunk(key, start, end - start if end is not None else 0)
+                if arrays is not None:
+                    chunk_movement[start] = np.asarray(arrays["movement"]).tolist()
+
+        missing = [(start, end) for start, end in zip(starts, ends) if start not in chunk_movement]
+        if len(missing) > 0:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {start: executor.submit(estimate_movement_chunk, video_path, start, end, self.scale, self.strip_margin) for start, end in missing}
+                for start, end in missing:
+                    chunk_movement[start] = futures[start].result()
+                    if key is not None:
+                        cache.put_chunk(key, start, end - start if end is not None else 0, {"movement": np.array(chunk_movement[start], dtype=np.float64).reshape(-1,2)})
+
+        return [mvmt for start in starts for mvmt in chunk_movement[start]]
+
     def adjust_positions_tracks(self, tracks, camera_mvmt_frame):
         for obj, obj_tracks in tracks.items():
             for frame_num, track in enumerate(obj_tracks):
@@ -78,10 +217,14 @@ class CameraMovementEstimator():
                         
                     tracks[obj][frame_num][track_id]['position_adjusted'] = position_adjusted
 
-    def draw_camera_movement(self, frames, camera_mvmt_frame):
+    def adjust_positions_table(self, table, camera_mvmt_frame):
+        camera_mvmt_frame = np.asarray(camera_mvmt_frame, dtype=np.float64).reshape(-1,2)
+        table.position_adjusted = table.position - camera_mvmt_frame[table.frame]
+
+    def draw_camera_movement(self, frames, camera_mvmt_frame, start_frame=0):
         out_frames = []
 
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start_frame):
             frame =  frame.copy()
 
             overlay = frame.copy()
@@ -95,4 +238,57 @@ class CameraMovementEstimator():
 
             out_frames.append(frame)
 
-        return out_frames
\ No newline at end of file
+        return out_frames
+
+def estimate_movement_chunk(video_path, start_frame, end_frame, scale=0.5, strip_margin=40):
+    cap = cv2.VideoCapture(video_path)
+
+    ref_frame = max(start_frame - 1, 0)
+    if ref_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, ref_frame)
+    ret, frame = cap.read()
+    if not ret:
+        cap.release()
+        return []
+
+    estimator = CameraMovementEstimator(frame, scale=scale, strip_margin=strip_margin)
+    camera_movement = [estimator.get_frame_movement_fast(frame)]
+    if start_frame > 0:
+        # The overlap frame only seeds the flow state, its movement belongs to the previous chunk
+        camera_movement = []
+
+    frame_num = ref_frame + 1
+    while end_frame is None or frame_num < end_frame:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        camera_movement.append(estimator.get_frame_movement_fast(frame))
+        frame_num += 1
+
+    cap.release()
+    return camera_movement
+
+def compare_camera_movement(reference, estimate, tolerance=1.0):
+    # Error of an estimate against a reference run, per axis and over the frames where either reports movement
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1,2)
+    estimate = np.asarray(estimate, dtype=np.float64).reshape(-1,2)
+    num_frames = min(len(reference), len(estimate))
+    reference, estimate = reference[:num_frames], estimate[:num_frames]
+
+    error = np.abs(estimate - reference)
+    error_dis = np.hypot(error[:,0], error[:,1])
+    ref_moving = (reference != 0).any(axis=1)
+    est_moving = (estimate != 0).any(axis=1)
+    moving = ref_moving | est_moving
+
+    return {
+        "frames": num_frames,
+        "mean_error_x": float(error[:,0].mean()) if num_frames > 0 else 0.0,
+        "mean_error_y": float(error[:,1].mean()) if num_frames > 0 else 0.0,
+        "max_error": float(error_dis.max()) if num_frames > 0 else 0.0,
+        "within_tolerance": float((error_dis <= tolerance).mean()) if num_frames > 0 else 1.0,
+        "moving_frames": int(moving.sum()),
+        "moving_agreement": float((ref_moving == est_moving)[moving].mean()) if moving.any() else 1.0,
+        "drift_x": float(estimate[:,0].sum() - reference[:,0].sum()),
+        "drift_y": float(estimate[:,1].sum() - reference[:,1].sum())
+    }
@@ -0,0 +1,2 @@
+from .backends import UltralyticsBackend, OnnxBackend, OpenVinoBackend, load_backend, export_onnx, nms
+from .benchmark import benchmark_backends
\ No newline at end of file
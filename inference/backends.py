@@ -0,0 +1,200 @@
+import supervision as sv
+import numpy as np
+import ast
+import cv2
+import os
+
+def export_onnx(model_path, imgsz=640, dynamic=True):
+    # Writes <model>.onnx next to the weights, once
+    onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+        from ultralytics import YOLO
+        onnx_path = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=dynamic)
+    return onnx_path
+
+def load_backend(model_path, backend='ultralytics', threads=None):
+    if backend == 'ultralytics':
+        return UltralyticsBackend(model_path)
+
+    if model_path.endswith('.pt'):
+        model_path = export_onnx(model_path)
+    if backend == 'onnx':
+        return OnnxBackend(model_path, threads)
+    if backend == 'openvino':
+        return OpenVinoBackend(model_path, threads)
+
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+def nms(boxes, scores, class_id, iou_threshold=0.7, max_det=300, max_nms=30000):
+    # Greedy per class NMS, classes are kept apart by offsetting their boxes.
+    # Each kept box is compared against the remaining ones only, so memory stays O(N)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    order = np.argsort(-scores, kind='stable')[:max_nms]
+    offset_boxes = boxes[order] + (class_id[order].astype(np.float32)*7680)[:,None]
+    x1, y1, x2, y2 = offset_boxes.T
+    areas = (x2-x1)*(y2-y1)
+
+    keep = []
+    remaining = np.arange(len(order))
+    while len(remaining) > 0 and len(keep) < max_det:
+        i, rest = remaining[0], remaining[1:]
+        keep.append(i)
+
+        intersection = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)*np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        iou = intersection/np.maximum(areas[i] + areas[rest] - intersection, 1e-9)
+        remaining = rest[iou <= iou_threshold]
+
+    return order[np.array(keep, dtype=np.int64)]
+
+class UltralyticsBackend:
+    name = 'ultralytics'
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+
+    def detect(self, frames, conf=0.1, imgsz=None):
+        predict_args = {"conf": conf}
+        if imgsz is not None:
+            predict_args["imgsz"] = imgsz
+        return [sv.Detections.from_ultralytics(result) for result in self.model.predict(frames, **predict_args)]
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, model_path, threads=None, iou=0.7, max_det=300):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        input_shape = self.session.get_inputs()[0].shape
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.setup(input_shape, metadata, iou, max_det)
+
+    def setup(self, input_shape, metadata, iou, max_det):
+        # Ultralytics exports keep the class names and the image size in the model metadata
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.iou = iou
+        self.max_det = max_det
+
+        # Dimensions are ints for static exports and names or None for dynamic ones
+        self.fixed_batch = input_shape[0] if isinstance(input_shape[0], int) else None
+        self.fixed_imgsz = input_shape[2] if isinstance(input_shape[2], int) else None
+        self.default_imgsz = self.fixed_imgsz or (ast.literal_eval(metadata["imgsz"])[0] if "imgsz" in metadata else 640)
+
+        # Letterbox canvas and input tensor, reused across batches and only grown when needed
+        self.canvas = np.zeros((0,0,0,3), dtype=np.uint8)
+        self.input = np.zeros((0,3,0,0), dtype=np.float32)
+
+    def get_buffers(self, batch_sz, imgsz):
+        if self.canvas.shape[0] < batch_sz or self.canvas.shape[1] != imgsz:
+            self.canvas = np.zeros((batch_sz, imgsz, imgsz, 3), dtype=np.uint8)
+            self.input = np.zeros((batch_sz, 3, imgsz, imgsz), dtype=np.float32)
+        return self.canvas[:batch_sz], self.input[:batch_sz]
+
+    def letterbox(self, frame, canvas):
+        # Same resize and grey padding as ultralytics LetterBox with a square target
+        imgsz = canvas.shape[0]
+        height, width = frame.shape[:2]
+        gain = min(imgsz/height, imgsz/width)
+        new_w, new_h = int(round(width*gain)), int(round(height*gain))
+        dw, dh = (imgsz - new_w)/2, (imgsz - new_h)/2
+        top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+
+        canvas[:] = 114
+        if (new_w, new_h) != (width, height):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas[top:top+new_h, left:left+new_w] = frame
+
+        return gain, left, top
+
+    def run(self, images):
+        return self.session.run(None, {self.input_name: images})[0]
+
+    def detect(self, frames, conf=0.1, imgsz=None):
+        if len(frames) == 0:
+            return []
+
+        imgsz = self.fixed_imgsz or int(np.ceil((imgsz or self.default_imgsz)/32)*32)
+        batch_sz = self.fixed_batch or len(frames)
+
+        detections = []
+        for i in range(0, len(frames), batch_sz):
+            batch = frames[i:i+batch_sz]
+            canvas, images = self.get_buffers(batch_sz, imgsz)
+            letterboxes = [self.letterbox(frame, canvas[j]) for j, frame in enumerate(batch)]
+
+            # HWC BGR uint8 to NCHW RGB float in one pass into the preallocated tensor
+            np.multiply(canvas[..., ::-1].transpose(0,3,1,2), 1/255, out=images, casting='unsafe')
+
+            outputs = self.run(images)
+            for j, frame in enumerate(batch):
+                detections.append(self.postprocess(outputs[j], frame.shape, letterboxes[j], conf))
+
+        return detections
+
+    def postprocess(self, output, frame_shape, letterbox, conf):
+        # YOLOv8 heads give (4+classes, anchors) with centre xywh boxes and per class scores
+        if output.shape[0] > output.shape[1]:
+            output = output.T
+        num_classes = len(self.names) if len(self.names) > 0 else output.shape[0] - 4
+        scores = output[4:4+num_classes]
+
+        class_id = scores.argmax(axis=0)
+        confidence = scores[class_id, np.arange(scores.shape[1])]
+        keep = confidence > conf
+        class_id, confidence = class_id[keep], confidence[keep]
+
+        cx, cy, w, h = output[:4, keep]
+        xyxy = np.stack([cx - w/2, cy - h/2, cx + w/2, cy + h/2], axis=1)
+
+        keep = nms(xyxy, confidence, class_id, self.iou, self.max_det)
+        xyxy, confidence, class_id = xyxy[keep], confidence[keep], class_id[keep]
+
+        # Back to frame pixels
+        gain, left, top = letterbox
+        xyxy = (xyxy - np.array([left, top, left, top], dtype=np.float32))/gain
+        xyxy[:, [0,2]] = xyxy[:, [0,2]].clip(0, frame_shape[1])
+        xyxy[:, [1,3]] = xyxy[:, [1,3]].clip(0, frame_shape[0])
+
+        return sv.Detections(
+            xyxy=xyxy.astype(np.float32),
+            confidence=confidence.astype(np.float32),
+            class_id=class_id.astype(int),
+            data={"class_name": np.array([self.names.get(int(c), str(c)) for c in class_id])}
+        )
+
+class OpenVinoBackend(OnnxBackend):
+    name = 'openvino'
+
+    def __init__(self, model_path, threads=None, iou=0.7, max_det=300):
+        # Optional, only needed when this backend is picked
+        import openvino as ov
+
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "THROUGHPUT"}
+        if threads is not None:
+            config["INFERENCE_NUM_THREADS"] = threads
+        model = core.read_model(model_path)
+
+        input_shape = [dim.get_length() if dim.is_static else None for dim in model.inputs[0].get_partial_shape()]
+        metadata = {}
+        if model.has_rt_info(["framework", "names"]):
+            metadata["names"] = str(model.get_rt_info(["framework", "names"]))
+        if "names" not in metadata:
+            # Read the ONNX metadata through onnxruntime, which is already a requirement
+            import onnxruntime as ort
+            metadata = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_modelmeta().custom_metadata_map
+
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.setup(input_shape, metadata, iou, max_det)
+
+    def run(self, images):
+        return self.compiled(images)[0]
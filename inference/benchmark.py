@@ -0,0 +1,40 @@
+import time
+import sys
+
+sys.path.append('../')
+from utils import read_video_chunks
+from .backends import load_backend
+
+def benchmark_backends(video_path, model_path, backends=('ultralytics', 'onnx', 'openvino'), num_frames=200, batch_sz=20, threads=None, conf=0.1):
+    # Same frames through every backend, the first batch is a warm up and not timed
+    frames = next(read_video_chunks(video_path, num_frames))
+
+    results = {}
+    for name in backends:
+        try:
+            backend = load_backend(model_path, name, threads)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+
+        backend.detect(frames[:batch_sz], conf)
+
+        start = time.perf_counter()
+        num_detections = 0
+        for i in range(0, len(frames), batch_sz):
+            num_detections += sum(len(detection_sv) for detection_sv in backend.detect(frames[i:i+batch_sz], conf))
+        elapsed = time.perf_counter() - start
+
+        results[name] = {"frames": len(frames), "seconds": elapsed, "fps": len(frames)/elapsed, "detections": num_detections}
+        print(f"{name}: {results[name]['fps']:.1f} fps, {num_detections} detections over {len(frames)} frames")
+
+    return results
+
+if __name__ == '__main__':
+    video_path = sys.argv[1] if len(sys.argv) > 1 else 'input_videos/video.mp4'
+    model_path = sys.argv[2] if len(sys.argv) > 2 else 'models/best.pt'
+    threads = None
+    for arg in sys.argv:
+        if arg.startswith('--threads='):
+            threads = int(arg.split('=')[1])
+    benchmark_backends(video_path, model_path, threads=threads)
@@ -0,0 +1,2 @@
+from .live_source import LiveSource
+from .live_processor import LiveProcessor, run_live
\ No newline at end of file
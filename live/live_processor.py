@@ -0,0 +1,192 @@
+import supervision as sv
+import numpy as np
+from collections import deque
+import time
+import cv2
+import sys
+sys.path.append('../')
+from utils import VideoWriter, get_foot
+from trackers import Tracker, BallSmoother
+from team_assigner import TeamAssigner
+from player_ball_assignment import PlayerBallAssigner, RunningPossession
+from camera_movement import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_dis_estimator import SpeedDisEstimator
+from renderer import Renderer
+from .live_source import LiveSource
+
+class LiveProcessor:
+    def __init__(self, model_path, fps=24, latency_budget=0.25, detect_every=1, max_skip=12, backend='ultralytics', threads=None, latency_window=1000):
+        # Every stage only sees the current frame and a small amount of running state
+        self.tracker = Tracker(model_path, detect_every=detect_every, batch_sz=1, backend=backend, threads=threads)
+        self.tracker.track_buffer = None
+        self.ball_smoother = BallSmoother(lookahead=0)
+        self.team_assigner = TeamAssigner()
+        self.player_assigner = PlayerBallAssigner()
+        self.possession = RunningPossession()
+        self.view_transformer = ViewTransformer()
+        self.speed_dis_estimator = SpeedDisEstimator(fps=fps)
+        self.camera_estimator = None
+        self.renderer = None
+
+        # Frames older than the budget are dropped, detection is skipped when it would not fit
+        # with the running estimates of the detector and of everything else a frame goes through
+        self.latency_budget = latency_budget
+        self.detect_every = detect_every
+        self.max_skip = max_skip
+        self.detect_time = 0.0
+        self.other_time = 0.0
+        self.last_detected = None
+
+        # End to end latency of the most recent frames, a stream can run for ever
+        self.latencies = deque(maxlen=latency_window)
+        self.processed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.over_budget = 0
+
+    def needs_detection(self, frame_num, age):
+        if self.last_detected is None or frame_num - self.last_detected >= self.max_skip:
+            return True
+        if frame_num - self.last_detected < self.detect_every:
+            return False
+
+        # Boxes are moved along by the propagator instead when the detector would blow the budget
+        if self.latency_budget is not None and age + self.other_time + self.detect_time > self.latency_budget:
+            self.skipped += 1
+            return False
+        return True
+
+    def process(self, frame_num, frame, capture_time):
+        age = time.perf_counter() - capture_time
+        if self.latency_budget is not None and age > self.latency_budget:
+            self.dropped += 1
+            return None
+
+        if self.camera_estimator is None:
+            self.camera_estimator = CameraMovementEstimator(frame)
+            self.renderer = Renderer(self.tracker, None, None, None, frame.shape)
+        camera_mvmt = self.camera_estimator.get_frame_movement_fast(frame)
+
+        # Detection or propagation, then ByteTrack
+        keyframe = self.needs_detection(frame_num, age)
+        frame_detect_time = 0.0
+        if keyframe:
+            t = time.perf_counter()
+            detections = self.tracker.detect_frames([frame])
+            frame_detect_time = time.perf_counter() - t
+            self.detect_time = 0.8*self.detect_time + 0.2*frame_detect_time if self.last_detected is not None else frame_detect_time
+            self.last_detected = frame_num
+        else:
+            detections = [sv.Detections.empty()]
+        tracks = {"players": [], "refs": [], "ball": []}
+        self.tracker.add_detections_to_tracks(tracks, detections, self.tracker.model.names, [keyframe], [camera_mvmt], frame_num)
+        players, refs = tracks["players"][0], tracks["refs"][0]
+
+        # Causal ball filter, no lookahead
+        ball = tracks["ball"][0].get(1)
+        ball_dict = {}
+        for _, bbox, confidence in self.ball_smoother.update(frame_num, ball["bbox"] if ball is not None else None):
+            ball_dict = {1: {"bbox": bbox, "confidence": confidence}} if bbox is not None else {}
+
+        self.assign_teams(frame, frame_num, players)
+        self.add_speed_dis(frame_num, players, refs, camera_mvmt)
+
+        # Ball possession, counted as it happens
+        team = 0
+        if 1 in ball_dict:
+            assigned_player = self.player_assigner.assign_ball_player(players, ball_dict[1]["bbox"])
+            if assigned_player != -1:
+                players[assigned_player]["has_ball"] = True
+                team = players[assigned_player].get("team", 0)
+        self.possession.update(team)
+
+        self.renderer.draw_frame(frame, players, refs, ball_dict, self.possession.counts[1], self.possession.counts[2], camera_mvmt)
+
+        # The end to end latency is what counts against the budget, and what the next frames plan with
+        latency = time.perf_counter() - capture_time
+        frame_other_time = latency - age - frame_detect_time
+        self.other_time = 0.8*self.other_time + 0.2*frame_other_time if self.processed > 0 else frame_other_time
+        self.latencies.append(latency)
+        self.processed += 1
+        if self.latency_budget is not None and latency > self.latency_budget:
+            self.over_budget += 1
+        return frame
+
+    def assign_teams(self, frame, frame_num, players):
+        # Team colors come from the first frame with enough players, tracks are then voted on online
+        if len(players) == 0:
+            return
+        if len(self.team_assigner.team_colors) == 0:
+            if len(players) < 2:
+                return
+            self.team_assigner.assign_team_color(frame, players)
+
+        player_ids = list(players.keys())
+        teams = self.team_assigner.get_player_teams(frame, [player["bbox"] for player in players.values()], player_ids, frame_num)
+        for player_id, team in zip(player_ids, teams.tolist()):
+            players[player_id]["team"] = team
+            players[player_id]["team_color"] = self.team_assigner.team_colors[team]
+
+    def add_speed_dis(self, frame_num, players, refs, camera_mvmt):
+        track_infos = list(players.values()) + list(refs.values())
+        if len(track_infos) == 0:
+            return
+
+        keys = [("players", track_id) for track_id in players] + [("refs", track_id) for track_id in refs]
+        positions = np.array([get_foot(track_info["bbox"]) for track_info in track_infos], dtype=np.float64)
+        transformed = self.view_transformer.transform_points(positions - np.asarray(camera_mvmt))
+        speed, distance = self.speed_dis_estimator.update_speed_dis(frame_num, keys, transformed)
+
+        for track_info, track_speed, track_distance in zip(track_infos, speed.tolist(), distance.tolist()):
+            if not np.isnan(track_speed):
+                track_info["speed"] = track_speed
+                track_info["distance"] = track_distance
+
+    def stats(self):
+        latencies = np.array(self.latencies)*1000
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "detection_skipped": self.skipped,
+            "over_budget": self.over_budget,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) > 0 else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) > 0 else 0.0
+        }
+
+def run_live(source, model_path, output_path=None, latency_budget=0.25, realtime=None, display=False, detect_every=1, max_frames=None, codec='XVID', backend='ultralytics', threads=None):
+    live_source = LiveSource(source, realtime)
+    processor = LiveProcessor(model_path, live_source.fps, latency_budget, detect_every, backend=backend, threads=threads)
+    writer = VideoWriter(output_path, live_source.fps, codec=codec) if output_path is not None else None
+
+    start = time.perf_counter()
+    try:
+        for frame_num, frame, capture_time in live_source:
+            frame = processor.process(frame_num, frame, capture_time)
+            if frame is None:
+                continue
+
+            if writer is not None:
+                writer.write(frame)
+            if display:
+                cv2.imshow("live", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            if max_frames is not None and frame_num + 1 >= max_frames:
+                break
+    finally:
+        live_source.close()
+        if writer is not None:
+            writer.close()
+        if display:
+            cv2.destroyAllWindows()
+    elapsed = time.perf_counter() - start
+
+    stats = processor.stats()
+    source_stats = live_source.stats()
+    stats.update(captured=source_stats["captured"], source_dropped=source_stats["dropped"], fps=stats["processed"]/max(elapsed, 1e-9))
+    print(f"Live: {stats['processed']}/{stats['captured']} frames processed at {stats['fps']:.1f} fps, "
+          f"{stats['source_dropped']} dropped by the source, {stats['dropped']} dropped as stale, {stats['detection_skipped']} detections skipped")
+    print(f"Latency p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms over the last {len(processor.latencies)} frames, "
+          f"{stats['over_budget']} processed frames over budget")
+    return stats
@@ -0,0 +1,91 @@
+import threading
+import time
+import cv2
+
+class LiveSource:
+    def __init__(self, source, realtime=None):
+        # source is anything cv2.VideoCapture opens, a camera index, an RTSP url or a file
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+
+        # Files are replayed at their own frame rate to stand in for a camera
+        self.is_file = isinstance(source, str) and '://' not in source
+        self.realtime = self.is_file if realtime is None else realtime
+
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video source {source}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 24
+
+        # Only the newest frame is kept, a slow consumer skips the ones in between
+        self.latest = None
+        self.finished = False
+        self.condition = threading.Condition()
+        self.captured = 0
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self.grab, daemon=True)
+        self.thread.start()
+
+    def grab(self):
+        start = time.perf_counter()
+        frame_num = 0
+        while not self.finished:
+            if self.realtime:
+                # Wait until the frame would have been captured, a camera delivers at its own pace
+                delay = start + frame_num/self.fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            capture_time = time.perf_counter()
+
+            with self.condition:
+                if self.latest is not None:
+                    self.dropped += 1
+                self.latest = (frame_num, frame, capture_time)
+                self.captured += 1
+                self.condition.notify()
+
+            frame_num += 1
+
+            # Without real time pacing a file is read as fast as it is consumed
+            if not self.realtime:
+                with self.condition:
+                    while self.latest is not None and not self.finished:
+                        self.condition.wait()
+
+        self.cap.release()
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def read(self):
+        # Returns (frame_num, frame, capture_time) of the newest frame, None once the source ends
+        with self.condition:
+            while self.latest is None and not self.finished:
+                self.condition.wait()
+            item = self.latest
+            self.latest = None
+            self.condition.notify_all()
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                break
+            yield item
+
+    def close(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+        self.thread.join(timeout=1)
+
+    def stats(self):
+        return {"captured": self.captured, "dropped": self.dropped, "fps": self.fps}
@@ -1,86 +1,406 @@
-from utils import read_video, save_video
-from trackers import Tracker
+from utils import read_video, read_video_chunks, read_first_frame, get_video_fps, save_video
+from trackers import Tracker, TrackTable
 from team_assigner import TeamAssigner
-from player_ball_assignment import PlayerBallAssigner
+from player_ball_assignment import PlayerBallAssigner, PossessionStats
 from camera_movement import CameraMovementEstimator
 from view_transformer import ViewTransformer
 from speed_dis_estimator import SpeedDisEstimator
+from result_cache import ResultCache
+from renderer import Renderer
+from live import run_live
+from profiling import Profiler
+from batch import run_batch, find_jobs
+from sharding import run_sharded, compare_sharded, SHARD_TOLERANCE
+from track_store import TrackStore
+from analytics import PitchAnalytics
+from pipeline import StageScheduler, DecodeStage, FlowStage, DetectStage, BallStage, TeamStage, AnnotateStage, EncodeStage
 
 import numpy as np
+import sys
+import os
 
-def main():
-    print("Reading video...")
-    frames = read_video('input_videos/video.mp4')
-
-    # Initialize Tracker
-    print("Detecting and tracking objects...")
-    tracker = Tracker('models/best.pt')
-    tracks = tracker.get_object_tracks(frames, read_from_stub=True, stub_path='stubs/track_stubs.pkl')
+VIDEO_PATH = 'input_videos/video.mp4'
+MODEL_PATH = 'models/best.pt'
+CACHE_DIR = 'cache'
+OUTPUT_PATH = 'output_videos/vid.avi'
+OUTPUT_CODEC = 'XVID'
+CHUNK_SIZE = 100
+DETECT_EVERY = 1
+MULTI_SCALE = False
+BACKEND = 'ultralytics'
+THREADS = None
+LATENCY_BUDGET = 0.25
+PROFILE_DIR = 'profiles'
+OUTPUT_DIR = 'output_videos'
+BATCH_WORKERS = 2
+SHARD_SIZE = 1500
+SHARD_OVERLAP = 24
+EXPORT_FORMAT = 'npz'
 
+def process_table(tracker, table, camera_estimator, camera_mvmt_frame, fps, smooth_ball=True):
     # Get onject positions
-    tracker.add_position_to_tracks(tracks)
+    tracker.add_position_to_table(table)
 
     # Camera movement estimator
-    camera_estimator = CameraMovementEstimator(frames[0])
-    camera_mvmt_frame = camera_estimator.get_camera_movement(frames, read_from_stub=True, stub_path='stubs/camera_mvmt_stubs.pkl')
-    camera_estimator.adjust_positions_tracks(tracks, camera_mvmt_frame)
+    camera_estimator.adjust_positions_table(table, camera_mvmt_frame)
 
     # View Transformer
     view_transformer = ViewTransformer()
-    view_transformer.add_transform_to_tracks(tracks)
+    view_transformer.add_transform_to_table(table)
 
     # interpolatew ball positions
-    print("Interpolating ball positions...")
-    tracks["ball"] = tracker.interpolate_ball(tracks["ball"])
+    if smooth_ball:
+        print("Interpolating ball positions...")
+        tracker.interpolate_ball_table(table)
 
     # speed and distance estimator
     print("Estimating player speed...")
-    speed_dis_estimator = SpeedDisEstimator()
-    speed_dis_estimator.speed_dis_to_tracks(tracks)
+    speed_dis_estimator = SpeedDisEstimator(fps=fps)
+    speed_dis_estimator.speed_dis_to_table(table)
+
+    return speed_dis_estimator
+
+def print_possession(possession):
+    summary = possession.summary()
+    for team, team_summary in summary["teams"].items():
+        print(f"Team {team} possession: {team_summary['frames']} frames in {team_summary['runs']} runs, longest {team_summary['longest']} frames")
+    top_players = list(summary["players"].items())[:3]
+    print(f"Turnovers: {summary['turnovers']}, most time on the ball: {', '.join(f'{track_id} ({frames} frames)' for track_id, frames in top_players)}")
+
+def print_pitch_control(analytics):
+    summary = analytics.summary()
+    for team, team_summary in summary["teams"].items():
+        x, y = team_summary["busiest_cell"]
+        print(f"Team {team} pitch control: {team_summary['control']*100:.1f}% of the pitch on average, {team_summary['seconds']:.0f} player seconds tracked, most around ({x:.1f}m, {y:.1f}m)")
+    print(f"Pitch control computed for {analytics.computed}/{analytics.num_frames} frames, the rest came from the result cache")
+
+def export_tracks(table, possession, camera_mvmt_frame, output_path, file_format=EXPORT_FORMAT, analytics=None):
+    # Final per-frame, per-track rows next to the video, read them back with track_store.TrackStore
+    export_path = os.path.splitext(output_path)[0] + '_tracks'
+    frame_columns = {"ball_control": possession.team_control, "camera_mvmt": np.asarray(camera_mvmt_frame, dtype=np.float64).reshape(-1,2)}
+    if possession.ball_player is not None:
+        frame_columns["ball_player"] = possession.ball_player
+    if analytics is not None:
+        frame_columns["pitch_control"] = analytics.control_share()
+    TrackStore.write(export_path, table, frame_columns, file_format=file_format)
+    print(f"Tracks exported to {export_path}")
+
+    # Heatmaps and dominance of the whole match, the per-frame share is in the track export
+    if analytics is not None:
+        analytics_path = os.path.splitext(output_path)[0] + '_analytics.npz'
+        analytics.save(analytics_path)
+        print(f"Pitch analytics exported to {analytics_path}")
+
+def main(fast_camera=False, detect_every=DETECT_EVERY, multi_scale=MULTI_SCALE, backend=BACKEND, threads=THREADS, profiler=None, video_path=VIDEO_PATH, output_path=OUTPUT_PATH, tracker=None, export_format=EXPORT_FORMAT, pitch_control=False):
+    # A disabled profiler is a no-op, every stage below is timed when it is enabled
+    profiler = (profiler or Profiler()).begin()
+
+    print("Reading video...")
+    with profiler.stage("decode") as stage:
+        frames = read_video(video_path)
+        stage.frames = len(frames)
+
+    # Camera movement comes first, frame skipping detection uses it to move boxes along
+    cache = ResultCache(CACHE_DIR)
+    with profiler.stage("camera_movement", len(frames)):
+        camera_estimator = CameraMovementEstimator(frames[0])
+        if fast_camera:
+            camera_mvmt_frame = camera_estimator.get_camera_movement_fast(video_path, cache=cache)
+        else:
+            camera_mvmt_frame = camera_estimator.get_camera_movement(frames, cache=cache, video_path=video_path, chunk_size=CHUNK_SIZE)
+
+    # Initialize Tracker
+    print("Detecting and tracking objects...")
+    with profiler.stage("detect_track", len(frames)):
+        # A tracker passed in keeps its loaded model, its own detection settings apply
+        if tracker is None:
+            tracker = Tracker(MODEL_PATH, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads)
+        tracks = tracker.get_object_tracks(frames, cache=cache, video_path=video_path, chunk_size=CHUNK_SIZE, camera_mvmt_frame=camera_mvmt_frame)
+        table = tracker.get_track_table()
+    print(f"Detector ran on {tracker.detected_frames}/{len(frames)} frames")
+    if tracker.multi_scale_detector is not None:
+        print(f"Ball search: {tracker.multi_scale_detector.stats()}")
+    print(f"Result cache: {cache.stats()}")
+
+    fps = get_video_fps(video_path)
+    with profiler.stage("positions_speed", len(frames)):
+        process_table(tracker, table, camera_estimator, camera_mvmt_frame, fps)
 
     # Assign Player Teams
     print("Assigning player Teams...")
+    with profiler.stage("teams", len(frames)):
+        team_assigner = TeamAssigner()
+        team_assigner.assign_team_color(frames[0], tracks["players"][0])
+        team_assigner.assign_teams_to_table(table, frames)
+    print(f"Team cache: {team_assigner.team_cache.stats()}")
+
+    # Assign ball to player
+    with profiler.stage("ball_assignment", len(frames)):
+        player_assigner = PlayerBallAssigner()
+        team_ball_control = player_assigner.assign_ball_to_table(table)
+        possession = PossessionStats(team_ball_control, player_assigner.get_ball_player(table), fps)
+    print_possession(possession)
+
+    # Heatmaps and pitch control from the transformed positions, the overlay and the export share the cached grids
+    analytics = None
+    if pitch_control:
+        with profiler.stage("pitch_control", len(frames)):
+            analytics = PitchAnalytics.from_table(table, fps, cache=cache)
+            analytics.control_share()
+        print_pitch_control(analytics)
+
+    # export_format None skips the columnar export
+    if export_format is not None:
+        with profiler.stage("export", len(frames)):
+            export_tracks(table, possession, camera_mvmt_frame, output_path, export_format, analytics)
+
+    tracks = table.to_tracks(team_assigner.team_colors)
+
+    # Draw output, each frame is annotated in place and handed straight to the encoder
+    print("Drawing annotations and saving output...")
+    with profiler.stage("render_encode", len(frames)):
+        renderer = Renderer(tracker, tracks, possession, camera_mvmt_frame, frames[0].shape, analytics, team_assigner.team_colors)
+        save_video(renderer.render_frames([frames]), output_path, codec=OUTPUT_CODEC, source_path=video_path)
+
+    profiler.end()
+    print("Done!!!")
+
+def main_stream(chunk_size=CHUNK_SIZE, fast_camera=False, detect_every=DETECT_EVERY, multi_scale=MULTI_SCALE, backend=BACKEND, threads=THREADS, profiler=None, video_path=VIDEO_PATH, output_path=OUTPUT_PATH, tracker=None, export_format=EXPORT_FORMAT, pitch_control=False):
+    # Frames are decoded chunk by chunk for every pass, so memory does not grow with the video length
+    profiler = (profiler or Profiler()).begin()
+    cache = ResultCache(CACHE_DIR)
+    first_frame = read_first_frame(video_path)
+    with profiler.stage("camera_movement") as stage:
+        camera_estimator = CameraMovementEstimator(first_frame)
+        if fast_camera:
+            camera_mvmt_frame = camera_estimator.get_camera_movement_fast(video_path, cache=cache)
+        else:
+            camera_mvmt_frame = camera_estimator.get_camera_movement_chunks(read_video_chunks(video_path, chunk_size), cache=cache, video_path=video_path)
+        stage.frames = len(camera_mvmt_frame)
+    num_frames = len(camera_mvmt_frame)
+
+    print("Detecting and tracking objects...")
+    with profiler.stage("detect_track", num_frames):
+        # A tracker passed in keeps its loaded model, its own detection settings apply
+        if tracker is None:
+            tracker = Tracker(MODEL_PATH, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads)
+        tracks = tracker.get_object_tracks_chunks(read_video_chunks(video_path, chunk_size), cache=cache, video_path=video_path, camera_mvmt_frame=camera_mvmt_frame)
+        table = tracker.get_track_table()
+    print(f"Detector ran on {tracker.detected_frames}/{num_frames} frames")
+    if tracker.multi_scale_detector is not None:
+        print(f"Ball search: {tracker.multi_scale_detector.stats()}")
+    print(f"Result cache: {cache.stats()}")
+
+    fps = get_video_fps(video_path)
+    with profiler.stage("positions_speed", num_frames):
+        process_table(tracker, table, camera_estimator, camera_mvmt_frame, fps)
+
+    print("Assigning player Teams...")
+    with profiler.stage("teams", num_frames):
+        team_assigner = TeamAssigner()
+        start_frame = 0
+        for frames in read_video_chunks(video_path, chunk_size):
+            if start_frame == 0:
+                team_assigner.assign_team_color(frames[0], tracks["players"][0])
+            team_assigner.assign_teams_to_table(table, frames, start_frame)
+            start_frame += len(frames)
+    print(f"Team cache: {team_assigner.team_cache.stats()}")
+
+    with profiler.stage("ball_assignment", num_frames):
+        player_assigner = PlayerBallAssigner()
+        team_ball_control = player_assigner.assign_ball_to_table(table)
+        possession = PossessionStats(team_ball_control, player_assigner.get_ball_player(table), fps)
+    print_possession(possession)
+
+    analytics = None
+    if pitch_control:
+        with profiler.stage("pitch_control", num_frames):
+            analytics = PitchAnalytics.from_table(table, fps, cache=cache)
+            analytics.control_share()
+        print_pitch_control(analytics)
+    if export_format is not None:
+        with profiler.stage("export", num_frames):
+            export_tracks(table, possession, camera_mvmt_frame, output_path, export_format, analytics)
+    tracks = table.to_tracks(team_assigner.team_colors)
+
+    print("Drawing annotations and saving output...")
+    with profiler.stage("render_encode", num_frames):
+        renderer = Renderer(tracker, tracks, possession, camera_mvmt_frame, first_frame.shape, analytics, team_assigner.team_colors)
+        save_video(renderer.render_frames(read_video_chunks(video_path, chunk_size)), output_path, codec=OUTPUT_CODEC, source_path=video_path)
+
+    profiler.end()
+    print("Done!!!")
+
+def main_parallel(fast_camera=False, detect_every=DETECT_EVERY, multi_scale=MULTI_SCALE, backend=BACKEND, threads=THREADS, export_format=EXPORT_FORMAT):
+    # Decode, optical flow, detection, annotation and encoding each run in their own process
+    first_frame = read_first_frame(VIDEO_PATH)
+
+    print("Detecting and tracking objects...")
+    scheduler = StageScheduler(DecodeStage(VIDEO_PATH), [FlowStage(fast_camera), DetectStage(MODEL_PATH, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads), BallStage(), TeamStage()], first_frame.shape)
+    results = scheduler.run()
+    scheduler.report()
+
+    tracks = {obj: [meta["tracks"][obj] for _, meta in results] for obj in ["players", "refs", "ball"]}
+    camera_mvmt_frame = [meta["camera_mvmt"] for _, meta in results]
+    table = TrackTable.from_tracks(tracks)
+
+    # The ball stage already smoothed the ball frame by frame
+    tracker = Tracker(None)
+    camera_estimator = CameraMovementEstimator(first_frame)
+    fps = get_video_fps(VIDEO_PATH)
+    process_table(tracker, table, camera_estimator, camera_mvmt_frame, fps, smooth_ball=False)
+
+    # Teams were classified by the team stage while frames were in flight
     team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(frames[0], tracks["players"][0])
-    for frame_num, player_track in enumerate(tracks['players']):
-        for player_id, track in player_track.items():
-            team = team_assigner.get_player_team(frames[frame_num], track['bbox'], player_id)
+    team_assigner.team_colors = results[0][1]["team_colors"]
+
+    player_assigner = PlayerBallAssigner()
+    team_ball_control = player_assigner.assign_ball_to_table(table)
+    possession = PossessionStats(team_ball_control, player_assigner.get_ball_player(table), fps)
+    print_possession(possession)
+    if export_format is not None:
+        export_tracks(table, possession, camera_mvmt_frame, OUTPUT_PATH, export_format)
+    tracks = table.to_tracks(team_assigner.team_colors)
 
-            tracks["players"][frame_num][player_id]["team"] = team
-            
-            tracks["players"][frame_num][player_id]["team_color"] = team_assigner.team_colors[team]
+    print("Drawing annotations and saving output...")
+    annotate_stage = AnnotateStage(tracks, possession, camera_mvmt_frame)
+    scheduler = StageScheduler(DecodeStage(VIDEO_PATH), [annotate_stage, EncodeStage(OUTPUT_PATH, fps, OUTPUT_CODEC)], first_frame.shape)
+    scheduler.run()
+    scheduler.report()
+
+    print("Done!!!")
+
+def analyze_tracks(tracks, camera_mvmt_frame, first_frame, video_path=VIDEO_PATH, chunk_size=CHUNK_SIZE):
+    # Everything after tracking for tracks that were not produced by a Tracker in this process
+    table = TrackTable.from_tracks(tracks)
+    tracker = Tracker(None)
+    camera_estimator = CameraMovementEstimator(first_frame)
+    fps = get_video_fps(video_path)
+    process_table(tracker, table, camera_estimator, camera_mvmt_frame, fps)
+
+    print("Assigning player Teams...")
+    team_assigner = TeamAssigner()
+    start_frame = 0
+    for frames in read_video_chunks(video_path, chunk_size):
+        if start_frame == 0:
+            team_assigner.assign_team_color(frames[0], tracks["players"][0])
+        team_assigner.assign_teams_to_table(table, frames, start_frame)
+        start_frame += len(frames)
 
-    # Assign ball to player
     player_assigner = PlayerBallAssigner()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks['players']):
-        ball_bbox = tracks['ball'][frame_num][1]['bbox']
-        assigned_player = player_assigner.assign_ball_player(player_track, ball_bbox)
-
-        if assigned_player != -1:
-            tracks['players'][frame_num][assigned_player]['has_ball'] = True
-            team_ball_control.append(tracks['players'][frame_num][assigned_player]['team'])
-        else:
-            team_ball_control.append(team_ball_control[-1])
-    team_ball_control = np.array(team_ball_control)
+    team_ball_control = player_assigner.assign_ball_to_table(table)
+    possession = PossessionStats(team_ball_control, player_assigner.get_ball_player(table), fps)
+    return tracker, table, team_assigner, possession
+
+def main_sharded(shard_size=SHARD_SIZE, overlap=SHARD_OVERLAP, workers=BATCH_WORKERS, detect_every=DETECT_EVERY, multi_scale=MULTI_SCALE, backend=BACKEND, threads=THREADS, check=False, export_format=EXPORT_FORMAT):
+    # Detection and tracking run on overlapping shards of the video in parallel, ids are stitched at the boundaries
+    first_frame = read_first_frame(VIDEO_PATH)
+    tracker_params = dict(detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads)
+
+    print("Detecting and tracking objects...")
+    tracks, camera_mvmt_frame = run_sharded(VIDEO_PATH, MODEL_PATH, shard_size, overlap, workers, tracker_params, CHUNK_SIZE)
+    tracker, table, team_assigner, possession = analyze_tracks(tracks, camera_mvmt_frame, first_frame)
+    print_possession(possession)
 
-    # Draw output
-    print("Drawing annotations...")
-    ## Draw tracks
-    out_frames = tracker.draw(frames, tracks, team_ball_control)
+    # --check-shards also runs a single pass and reports how far the sharded run is from it
+    if check:
+        print("Checking against a single pass...")
+        reference_tracker = Tracker(MODEL_PATH, **tracker_params)
+        reference_camera = CameraMovementEstimator(first_frame).get_camera_movement_chunks(read_video_chunks(VIDEO_PATH, CHUNK_SIZE))
+        reference_tracks = reference_tracker.get_object_tracks_chunks(read_video_chunks(VIDEO_PATH, CHUNK_SIZE), camera_mvmt_frame=reference_camera)
+        _, reference_table, _, reference_possession = analyze_tracks(reference_tracks, reference_camera, first_frame)
 
-    ## Draw camera mvmt
-    out_frames = camera_estimator.draw_camera_movement(out_frames, camera_mvmt_frame)
+        report = compare_sharded(
+            {"tracks": reference_tracks, "camera_mvmt": reference_camera, "table": reference_table, "possession": reference_possession},
+            {"tracks": tracks, "camera_mvmt": camera_mvmt_frame, "table": table, "possession": possession})
+        for obj, obj_report in report["tracks"].items():
+            print(f"{obj}: recall {obj_report['recall']:.3f}, precision {obj_report['precision']:.3f}, mean IoU {obj_report['mean_iou']:.3f}")
+        print(f"Id consistency {report['id_consistency']:.3f}, camera error {report['camera_error']:.2f}px, possession share error {report['possession_share']:.3f}, distance error {report['distance']*100:.1f}%")
+        failed = [name for name, ok in report["within_tolerance"].items() if not ok]
+        print(f"Within tolerance {SHARD_TOLERANCE}" if len(failed) == 0 else f"Outside tolerance: {', '.join(failed)}")
 
-    ## Draw Speed and Distance
-    speed_dis_estimator.draw_speed_dis(out_frames, tracks)
-    
+    if export_format is not None:
+        export_tracks(table, possession, camera_mvmt_frame, OUTPUT_PATH, export_format)
+    tracks = table.to_tracks(team_assigner.team_colors)
 
-    # Saving output
-    print("Saving output...")
-    save_video(out_frames,'output_videos/vid.avi')
+    print("Drawing annotations and saving output...")
+    renderer = Renderer(tracker, tracks, possession, camera_mvmt_frame, first_frame.shape)
+    save_video(renderer.render_frames(read_video_chunks(VIDEO_PATH, CHUNK_SIZE)), OUTPUT_PATH, codec=OUTPUT_CODEC, source_path=VIDEO_PATH)
+
+    print("Done!!!")
+
+def main_batch(source, output_dir=OUTPUT_DIR, workers=BATCH_WORKERS, stream=False, fast_camera=False, detect_every=DETECT_EVERY, multi_scale=MULTI_SCALE, backend=BACKEND, threads=THREADS, profile_dir=None, export_format=EXPORT_FORMAT, pitch_control=False):
+    # Every match in a directory or manifest, each worker loads the model once
+    jobs = find_jobs(source, output_dir)
+    tracker_params = dict(detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads)
+    run_batch(main_stream if stream else main, jobs, MODEL_PATH, workers, os.path.join(output_dir, 'batch_state'), tracker_params, dict(fast_camera=fast_camera, export_format=export_format, pitch_control=pitch_control), profile_dir)
+
+    print("Done!!!")
+
+def main_live(source=VIDEO_PATH, latency_budget=LATENCY_BUDGET, detect_every=DETECT_EVERY, backend=BACKEND, threads=THREADS, display=False):
+    # Frames are processed as they arrive, a file is replayed at its own frame rate like a camera
+    print(f"Processing {source} live...")
+    run_live(source, MODEL_PATH, OUTPUT_PATH, latency_budget, display=display, detect_every=detect_every, codec=OUTPUT_CODEC, backend=backend, threads=threads)
 
     print("Done!!!")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    fast_camera = '--fast-camera' in sys.argv
+    multi_scale = '--multi-scale' in sys.argv
+    detect_every = DETECT_EVERY
+    backend = BACKEND
+    threads = THREADS
+    source = VIDEO_PATH
+    latency_budget = LATENCY_BUDGET
+    profile_dir = PROFILE_DIR
+    output_dir = OUTPUT_DIR
+    workers = BATCH_WORKERS
+    batch = None
+    shard_size = SHARD_SIZE
+    overlap = SHARD_OVERLAP
+    export_format = None if '--no-export' in sys.argv else EXPORT_FORMAT
+    # --pitch-control adds heatmaps and a pitch control minimap, main, --stream and --batch only
+    pitch_control = '--pitch-control' in sys.argv
+    for arg in sys.argv:
+        if arg.startswith('--detect-every='):
+            detect_every = int(arg.split('=')[1])
+        if arg.startswith('--backend='):
+            backend = arg.split('=')[1]
+        if arg.startswith('--threads='):
+            threads = int(arg.split('=')[1])
+        if arg.startswith('--live='):
+            source = arg.split('=', 1)[1]
+        if arg.startswith('--latency-budget='):
+            latency_budget = float(arg.split('=')[1])/1000
+        if arg.startswith('--profile-dir='):
+            profile_dir = arg.split('=', 1)[1]
+        if arg.startswith('--output-dir='):
+            output_dir = arg.split('=', 1)[1]
+        if arg.startswith('--workers='):
+            workers = int(arg.split('=')[1])
+        if arg.startswith('--batch='):
+            batch = arg.split('=', 1)[1]
+        if arg.startswith('--shard-size='):
+            shard_size = int(arg.split('=')[1])
+        if arg.startswith('--overlap='):
+            overlap = int(arg.split('=')[1])
+        if arg.startswith('--export-format='):
+            export_format = arg.split('=')[1]
+
+    # --profile writes a JSON/CSV report, --cprofile and --trace add a cProfile dump and a Chrome trace
+    profile = any(arg in sys.argv for arg in ['--profile', '--cprofile', '--trace'])
+    profiler = Profiler(profile, profile_dir, cprofile='--cprofile' in sys.argv, trace='--trace' in sys.argv)
+
+    # --batch=<directory or manifest> runs every match on a pool of --workers, a rerun skips finished matches and runs the rest again
+    if batch is not None:
+        main_batch(batch, output_dir, workers, stream='--stream' in sys.argv, fast_camera=fast_camera, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads, profile_dir=profile_dir if profile else None, export_format=export_format, pitch_control=pitch_control)
+    elif '--sharded' in sys.argv:
+        main_sharded(shard_size, overlap, workers, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads, check='--check-shards' in sys.argv, export_format=export_format)
+    elif '--live' in sys.argv or any(arg.startswith('--live=') for arg in sys.argv):
+        main_live(source, latency_budget, detect_every=detect_every, backend=backend, threads=threads, display='--display' in sys.argv)
+    elif '--parallel' in sys.argv:
+        main_parallel(fast_camera=fast_camera, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads, export_format=export_format)
+    elif '--stream' in sys.argv:
+        main_stream(fast_camera=fast_camera, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads, profiler=profiler, export_format=export_format, pitch_control=pitch_control)
+    else:
+        main(fast_camera=fast_camera, detect_every=detect_every, multi_scale=multi_scale, backend=backend, threads=threads, profiler=profiler, export_format=export_format, pitch_control=pitch_control)
\ No newline at end of file
@@ -0,0 +1,3 @@
+from .shared_frame_queue import SharedFrameQueue
+from .stage_scheduler import Stage, SourceStage, StageScheduler
+from .stages import DecodeStage, FlowStage, DetectStage, BallStage, TeamStage, AnnotateStage, EncodeStage
\ No newline at end of file
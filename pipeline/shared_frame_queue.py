@@ -0,0 +1,64 @@
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import numpy as np
+
+class SharedFrameQueue:
+    def __init__(self, frame_shape, num_slots=8, dtype=np.uint8, ctx=None):
+        ctx = ctx or mp.get_context()
+
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.num_slots = num_slots
+
+        frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes*num_slots)
+        self.owner = True
+
+        # Free slot indices bound the queue, only (slot, frame_num, meta) messages are pickled
+        self.free = ctx.Queue(num_slots)
+        self.ready = ctx.Queue(num_slots+1)
+        for slot in range(num_slots):
+            self.free.put(slot)
+
+        self.attach()
+
+    def attach(self):
+        self.slots = np.ndarray((self.num_slots,)+self.frame_shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['slots']
+        state['shm'] = self.shm.name
+        state['owner'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=state['shm'])
+        self.attach()
+
+    def put(self, frame_num, frame, meta=None):
+        slot = self.free.get()
+        self.slots[slot][...] = frame
+        self.ready.put((slot, frame_num, meta))
+
+    def get(self):
+        # Returns (slot, frame_num, frame, meta), frame is a view valid until release(slot)
+        item = self.ready.get()
+        if item is None:
+            return None
+
+        slot, frame_num, meta = item
+        return slot, frame_num, self.slots[slot], meta
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        self.ready.put(None)
+
+    def unlink(self):
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
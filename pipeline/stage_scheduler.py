@@ -0,0 +1,172 @@
+import multiprocessing as mp
+import queue
+import time
+import traceback
+
+from .shared_frame_queue import SharedFrameQueue
+
+class Stage:
+    name = "stage"
+
+    def setup(self):
+        pass
+
+    def process(self, frame_num, frame, meta):
+        # Returns a list of (frame_num, frame, meta), frame views must be copied to be kept
+        return [(frame_num, frame, meta)]
+
+    def flush(self):
+        return []
+
+    def close(self):
+        pass
+
+class SourceStage(Stage):
+    name = "source"
+
+    def generate(self):
+        return iter(())
+
+def emit(out_q, outputs):
+    for frame_num, frame, meta in outputs:
+        if isinstance(out_q, SharedFrameQueue):
+            out_q.put(frame_num, frame, meta)
+        else:
+            out_q.put((frame_num, meta))
+
+def close_queue(out_q):
+    if isinstance(out_q, SharedFrameQueue):
+        out_q.close()
+    else:
+        out_q.put(None)
+
+def run_source(stage, out_q, stats_q):
+    stats = {"stage": stage.name, "frames": 0, "busy": 0.0, "wait_in": 0.0, "wait_out": 0.0}
+    try:
+        stage.setup()
+        t = time.perf_counter()
+        for frame_num, frame, meta in stage.generate():
+            t_busy = time.perf_counter()
+            stats["busy"] += t_busy - t
+
+            emit(out_q, [(frame_num, frame, meta)])
+            t = time.perf_counter()
+            stats["wait_out"] += t - t_busy
+            stats["frames"] += 1
+        stage.close()
+    except Exception:
+        stats["error"] = traceback.format_exc()
+
+    close_queue(out_q)
+    stats_q.put(stats)
+
+def run_stage(stage, in_q, out_q, stats_q):
+    stats = {"stage": stage.name, "frames": 0, "busy": 0.0, "wait_in": 0.0, "wait_out": 0.0}
+    finished = False
+    try:
+        stage.setup()
+        while True:
+            t = time.perf_counter()
+            item = in_q.get()
+            t_in = time.perf_counter()
+            stats["wait_in"] += t_in - t
+
+            if item is None:
+                finished = True
+                outputs = stage.flush()
+                stats["busy"] += time.perf_counter() - t_in
+                emit(out_q, outputs)
+                break
+
+            slot, frame_num, frame, meta = item
+            outputs = stage.process(frame_num, frame, meta)
+            t_busy = time.perf_counter()
+            stats["busy"] += t_busy - t_in
+
+            # Outputs are copied into the next queue before the input slot is reused
+            emit(out_q, outputs)
+            in_q.release(slot)
+            stats["wait_out"] += time.perf_counter() - t_busy
+            stats["frames"] += 1
+        stage.close()
+    except Exception:
+        stats["error"] = traceback.format_exc()
+
+        # Keep draining so upstream stages are not blocked on a full queue
+        while not finished:
+            item = in_q.get()
+            if item is None:
+                finished = True
+            else:
+                in_q.release(item[0])
+
+    close_queue(out_q)
+    stats_q.put(stats)
+
+class StageScheduler:
+    def __init__(self, source, stages, frame_shape, queue_slots=8):
+        self.source = source
+        self.stages = stages
+        self.frame_shape = frame_shape
+        self.queue_slots = queue_slots
+        self.stats = []
+        self.wall_time = 0
+
+    def run(self):
+        ctx = mp.get_context()
+        queues = [SharedFrameQueue(self.frame_shape, self.queue_slots, ctx=ctx) for _ in self.stages]
+        results = ctx.Queue()
+        stats_q = ctx.Queue()
+        out_queues = queues + [results]
+
+        workers = [ctx.Process(target=run_source, args=(self.source, out_queues[0], stats_q), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            workers.append(ctx.Process(target=run_stage, args=(stage, queues[i], out_queues[i+1], stats_q), daemon=True))
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+
+        outputs = []
+        try:
+            while True:
+                try:
+                    item = results.get(timeout=1)
+                except queue.Empty:
+                    if any(worker.exitcode not in (None, 0) for worker in workers):
+                        raise RuntimeError("A pipeline worker exited unexpectedly")
+                    continue
+                if item is None:
+                    break
+                outputs.append(item)
+
+            stats = [stats_q.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for q in queues:
+                q.unlink()
+
+        self.wall_time = time.perf_counter() - start
+
+        order = [self.source.name] + [stage.name for stage in self.stages]
+        self.stats = sorted(stats, key=lambda s: order.index(s["stage"]))
+        for s in self.stats:
+            if "error" in s:
+                raise RuntimeError(f"Stage {s['stage']} failed:\n{s['error']}")
+
+        outputs.sort(key=lambda item: item[0])
+        return outputs
+
+    def report(self):
+        print(f"{'stage':<10}{'frames':>8}{'busy s':>10}{'fps':>10}{'wait in s':>12}{'wait out s':>12}")
+        for s in self.stats:
+            fps = s["frames"]/s["busy"] if s["busy"] > 0 else float('inf')
+            print(f"{s['stage']:<10}{s['frames']:>8}{s['busy']:>10.2f}{fps:>10.1f}{s['wait_in']:>12.2f}{s['wait_out']:>12.2f}")
+
+        if len(self.stats) > 0:
+            bottleneck = max(self.stats, key=lambda s: s["busy"])
+            print(f"Bottleneck: {bottleneck['stage']} ({self.wall_time:.2f}s wall)")
@@ -0,0 +1,178 @@
+import cv2
+import sys
+sys.path.append('../')
+from utils import VideoWriter
+from trackers import Tracker, BallSmoother
+from team_assigner import TeamAssigner
+from camera_movement import CameraMovementEstimator
+from renderer import Renderer
+
+from .stage_scheduler import Stage, SourceStage
+
+class DecodeStage(SourceStage):
+    name = "decode"
+
+    def __init__(self, path):
+        self.path = path
+
+    def generate(self):
+        cap = cv2.VideoCapture(self.path)
+        frame_num = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame_num, frame, {}
+            frame_num += 1
+        cap.release()
+
+class FlowStage(Stage):
+    name = "flow"
+
+    def __init__(self, fast=False):
+        self.fast = fast
+
+    def setup(self):
+        self.estimator = None
+
+    def process(self, frame_num, frame, meta):
+        if self.estimator is None:
+            self.estimator = CameraMovementEstimator(frame)
+
+        if self.fast:
+            meta["camera_mvmt"] = self.estimator.get_frame_movement_fast(frame)
+        else:
+            meta["camera_mvmt"] = self.estimator.get_frame_movement(frame)
+        return [(frame_num, frame, meta)]
+
+class DetectStage(Stage):
+    name = "detect"
+
+    def __init__(self, model_path, batch_sz=None, detect_every=1, multi_scale=False, backend='ultralytics', threads=None):
+        self.model_path = model_path
+        self.batch_sz = batch_sz
+        self.detect_every = detect_every
+        self.multi_scale = multi_scale
+        self.backend = backend
+        self.threads = threads
+
+    def setup(self):
+        self.tracker = Tracker(self.model_path, detect_every=self.detect_every, multi_scale=self.multi_scale, batch_sz=self.batch_sz, backend=self.backend, threads=self.threads)
+        # None lets the tracker size the batch for this machine
+        self.batch_sz = self.tracker.batch_sz
+        self.batch = []
+
+    def process(self, frame_num, frame, meta):
+        # The input slot is recycled after this call, so buffered frames are copied
+        self.batch.append((frame_num, frame.copy(), meta))
+        if len(self.batch) < self.batch_sz:
+            return []
+        return self.flush()
+
+    def flush(self):
+        if len(self.batch) == 0:
+            return []
+
+        frames = [frame for _, frame, _ in self.batch]
+        keyframes = None
+        if self.detect_every > 1:
+            keyframes = self.tracker.propagator.get_keyframes(frames, self.batch[0][0])
+
+        # The flow stage runs upstream, so camera movement is already known for every frame in the batch
+        camera_mvmt = [meta["camera_mvmt"] for _, _, meta in self.batch]
+        arrays = self.tracker.detect_chunk(frames, keyframes, self.batch[0][0])
+        tracks = {"players": [], "refs": [], "ball": []}
+        self.tracker.add_detections_to_tracks(tracks, self.tracker.arrays_to_detections(arrays, len(self.batch)), self.tracker.model.names, keyframes, camera_mvmt, self.batch[0][0])
+
+        outputs = []
+        for i, (frame_num, frame, meta) in enumerate(self.batch):
+            meta["tracks"] = {obj: obj_tracks[i] for obj, obj_tracks in tracks.items()}
+            outputs.append((frame_num, frame, meta))
+
+        self.batch = []
+        return outputs
+
+class BallStage(Stage):
+    name = "ball"
+
+    def __init__(self, lookahead=12):
+        self.lookahead = lookahead
+
+    def setup(self):
+        self.smoother = BallSmoother(lookahead=self.lookahead)
+        self.pending = {}
+
+    def process(self, frame_num, frame, meta):
+        # Frames wait here until the smoother has seen lookahead frames past them
+        ball = meta["tracks"]["ball"].get(1)
+        self.pending[frame_num] = (frame.copy(), meta)
+        return self.emit(self.smoother.update(frame_num, ball["bbox"] if ball is not None else None))
+
+    def flush(self):
+        return self.emit(self.smoother.flush())
+
+    def emit(self, smoothed):
+        outputs = []
+        for frame_num, bbox, confidence in smoothed:
+            frame, meta = self.pending.pop(frame_num)
+            meta["tracks"]["ball"] = {1: {"bbox": bbox, "confidence": confidence}} if bbox is not None else {}
+            outputs.append((frame_num, frame, meta))
+        return outputs
+
+class TeamStage(Stage):
+    name = "team"
+
+    def setup(self):
+        self.team_assigner = TeamAssigner()
+
+    def process(self, frame_num, frame, meta):
+        players = meta["tracks"]["players"]
+        if frame_num == 0:
+            self.team_assigner.assign_team_color(frame, players)
+            meta["team_colors"] = self.team_assigner.team_colors
+
+        player_ids = list(players.keys())
+        teams = self.team_assigner.get_player_teams(frame, [player["bbox"] for player in players.values()], player_ids, frame_num)
+        for player_id, team in zip(player_ids, teams.tolist()):
+            players[player_id]["team"] = team
+
+        return [(frame_num, frame, meta)]
+
+class AnnotateStage(Stage):
+    name = "annotate"
+
+    def __init__(self, tracks, possession, camera_mvmt_frame):
+        self.tracks = tracks
+        self.possession = possession
+        self.camera_mvmt_frame = camera_mvmt_frame
+
+    def setup(self):
+        self.renderer = None
+
+    def process(self, frame_num, frame, meta):
+        if self.renderer is None:
+            self.renderer = Renderer(Tracker(None), self.tracks, self.possession, self.camera_mvmt_frame, frame.shape)
+
+        # The slot is copied into the next queue before it is reused, so drawing in place is safe
+        self.renderer.render(frame, frame_num)
+        return [(frame_num, frame, meta)]
+
+class EncodeStage(Stage):
+    name = "encode"
+
+    def __init__(self, path, fps=24, codec='XVID'):
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+
+    def setup(self):
+        # Already its own process, and the slot is reused right after process returns
+        self.writer = VideoWriter(self.path, self.fps, codec=self.codec, threaded=False)
+
+    def process(self, frame_num, frame, meta):
+        self.writer.write(frame)
+        return []
+
+    def close(self):
+        stats = self.writer.close()
+        print(f"Encoded {stats['frames']} frames with {stats['codec']} at {stats['encode_fps']:.1f} fps")
@@ -1,6 +1,8 @@
+import numpy as np
 import sys
 sys.path.append('../')
 from utils import get_center_bbox, measure_distance
+from .possession import PossessionStats
 
 class PlayerBallAssigner():
     def __init__(self):
@@ -25,3 +27,91 @@ class PlayerBallAssigner():
                     assigned_player = id
 
         return assigned_player
+
+    def assign_ball_to_tracks(self, tracks, team_ball_control, start_frame, end_frame):
+        for frame_num in range(start_frame, end_frame):
+            player_track = tracks['players'][frame_num]
+            ball_bbox = tracks['ball'][frame_num][1]['bbox']
+            assigned_player = self.assign_ball_player(player_track, ball_bbox)
+
+            if assigned_player != -1:
+                tracks['players'][frame_num][assigned_player]['has_ball'] = True
+                team_ball_control.append(tracks['players'][frame_num][assigned_player]['team'])
+            elif len(team_ball_control) > 0:
+                team_ball_control.append(team_ball_control[-1])
+            else:
+                # Nobody has had the ball yet
+                team_ball_control.append(0)
+
+        return team_ball_control
+
+    def assign_ball_players(self, player_frames, foot_corners, ball_centers):
+        # player_frames (N,), foot_corners (N,2,2) bottom-left and bottom-right corners, ball_centers (F,2) NaN without ball
+        # Returns, per frame, the index of the player closest to the ball or -1
+        num_frames = len(ball_centers)
+        assigned = np.full(num_frames, -1, dtype=np.int64)
+        if len(player_frames) == 0:
+            return assigned
+
+        # Every player is only compared with the ball of its own frame, so this is a single O(N) pass
+        ball_pos = ball_centers[player_frames][:,None,:]
+        dis = np.sqrt(((foot_corners-ball_pos)**2).sum(axis=2)).min(axis=1)
+
+        candidates = np.flatnonzero(dis < self.max_distance)
+
+        # Closest player per frame, ties go to the first player as in assign_ball_player
+        order = np.lexsort((candidates, dis[candidates], player_frames[candidates]))
+        candidates = candidates[order]
+        frames = player_frames[candidates]
+        first = np.r_[True, frames[1:] != frames[:-1]] if len(frames) > 0 else np.zeros(0, dtype=bool)
+
+        assigned[frames[first]] = candidates[first]
+        return assigned
+
+    def get_team_ball_control(self, ball_team):
+        # Frames without an assignment keep the previous team, frames before the first one stay 0
+        ball_team = np.asarray(ball_team)
+        last_assigned = np.maximum.accumulate(np.where(ball_team > 0, np.arange(len(ball_team)), 0))
+        return ball_team[last_assigned]
+
+    def get_possession_runs(self, team_ball_control):
+        # Maximal runs of frames controlled by the same team, end is exclusive
+        return PossessionStats(team_ball_control).streaks()
+
+    def summarize_possession_runs(self, runs):
+        summary = {}
+        for team in np.unique(runs["team"]).tolist():
+            team_frames = runs["frames"][runs["team"] == team]
+            summary[team] = {
+                "frames": int(team_frames.sum()),
+                "runs": len(team_frames),
+                "longest": int(team_frames.max())
+            }
+        return summary
+
+    def assign_ball_to_table(self, table):
+        num_frames = table.num_frames
+
+        ball_centers = np.full((num_frames,2), np.nan)
+        ball = table.class_mask("ball")
+        ball_bbox = table.bbox[ball]
+        ball_centers[table.frame[ball]] = np.trunc((ball_bbox[:,:2]+ball_bbox[:,2:])/2)
+
+        players = np.flatnonzero(table.class_mask("players"))
+        player_bbox = table.bbox[players]
+        foot_corners = np.stack([player_bbox[:,[0,3]], player_bbox[:,[2,3]]], axis=1)
+
+        assigned = self.assign_ball_players(table.frame[players], foot_corners, ball_centers)
+        has_ball = players[assigned[assigned >= 0]]
+        table.has_ball[has_ball] = True
+
+        ball_team = np.zeros(num_frames, dtype=np.int8)
+        ball_team[table.frame[has_ball]] = table.team[has_ball]
+
+        return self.get_team_ball_control(ball_team)
+
+    def get_ball_player(self, table):
+        # Track id of the player assigned the ball per frame, -1 where nobody was
+        ball_player = np.full(table.num_frames, -1, dtype=np.int64)
+        ball_player[table.frame[table.has_ball]] = table.track_id[table.has_ball]
+        return ball_player
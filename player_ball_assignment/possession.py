@@ -0,0 +1,112 @@
+import numpy as np
+
+class RunningPossession:
+    def __init__(self):
+        # Frames each team has had the ball so far, O(1) per frame instead of re-slicing the history
+        self.counts = {1: 0, 2: 0}
+        self.team = 0
+        self.frames = 0
+
+    def update(self, team):
+        # team 0 means nobody was assigned this frame, the previous team keeps the ball
+        if team > 0:
+            self.team = team
+        if self.team > 0:
+            self.counts[self.team] = self.counts.get(self.team, 0) + 1
+        self.frames += 1
+        return self.team
+
+    def control(self, team):
+        controlled = max(sum(self.counts.values()), 1)
+        return self.counts.get(team, 0)/controlled
+
+class PossessionStats:
+    def __init__(self, team_ball_control, ball_player=None, fps=24):
+        # team_ball_control is the team in control per frame (0 before anyone had the ball),
+        # ball_player the track id of the player assigned the ball per frame or -1
+        self.team_control = np.asarray(team_ball_control, dtype=np.int64).reshape(-1)
+        self.num_frames = len(self.team_control)
+        self.fps = fps
+
+        # Frames controlled by team 0, 1 and 2 up to and including each frame, the one pass everything reads from
+        num_teams = max(int(self.team_control.max()) + 1 if self.num_frames > 0 else 0, 3)
+        self.cumulative = np.vstack([np.zeros((1,num_teams), dtype=np.int64), np.cumsum(np.eye(num_teams, dtype=np.int64)[self.team_control], axis=0)])
+
+        self.ball_player = None
+        if ball_player is not None:
+            ball_player = np.asarray(ball_player, dtype=np.int64).reshape(-1)
+            # A player keeps the ball until someone else is assigned it, like the team control
+            last_assigned = np.maximum.accumulate(np.where(ball_player >= 0, np.arange(len(ball_player)), -1))
+            self.ball_player = np.where(last_assigned >= 0, ball_player[np.maximum(last_assigned, 0)], -1)
+
+    def counts(self, frame_num):
+        # Frames controlled by team 1 and team 2 up to and including frame_num
+        row = self.cumulative[frame_num+1]
+        return int(row[1]), int(row[2])
+
+    def shares(self, start=0, end=None):
+        # Per frame share of team 1 and team 2 since start, or over a rolling window when start < 0
+        end = self.num_frames if end is None else end
+        frames = np.arange(end)
+        low = np.maximum(frames + 1 + start, 0) if start < 0 else np.minimum(start, frames + 1)
+        counts = self.cumulative[frames+1, 1:3] - self.cumulative[low, 1:3]
+        controlled = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+        return counts/controlled
+
+    def rolling_shares(self, window):
+        return self.shares(-window)
+
+    def streaks(self):
+        # Maximal runs of frames controlled by the same team, end is exclusive
+        change = np.flatnonzero(np.diff(self.team_control) != 0) + 1
+        starts = np.r_[0, change] if self.num_frames > 0 else np.zeros(0, dtype=np.int64)
+        ends = np.r_[change, self.num_frames] if self.num_frames > 0 else np.zeros(0, dtype=np.int64)
+
+        teams = self.team_control[starts]
+        controlled = teams > 0
+
+        return {
+            "team": teams[controlled],
+            "start": starts[controlled],
+            "end": ends[controlled],
+            "frames": (ends-starts)[controlled]
+        }
+
+    def turnovers(self):
+        # Frames where control passes from one team straight to the other
+        runs = self.streaks()
+        changed = np.flatnonzero(runs["team"][1:] != runs["team"][:-1]) + 1
+        return {
+            "frame": runs["start"][changed],
+            "from_team": runs["team"][changed-1],
+            "to_team": runs["team"][changed]
+        }
+
+    def player_possession(self):
+        # Frames and seconds each player had the ball, most first
+        if self.ball_player is None:
+            return {"track_id": np.zeros(0, dtype=np.int64), "frames": np.zeros(0, dtype=np.int64), "seconds": np.zeros(0)}
+
+        track_ids, frames = np.unique(self.ball_player[self.ball_player >= 0], return_counts=True)
+        order = np.argsort(-frames, kind='stable')
+        return {"track_id": track_ids[order], "frames": frames[order], "seconds": frames[order]/self.fps}
+
+    def summary(self):
+        runs = self.streaks()
+        turnovers = self.turnovers()
+        total = self.counts(self.num_frames-1) if self.num_frames > 0 else (0, 0)
+        controlled = max(sum(total), 1)
+
+        summary = {"teams": {}, "turnovers": len(turnovers["frame"])}
+        for team in [1, 2]:
+            team_frames = runs["frames"][runs["team"] == team]
+            summary["teams"][team] = {
+                "frames": int(team_frames.sum()),
+                "share": total[team-1]/controlled,
+                "runs": len(team_frames),
+                "longest": int(team_frames.max()) if len(team_frames) > 0 else 0
+            }
+
+        players = self.player_possession()
+        summary["players"] = {int(track_id): int(frames) for track_id, frames in zip(players["track_id"], players["frames"])}
+        return summary
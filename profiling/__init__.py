@@ -0,0 +1 @@
+from .profiler import Profiler, HOT_FUNCTIONS, get_rss_mb
\ No newline at end of file
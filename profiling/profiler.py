@@ -0,0 +1,225 @@
+import threading
+import resource
+import cProfile
+import json
+import time
+import csv
+import sys
+import os
+
+# Per-call counters for these are installed by Profiler.instrument, module path and attribute
+HOT_FUNCTIONS = [
+    ("team_assigner.team_assigner", "TeamAssigner.get_player_color"),
+    ("team_assigner.team_assigner", "TeamAssigner.get_player_colors"),
+    ("view_transformer.view_transformer", "ViewTransformer.transform_point"),
+    ("view_transformer.view_transformer", "ViewTransformer.transform_points"),
+    ("player_ball_assignment.player_ball_assigner", "PlayerBallAssigner.assign_ball_player"),
+    ("player_ball_assignment.player_ball_assigner", "PlayerBallAssigner.assign_ball_players"),
+    ("utils.bbox_utils", "measure_distance"),
+    ("trackers.tracker", "Tracker.detect_frames"),
+    ("camera_movement.camera_movement_estimator", "CameraMovementEstimator.get_frame_movement"),
+    ("camera_movement.camera_movement_estimator", "CameraMovementEstimator.get_frame_movement_fast"),
+    ("renderer.renderer", "Renderer.render"),
+    ("utils.video_writer", "VideoWriter.write"),
+]
+
+def get_rss_mb():
+    # Current resident set size, falls back to the peak where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/(1<<20)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+class NullStage:
+    # Shared no-op stage so a disabled profiler costs one attribute lookup per stage
+    frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Stage:
+    def __init__(self, profiler, name, frames):
+        self.profiler = profiler
+        self.name = name
+        self.frames = frames
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.rss_start = get_rss_mb()
+        self.profiler.peak_rss = self.rss_start
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        rss_end = get_rss_mb()
+        elapsed = end - self.start
+        record = {
+            "stage": self.name,
+            "seconds": elapsed,
+            "frames": self.frames,
+            "fps": self.frames/elapsed if self.frames > 0 and elapsed > 0 else 0.0,
+            "rss_start_mb": self.rss_start,
+            "rss_end_mb": rss_end,
+            "peak_rss_mb": max(self.profiler.peak_rss, rss_end),
+            "start": self.start - self.profiler.start,
+        }
+        self.profiler.stages.append(record)
+        if exc_type is None and self.profiler.on_stage is not None:
+            self.profiler.on_stage(record)
+        return False
+
+class Profiler:
+    def __init__(self, enabled=False, output_dir='profiles', cprofile=False, trace=False, sample_interval=0.05, on_stage=None):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.cprofile = cprofile
+        self.trace = trace
+        self.sample_interval = sample_interval
+
+        # Called with the record of every stage that finished without an error, even when disabled
+        self.on_stage = on_stage
+
+        self.stages = []
+        self.calls = {}
+        self.patched = []
+        self.start = time.perf_counter()
+        self.peak_rss = 0.0
+        self.profile = None
+        self.sampler = None
+        self.running = False
+
+    def stage(self, name, frames=0):
+        # with profiler.stage("detect", frames=n) as stage: ... stage.frames may be set inside
+        if not self.enabled and self.on_stage is None:
+            return NULL_STAGE
+        return Stage(self, name, frames)
+
+    def begin(self):
+        if not self.enabled:
+            return self
+        self.start = time.perf_counter()
+        self.instrument()
+
+        # RSS is sampled in the background so every stage gets its own peak
+        self.running = True
+        self.sampler = threading.Thread(target=self.sample_rss, daemon=True)
+        self.sampler.start()
+
+        if self.cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def sample_rss(self):
+        while self.running:
+            self.peak_rss = max(self.peak_rss, get_rss_mb())
+            time.sleep(self.sample_interval)
+
+    def end(self):
+        if not self.enabled:
+            return None
+        if self.profile is not None:
+            self.profile.disable()
+        self.running = False
+        if self.sampler is not None:
+            self.sampler.join()
+        self.restore()
+        return self.save()
+
+    def instrument(self, functions=HOT_FUNCTIONS):
+        # Functions are wrapped at runtime, nothing is patched while the profiler is disabled
+        for module_name, attr in functions:
+            module = sys.modules.get(module_name)
+            if module is None:
+                continue
+            owner = module
+            *owner_path, name = attr.split('.')
+            for part in owner_path:
+                owner = getattr(owner, part)
+            original = owner.__dict__.get(name) if isinstance(owner, type) else getattr(owner, name, None)
+            if original is None:
+                continue
+
+            wrapper = self.wrap(attr, original)
+            setattr(owner, name, wrapper)
+            self.patched.append((owner, name, original))
+
+            # Plain functions are also rebound where other modules imported them by name
+            if not isinstance(owner, type):
+                for other in list(sys.modules.values()):
+                    if other is not module and getattr(other, name, None) is original:
+                        setattr(other, name, wrapper)
+                        self.patched.append((other, name, original))
+
+    def wrap(self, key, function):
+        counter = self.calls.setdefault(key, {"calls": 0, "seconds": 0.0})
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter["calls"] += 1
+                counter["seconds"] += time.perf_counter() - start
+
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def restore(self):
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+
+    def report(self):
+        return {
+            "wall_seconds": time.perf_counter() - self.start,
+            "peak_rss_mb": max([self.peak_rss] + [stage["peak_rss_mb"] for stage in self.stages]),
+            "stages": self.stages,
+            "calls": self.calls,
+        }
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        run = time.strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(self.output_dir, f"run-{run}")
+        report = self.report()
+
+        with open(base + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+
+        columns = ["stage", "seconds", "frames", "fps", "rss_start_mb", "rss_end_mb", "peak_rss_mb"]
+        with open(base + '.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for stage in self.stages:
+                writer.writerow([stage[column] for column in columns])
+
+        if self.profile is not None:
+            self.profile.dump_stats(base + '.prof')
+
+        if self.trace:
+            # Chrome trace format, opens in chrome://tracing or Perfetto
+            events = [
+                {"name": stage["stage"], "ph": "X", "ts": stage["start"]*1e6, "dur": stage["seconds"]*1e6, "pid": os.getpid(), "tid": 0, "args": {"frames": stage["frames"], "peak_rss_mb": stage["peak_rss_mb"]}}
+                for stage in self.stages
+            ]
+            with open(base + '.trace.json', 'w') as f:
+                json.dump({"traceEvents": events}, f)
+
+        self.print_report(report)
+        print(f"Profile written to {base}.json")
+        return report
+
+    def print_report(self, report):
+        print(f"{'stage':<20}{'seconds':>10}{'frames':>8}{'fps':>10}{'peak MB':>10}")
+        for stage in report["stages"]:
+            print(f"{stage['stage']:<20}{stage['seconds']:>10.2f}{stage['frames']:>8}{stage['fps']:>10.1f}{stage['peak_rss_mb']:>10.0f}")
+        for key, counter in sorted(report["calls"].items(), key=lambda item: -item[1]["seconds"]):
+            if counter["calls"] > 0:
+                print(f"{key:<55}{counter['calls']:>10} calls {counter['seconds']:>8.2f}s")
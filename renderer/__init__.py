@@ -0,0 +1 @@
+from .renderer import Renderer
\ No newline at end of file
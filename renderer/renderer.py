@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_foot
+from player_ball_assignment import PossessionStats
+
+class Renderer():
+    def __init__(self, tracker, tracks, possession, camera_mvmt_frame, frame_shape, analytics=None, team_colors=None):
+        # tracker only provides the ellipse and triangle primitives
+        self.tracker = tracker
+        self.tracks = tracks
+        self.camera_mvmt_frame = camera_mvmt_frame
+
+        # Ball control counts are read from the cumulative possession stats, O(1) per frame
+        if possession is not None and not isinstance(possession, PossessionStats):
+            possession = PossessionStats(possession)
+        self.possession = possession
+
+        # (rows, cols, alpha, solid panel) for each translucent panel, clipped to the frame
+        self.ball_control_panel = self.get_panel(frame_shape, (1350,850), (1900,970), 0.4)
+        self.camera_panel = self.get_panel(frame_shape, (0,0), (500,100), 0.6)
+
+        # Pitch control minimap in the top right corner, scale pixels per cell, read from the
+        # analytics' cached chunks frame by frame
+        self.analytics = analytics
+        if analytics is not None:
+            team_colors = team_colors or {}
+            self.control_colors = np.array([(255,255,255), team_colors.get(1, (255,0,0)), team_colors.get(2, (0,0,255))], dtype=np.uint8)
+            self.control_scale = 3
+            width, height = analytics.nx*self.control_scale, analytics.ny*self.control_scale
+            self.control_panel = self.get_panel(frame_shape, (frame_shape[1]-width-10,10), (frame_shape[1]-11,height+9), 0.6)
+
+    def get_panel(self, frame_shape, pt1, pt2, alpha, color=(255,255,255)):
+        # Same pixels a filled cv2.rectangle covers, both corners included
+        rows = slice(max(pt1[1], 0), min(pt2[1]+1, frame_shape[0]))
+        cols = slice(max(pt1[0], 0), min(pt2[0]+1, frame_shape[1]))
+        panel = np.empty((rows.stop-rows.start, cols.stop-cols.start, 3), dtype=np.uint8)
+        panel[:] = color
+        return rows, cols, alpha, panel
+
+    def blend_panel(self, frame, panel):
+        rows, cols, alpha, solid = panel
+        if solid.size == 0:
+            return
+        frame[rows, cols] = cv2.addWeighted(solid, alpha, frame[rows, cols], 1-alpha, 0)
+
+    def render(self, frame, frame_num):
+        # Draws every overlay onto frame in place, in the order the separate draw passes used
+        self.draw_frame(
+            frame,
+            self.tracks["players"][frame_num],
+            self.tracks["refs"][frame_num],
+            self.tracks["ball"][frame_num],
+            *self.possession.counts(frame_num),
+            self.camera_mvmt_frame[frame_num]
+        )
+        if self.analytics is not None:
+            self.draw_pitch_control(frame, frame_num)
+        return frame
+
+    def draw_pitch_control(self, frame, frame_num):
+        rows, cols, alpha, _ = self.control_panel
+        if rows.stop <= rows.start or cols.stop <= cols.start:
+            return
+        grid = self.analytics.control_frame(frame_num)
+        image = np.repeat(np.repeat(self.control_colors[grid], self.control_scale, axis=0), self.control_scale, axis=1)
+        frame[rows, cols] = cv2.addWeighted(image[:rows.stop-rows.start, :cols.stop-cols.start], alpha, frame[rows, cols], 1-alpha, 0)
+
+    def draw_frame(self, frame, player_dict, ref_dict, ball_dict, team_1_control, team_2_control, camera_mvmt):
+        # Everything for one frame is passed in, so live mode can draw without the whole video
+        for track_id, player in player_dict.items():
+            color = player.get("team_color", (0,0,255))
+            self.tracker.draw_ellipse(frame, player["bbox"], color, track_id)
+
+            if player.get('has_ball', False):
+                self.tracker.draw_triangle(frame, player["bbox"], (0,0,255))
+
+        for _, ref in ref_dict.items():
+            self.tracker.draw_ellipse(frame, ref["bbox"], (0,255,255))
+
+        for _, ball in ball_dict.items():
+            self.tracker.draw_triangle(frame, ball["bbox"], (0,255,0))
+
+        # Team ball control, frames before anyone had the ball are left out
+        self.blend_panel(frame, self.ball_control_panel)
+        controlled = max(team_1_control+team_2_control, 1)
+        cv2.putText(frame, f"Team 1 Ball Control: {team_1_control/controlled*100:.2f}%", (1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        cv2.putText(frame, f"Team 2 Ball Control: {team_2_control/controlled*100:.2f}%", (1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+
+        # Camera movement
+        self.blend_panel(frame, self.camera_panel)
+        x_mvmt, y_mvmt = camera_mvmt
+        cv2.putText(frame, f"Camera Movement X: {x_mvmt:.2f}", (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        cv2.putText(frame, f"Camera Movement Y: {y_mvmt:.2f}", (10,60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+
+        # Speed and distance under players and refs
+        for track_info in list(player_dict.values()) + list(ref_dict.values()):
+            speed = track_info.get("speed", None)
+            dis = track_info.get('distance', None)
+            if speed is None or dis is None:
+                continue
+
+            pos = get_foot(track_info['bbox'])
+            pos = (int(pos[0]), int(pos[1]+40))
+            cv2.putText(frame, f"{speed:.2f}km/h", pos, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
+            cv2.putText(frame, f"{dis:.2f}m", (pos[0], pos[1]+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
+
+        return frame
+
+    def render_frames(self, chunks, start_frame=0):
+        # One annotated frame at a time, ready to be handed to the encoder
+        frame_num = start_frame
+        for frames in chunks:
+            for frame in frames:
+                yield self.render(frame, frame_num)
+                frame_num += 1
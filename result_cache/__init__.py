@@ -0,0 +1 @@
+from .result_cache import ResultCache, file_digest
\ No newline at end of file
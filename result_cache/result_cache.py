@@ -0,0 +1,157 @@
+import numpy as np
+import hashlib
+import json
+import shutil
+import os
+
+def file_digest(path, sample_size=1<<20, num_samples=16):
+    # Hashes the size and evenly spaced samples of the file, None hashes the whole file
+    digest = hashlib.sha1()
+    if not os.path.exists(path):
+        digest.update(str(path).encode())
+        return digest.hexdigest()
+
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, 'rb') as f:
+        if sample_size is None or size <= sample_size*num_samples:
+            for block in iter(lambda: f.read(1<<20), b''):
+                digest.update(block)
+        else:
+            for offset in np.linspace(0, size-sample_size, num_samples).astype(np.int64).tolist():
+                f.seek(offset)
+                digest.update(f.read(sample_size))
+
+    return digest.hexdigest()
+
+class ResultCache:
+    def __init__(self, cache_dir='cache', max_bytes=2<<30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # chunk directory -> [size in bytes, last access time]
+        self.entries = {}
+        # key directory -> size of its meta.json, counted against max_bytes too
+        self.meta_bytes = {}
+        for key in os.listdir(cache_dir):
+            key_dir = os.path.join(cache_dir, key)
+            if not os.path.isdir(key_dir):
+                continue
+            for chunk in os.listdir(key_dir):
+                chunk_dir = os.path.join(key_dir, chunk)
+                if os.path.isdir(chunk_dir) and '.tmp' not in chunk:
+                    self.entries[chunk_dir] = [self.dir_size(chunk_dir), os.path.getmtime(chunk_dir)]
+
+            meta_path = os.path.join(key_dir, 'meta.json')
+            if os.path.exists(meta_path):
+                self.meta_bytes[key_dir] = os.path.getsize(meta_path)
+
+    def stage_key(self, stage, **inputs):
+        # Any change to the video, the weights or a parameter gives a different key
+        description = json.dumps({"stage": stage, **inputs}, sort_keys=True, default=str)
+        return f"{stage}-{hashlib.sha1(description.encode()).hexdigest()[:20]}"
+
+    def chunk_dir(self, key, start_frame, num_frames):
+        return os.path.join(self.cache_dir, key, f"{start_frame:08d}_{num_frames}")
+
+    def get_chunk(self, key, start_frame, num_frames):
+        chunk_dir = self.chunk_dir(key, start_frame, num_frames)
+        if chunk_dir not in self.entries:
+            self.misses += 1
+            return None
+
+        # Arrays are memory mapped, pages are only read when they are used
+        arrays = {}
+        try:
+            self.touch(chunk_dir)
+            for file_name in os.listdir(chunk_dir):
+                if file_name.endswith('.npy'):
+                    arrays[file_name[:-4]] = np.load(os.path.join(chunk_dir, file_name), mmap_mode='r')
+        except OSError:
+            # Another process sharing the directory evicted it after this index was built
+            del self.entries[chunk_dir]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return arrays
+
+    def put_chunk(self, key, start_frame, num_frames, arrays):
+        chunk_dir = self.chunk_dir(key, start_frame, num_frames)
+        tmp_dir = f"{chunk_dir}.tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(array))
+
+        # Readers never see a half written entry
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, chunk_dir)
+        except OSError:
+            # Another process put the same key first, its arrays are the same as these
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(chunk_dir):
+                raise
+
+        self.entries[chunk_dir] = [self.dir_size(chunk_dir), 0]
+        self.touch(chunk_dir)
+        self.evict()
+
+    def get_meta(self, key):
+        meta_path = os.path.join(self.cache_dir, key, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def put_meta(self, key, meta):
+        key_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(key_dir, exist_ok=True)
+        with open(os.path.join(key_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self.meta_bytes[key_dir] = os.path.getsize(os.path.join(key_dir, 'meta.json'))
+
+    def miss(self):
+        # For lookups that are known to miss without reaching get_chunk
+        self.misses += 1
+        return None
+
+    def touch(self, chunk_dir):
+        os.utime(chunk_dir)
+        self.entries[chunk_dir][1] = os.path.getmtime(chunk_dir)
+
+    def evict(self):
+        # Least recently used chunks go first, a key goes with its meta once its last chunk is gone
+        total_bytes = self.size()
+        for chunk_dir, (size, _) in sorted(self.entries.items(), key=lambda entry: entry[1][1]):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            del self.entries[chunk_dir]
+            total_bytes -= size
+            self.evictions += 1
+
+            key_dir = os.path.dirname(chunk_dir)
+            if not any(os.path.dirname(other) == key_dir for other in self.entries):
+                shutil.rmtree(key_dir, ignore_errors=True)
+                total_bytes -= self.meta_bytes.pop(key_dir, 0)
+
+    def dir_size(self, path):
+        return sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+
+    def size(self):
+        return sum(size for size, _ in self.entries.values()) + sum(self.meta_bytes.values())
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
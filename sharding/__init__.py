@@ -0,0 +1,2 @@
+from .shard_merger import plan_shards, merge_shards, match_track_ids, compare_sharded, SHARD_TOLERANCE
+from .shard_runner import run_sharded, process_shard
\ No newline at end of file
@@ -0,0 +1,159 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from trackers import compare_tracks
+from trackers.track_propagator import greedy_match, box_iou
+from camera_movement import compare_camera_movement
+
+# How far a sharded run may be from a single pass over the same video
+SHARD_TOLERANCE = {
+    "recall": 0.98,
+    "id_consistency": 0.95,
+    "camera_error": 1.0,
+    "possession_share": 0.02,
+    "distance": 0.05
+}
+
+def plan_shards(num_frames, shard_size, overlap):
+    # (start, own_start, end) per shard: frames from start are processed, the ones from own_start
+    # are kept and the overlap before own_start only links the shard to the one before it.
+    # The last shard reads to the end, the frame count from the container can be off
+    shards = []
+    for own_start in range(0, max(num_frames, 1), shard_size):
+        end = own_start + shard_size if own_start + shard_size < num_frames else None
+        shards.append((max(own_start - overlap, 0), own_start, end))
+    return shards
+
+def match_track_ids(prev_frames, next_frames, prev_appearance, next_appearance, min_iou=0.3, appearance_weight=0.3):
+    # Tracks of two shards over the frames they share, matched on their mean IoU over those frames
+    # and the distance between their mean shirt colors. Returns {next id: prev id}
+    prev_ids = sorted({track_id for frame in prev_frames for track_id in frame})
+    next_ids = sorted({track_id for frame in next_frames for track_id in frame})
+    if len(prev_ids) == 0 or len(next_ids) == 0:
+        return {}
+    prev_index = {track_id: i for i, track_id in enumerate(prev_ids)}
+    next_index = {track_id: i for i, track_id in enumerate(next_ids)}
+
+    iou_sum = np.zeros((len(prev_ids), len(next_ids)))
+    together = np.zeros((len(prev_ids), len(next_ids)))
+    for prev_frame, next_frame in zip(prev_frames, next_frames):
+        if len(prev_frame) == 0 or len(next_frame) == 0:
+            continue
+        rows = [prev_index[track_id] for track_id in prev_frame]
+        cols = [next_index[track_id] for track_id in next_frame]
+        ious = box_iou([track_info["bbox"] for track_info in prev_frame.values()], [track_info["bbox"] for track_info in next_frame.values()])
+        iou_sum[np.ix_(rows, cols)] += ious
+        together[np.ix_(rows, cols)] += 1
+
+    mean_iou = iou_sum/np.maximum(together, 1)
+    cost = 1 - mean_iou
+
+    # Shirt colors split tracks that cross or overlap at the boundary
+    color_dis = np.zeros_like(cost)
+    for i, prev_id in enumerate(prev_ids):
+        for j, next_id in enumerate(next_ids):
+            if prev_id in prev_appearance and next_id in next_appearance:
+                color_dis[i,j] = np.linalg.norm(np.subtract(prev_appearance[prev_id], next_appearance[next_id]))/(255*np.sqrt(3))
+    cost = (1 - appearance_weight)*cost + appearance_weight*color_dis
+    cost[mean_iou < min_iou] = np.inf
+
+    return {next_ids[j]: prev_ids[i] for i, j in greedy_match(cost)}
+
+def merge_shards(shard_results):
+    # Shard results in order, each {"start", "own_start", "tracks", "camera_mvmt", "appearance"} where
+    # appearance holds mean shirt colors per track over the head and the tail overlap.
+    # Ids are renumbered into one sequence across shards, tracks that continue over a boundary keep theirs
+    tracks = {"players": [], "refs": [], "ball": []}
+    camera_mvmt_frame = []
+    next_id = 1
+    prev_mapping = {}
+    prev_tail = {}
+    stitched, started = 0, 0
+
+    for result in shard_results:
+        skip = result["own_start"] - result["start"]
+        mapping = {}
+        for obj in ["players", "refs"]:
+            obj_mapping = {}
+            if skip > 0 and len(tracks[obj]) > 0:
+                # The overlap of this shard is the tail of what is merged so far
+                prev_frames = tracks[obj][-skip:]
+                prev_appearance = {prev_mapping[obj][track_id]: color for track_id, color in prev_tail[obj].items() if track_id in prev_mapping[obj]}
+                obj_mapping = match_track_ids(prev_frames, result["tracks"][obj][:skip], prev_appearance, result["appearance"]["head"][obj])
+                stitched += len(obj_mapping)
+
+            for frame in result["tracks"][obj][skip:]:
+                for track_id in frame:
+                    if track_id not in obj_mapping:
+                        obj_mapping[track_id] = next_id
+                        next_id += 1
+                        started += 1
+            tracks[obj] += [{obj_mapping[track_id]: track_info for track_id, track_info in frame.items()} for frame in result["tracks"][obj][skip:]]
+            mapping[obj] = obj_mapping
+
+        # There is only one ball, its id is the same in every shard
+        tracks["ball"] += result["tracks"]["ball"][skip:]
+
+        # Movement is relative to the previous frame, after the overlap the shard's estimator
+        # has the same previous frame a single pass would have had
+        camera_mvmt_frame += result["camera_mvmt"][skip:]
+        prev_mapping = mapping
+        prev_tail = result["appearance"]["tail"]
+
+    print(f"Merged {len(shard_results)} shards: {stitched} tracks stitched across boundaries, {started} started")
+    return tracks, camera_mvmt_frame
+
+def id_consistency(reference, tracks, obj="players", iou_threshold=0.5):
+    # Share of matched boxes whose id is the one their reference track mostly got,
+    # 1.0 when no reference track was split or swapped
+    pair_counts = {}
+    for ref_frame, frame in zip(reference[obj], tracks[obj]):
+        if len(ref_frame) == 0 or len(frame) == 0:
+            continue
+        ref_ids, ids = list(ref_frame), list(frame)
+        ious = box_iou([ref_frame[track_id]["bbox"] for track_id in ref_ids], [frame[track_id]["bbox"] for track_id in ids])
+        for i, j in greedy_match(-ious, -iou_threshold):
+            pair_counts.setdefault(ref_ids[i], {}).setdefault(ids[j], 0)
+            pair_counts[ref_ids[i]][ids[j]] += 1
+
+    matched = sum(sum(counts.values()) for counts in pair_counts.values())
+    consistent = sum(max(counts.values()) for counts in pair_counts.values())
+    return consistent/matched if matched > 0 else 1.0
+
+def total_distance(table, obj="players"):
+    # Sum over tracks of the distance each covered, the distance column accumulates along a track
+    rows = table.class_mask(obj) & ~np.isnan(table.distance)
+    totals = {}
+    for track_id, distance in zip(table.track_id[rows].tolist(), table.distance[rows].tolist()):
+        totals[track_id] = max(totals.get(track_id, 0.0), distance)
+    return sum(totals.values())
+
+def compare_sharded(reference, sharded, tolerance=SHARD_TOLERANCE):
+    # reference and sharded are {"tracks", "camera_mvmt", "table", "possession"} of a single pass
+    # and of a sharded run over the same video
+    track_report = compare_tracks(reference["tracks"], sharded["tracks"])
+    camera_report = compare_camera_movement(reference["camera_mvmt"], sharded["camera_mvmt"])
+
+    # Team numbers come from clustering and may be swapped between the two runs
+    ref_shares = [reference["possession"].summary()["teams"][team]["share"] for team in [1, 2]]
+    shares = [sharded["possession"].summary()["teams"][team]["share"] for team in [1, 2]]
+    share_error = min(max(abs(ref_shares[0]-shares[0]), abs(ref_shares[1]-shares[1])), max(abs(ref_shares[0]-shares[1]), abs(ref_shares[1]-shares[0])))
+
+    ref_distance = total_distance(reference["table"])
+    distance = total_distance(sharded["table"])
+
+    report = {
+        "tracks": track_report,
+        "id_consistency": id_consistency(reference["tracks"], sharded["tracks"]),
+        "camera_error": camera_report["mean_error_x"] + camera_report["mean_error_y"],
+        "possession_share": share_error,
+        "distance": abs(distance - ref_distance)/max(ref_distance, 1e-9),
+    }
+    report["within_tolerance"] = {
+        "recall": all(obj_report["recall"] >= tolerance["recall"] for obj_report in track_report.values()),
+        "id_consistency": report["id_consistency"] >= tolerance["id_consistency"],
+        "camera_error": report["camera_error"] <= tolerance["camera_error"],
+        "possession_share": report["possession_share"] <= tolerance["possession_share"],
+        "distance": report["distance"] <= tolerance["distance"]
+    }
+    return report
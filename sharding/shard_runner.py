@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import time
+import cv2
+import sys
+sys.path.append('../')
+from utils import read_video_chunks
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from camera_movement import CameraMovementEstimator
+from .shard_merger import plan_shards, merge_shards
+
+# Loaded once per worker process by init_worker and reused for every shard it runs
+worker_tracker = None
+
+def init_worker(model_path, tracker_params):
+    global worker_tracker
+    worker_tracker = Tracker(model_path, **tracker_params)
+
+def track_appearance(video_path, tracks, start_frame, end_frame, offset):
+    # Mean shirt color of every player and referee track over frames [start_frame, end_frame),
+    # offset is the video frame of tracks[obj][0]
+    team_assigner = TeamAssigner()
+    colors = {"players": {}, "refs": {}}
+    frame_num = start_frame
+    for frames in read_video_chunks(video_path, end_frame - start_frame, start_frame, end_frame):
+        for frame in frames:
+            for obj in ["players", "refs"]:
+                frame_tracks = tracks[obj][frame_num - offset]
+                if len(frame_tracks) == 0:
+                    continue
+                track_colors = team_assigner.get_player_colors(frame, [track_info["bbox"] for track_info in frame_tracks.values()])
+                for track_id, color in zip(frame_tracks, track_colors.tolist()):
+                    colors[obj].setdefault(track_id, []).append(color)
+            frame_num += 1
+
+    return {obj: {track_id: np.mean(track_colors, axis=0).tolist() for track_id, track_colors in obj_colors.items()} for obj, obj_colors in colors.items()}
+
+def process_shard(video_path, start, own_start, end, overlap, chunk_size=100):
+    # Camera movement and tracks of one shard, with nothing carried over from any other shard.
+    # Nothing is cached, cached chunks are keyed by their frame within the whole video
+    t = time.perf_counter()
+    tracker = worker_tracker
+
+    first_frame = next(read_video_chunks(video_path, 1, start, start+1))[0]
+    camera_estimator = CameraMovementEstimator(first_frame)
+    camera_mvmt = camera_estimator.get_camera_movement_chunks(read_video_chunks(video_path, chunk_size, start, end))
+    tracks = tracker.get_object_tracks_chunks(read_video_chunks(video_path, chunk_size, start, end), camera_mvmt_frame=camera_mvmt)
+    num_frames = len(camera_mvmt)
+
+    # Colors over the overlap with the shard before and the one after, the merge compares them
+    appearance = {
+        "head": track_appearance(video_path, tracks, start, own_start, start) if own_start > start else {"players": {}, "refs": {}},
+        "tail": track_appearance(video_path, tracks, start + num_frames - overlap, start + num_frames, start) if end is not None and overlap > 0 else {"players": {}, "refs": {}}
+    }
+
+    return {
+        "start": start,
+        "own_start": own_start,
+        "tracks": tracks,
+        "camera_mvmt": camera_mvmt,
+        "appearance": appearance,
+        "camera_features": camera_estimator.old_features,
+        "detected_frames": tracker.detected_frames,
+        "seconds": time.perf_counter() - t
+    }
+
+def chain_camera_movement(video_path, results, chunk_size=100):
+    # Features are only detected again when the camera moved, so a shard's estimate can differ
+    # from a single pass until both detect them on the same frame. From every boundary the
+    # previous shard's features are carried forward until that happens, from then on the
+    # shard's own estimate is exactly what a single pass gives
+    reestimated = 0
+    for prev, result in zip(results, results[1:]):
+        movement = result["camera_mvmt"]
+        frame_num = result["own_start"] - 1
+        estimator = None
+        synced = False
+        for frames in read_video_chunks(video_path, chunk_size, frame_num, result["start"] + len(movement)):
+            for frame in frames:
+                if estimator is None:
+                    estimator = CameraMovementEstimator(frame)
+                    estimator.old_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    estimator.old_features = prev["camera_features"]
+                else:
+                    chained = estimator.get_frame_movement(frame)
+                    own = movement[frame_num - result["start"]]
+                    movement[frame_num - result["start"]] = chained
+                    reestimated += 1
+                    if chained != [0,0] and own != [0,0]:
+                        synced = True
+                        break
+                frame_num += 1
+            if synced:
+                break
+
+        if not synced and estimator is not None:
+            result["camera_features"] = estimator.old_features
+
+    return reestimated
+
+def run_sharded(video_path, model_path, shard_size=1500, overlap=24, workers=2, tracker_params=None, chunk_size=100):
+    # Splits the video into shards of shard_size frames that overlap by overlap frames,
+    # runs them on a process pool and merges their tracks and camera movement
+    cap = cv2.VideoCapture(video_path)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    # Every shard has to reach past the overlap it shares with the next one
+    overlap = min(overlap, shard_size//2)
+    shards = plan_shards(num_frames, shard_size, overlap)
+    print(f"Processing {num_frames} frames in {len(shards)} shards of {shard_size} frames, {overlap} frames overlap, on {workers} workers")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path, tracker_params or {})) as executor:
+        futures = [executor.submit(process_shard, video_path, shard_start, own_start, end, overlap, chunk_size) for shard_start, own_start, end in shards]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        print(f"Shard from frame {result['own_start']}: {len(result['camera_mvmt'])} frames in {result['seconds']:.1f}s, detector ran on {result['detected_frames']}")
+    processed = sum(len(result["camera_mvmt"]) for result in results)
+    print(f"Shards done in {elapsed:.1f}s, {processed - num_frames} frames processed twice for the overlaps")
+
+    reestimated = chain_camera_movement(video_path, results, chunk_size)
+    print(f"Camera movement chained across shards, {reestimated} frames estimated again after a boundary")
+
+    return merge_shards(results)
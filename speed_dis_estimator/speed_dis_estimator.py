@@ -1,12 +1,35 @@
 import sys
 import cv2
+import numpy as np
+from collections import deque
 sys.path.append('../')
 from utils import measure_distance, get_foot
 
 class SpeedDisEstimator():
-    def __init__(self):
-        self.frame_window = 5
-        self.fps = 24
+    def __init__(self, fps=24, frame_window=5, smoothing=None, smoothing_window=5, polyorder=2, max_gap=12, online_ttl=240):
+        self.frame_window = frame_window
+        self.fps = fps
+
+        # smoothing is None, "moving_average" or "savgol", applied to positions before differencing
+        if smoothing not in (None, "moving_average", "savgol"):
+            raise ValueError(f"Unknown smoothing: {smoothing}")
+        # Windows are centered on the frame, so they need an odd length
+        if smoothing is not None and (smoothing_window < 1 or smoothing_window % 2 == 0):
+            raise ValueError(f"smoothing_window must be odd and positive, got {smoothing_window}")
+        if smoothing == "savgol" and smoothing_window <= polyorder:
+            raise ValueError(f"smoothing_window ({smoothing_window}) must be greater than polyorder ({polyorder})")
+        self.smoothing = smoothing
+        self.smoothing_window = smoothing_window
+        self.polyorder = polyorder
+
+        # Larger holes in a track start a new segment, the jump across them is not counted as distance
+        self.max_gap = max_gap
+
+        # Per track state for the causal, frame by frame estimate. Tracks not seen for online_ttl
+        # frames are forgotten, ByteTrack never hands their ids out again
+        self.online = {}
+        self.online_ttl = online_ttl
+        self.next_sweep = online_ttl
 
     def speed_dis_to_tracks(self, tracks):
         total_dis = {}
@@ -48,9 +71,127 @@ class SpeedDisEstimator():
                         tracks[obj][frame_num_batch][id]['speed'] = speed
                         tracks[obj][frame_num_batch][id]['distance'] = total_dis[obj][id]
 
-    def draw_speed_dis(self, frames, tracks):
+    def savgol_coeffs(self):
+        half = self.smoothing_window//2
+        x = np.arange(-half, half+1)
+        vander = np.vander(x, self.polyorder+1, increasing=True)
+        return np.linalg.pinv(vander)[0]
+
+    def smooth_positions(self, positions, seg_start, seg_end):
+        if self.smoothing is None:
+            return positions
+
+        # Centered moving average whose window shrinks at segment edges
+        half = self.smoothing_window//2
+        idx = np.arange(len(positions))
+        low = np.maximum(idx-half, seg_start)
+        high = np.minimum(idx+half, seg_end-1)
+        cum_pos = np.vstack([np.zeros((1,2)), np.cumsum(positions, axis=0)])
+        moving_average = (cum_pos[high+1]-cum_pos[low])/(high-low+1)[:,None]
+
+        if self.smoothing == "moving_average":
+            return moving_average
+
+        # Savitzky-Golay where the full window fits in the segment, moving average near the edges
+        coeffs = self.savgol_coeffs()
+        savgol = np.stack([np.correlate(positions[:,c], coeffs, mode='same') for c in range(2)], axis=1)
+        full_window = (idx-half >= seg_start) & (idx+half <= seg_end-1)
+
+        return np.where(full_window[:,None], savgol, moving_average)
+
+    def get_speed_dis(self, track_keys, frames, positions):
+        # Per-row speed (km/h) and cumulative track distance (m), NaN where the position is unknown
+        speed = np.full(len(frames), np.nan)
+        distance = np.full(len(frames), np.nan)
+
+        rows = np.lexsort((frames, track_keys))
+        rows = rows[~np.isnan(positions[rows,0])]
+        if len(rows) == 0:
+            return speed, distance
+
+        keys, frames, positions = track_keys[rows], frames[rows], positions[rows]
+
+        new_track = np.r_[True, keys[1:] != keys[:-1]]
+        new_segment = new_track | np.r_[False, np.diff(frames) > self.max_gap]
+        seg_ids = np.cumsum(new_segment)-1
+        seg_start = np.flatnonzero(new_segment)[seg_ids]
+        seg_end = np.r_[np.flatnonzero(new_segment)[1:], len(rows)][seg_ids]
+
+        positions = self.smooth_positions(positions, seg_start, seg_end)
+
+        # Displacement over the last frame_window samples of the segment, forward at the segment start
+        idx = np.arange(len(rows))
+        back = np.maximum(idx-self.frame_window, seg_start)
+        front = np.where(back == idx, np.minimum(idx+self.frame_window, seg_end-1), idx)
+        time_elapsed = (frames[front]-frames[back])/self.fps
+        displacement = positions[front]-positions[back]
+        dis_covered = np.hypot(displacement[:,0], displacement[:,1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            row_speed = np.where(time_elapsed > 0, dis_covered/time_elapsed*3.6, 0.0)
+
+        # Running distance along each track, gaps between segments add nothing
+        steps = np.diff(positions, axis=0)
+        step = np.r_[0.0, np.hypot(steps[:,0], steps[:,1])]
+        step[new_segment] = 0
+        cum_dis = np.cumsum(step)
+        track_start = np.maximum.accumulate(np.where(new_track, idx, 0))
+
+        speed[rows] = row_speed
+        distance[rows] = cum_dis - cum_dis[track_start]
+
+        return speed, distance
+
+    def speed_dis_to_table(self, table):
+        # Referees are stored under "refs", so like speed_dis_to_tracks only the ball is skipped
+        rows = np.flatnonzero(~table.class_mask("ball"))
+        if len(rows) == 0:
+            return
+
+        track_keys = table.keys()[rows] - table.frame[rows]
+        speed, distance = self.get_speed_dis(track_keys, table.frame[rows], table.transformed_position[rows])
+
+        table.speed[rows] = speed
+        table.distance[rows] = distance
+
+    def update_speed_dis(self, frame_num, track_keys, positions):
+        # Causal version of get_speed_dis for live mode: speed over the last frame_window frames
+        # of the track, distance accumulated so far. Positions are (N,2), NaN where unknown
+        speed = np.full(len(track_keys), np.nan)
+        distance = np.full(len(track_keys), np.nan)
+
+        # An open ended stream keeps making new ids, so the state is swept once every online_ttl frames
+        if frame_num >= self.next_sweep:
+            self.online = {key: state for key, state in self.online.items() if frame_num - state["history"][-1][0] <= self.online_ttl}
+            self.next_sweep = frame_num + self.online_ttl
+
+        for i, (key, position) in enumerate(zip(track_keys, positions.tolist())):
+            if np.isnan(position[0]):
+                continue
+
+            state = self.online.get(key)
+            if state is None:
+                state = {"history": deque(), "distance": 0.0}
+                self.online[key] = state
+
+            history = state["history"]
+            if len(history) > 0 and frame_num - history[-1][0] > self.max_gap:
+                history.clear()
+            if len(history) > 0:
+                state["distance"] += measure_distance(history[-1][1], position)
+
+            history.append((frame_num, position))
+            while frame_num - history[0][0] > self.frame_window:
+                history.popleft()
+
+            time_elapsed = (frame_num - history[0][0])/self.fps
+            speed[i] = measure_distance(history[0][1], position)/time_elapsed*3.6 if time_elapsed > 0 else 0.0
+            distance[i] = state["distance"]
+
+        return speed, distance
+
+    def draw_speed_dis(self, frames, tracks, start_frame=0):
         out_frames = []
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start_frame):
             for obj, obj_tracks in tracks.items():
                 if obj == "ball" or obj == "referees":
                     continue
@@ -1 +1,2 @@
-from .team_assigner import TeamAssigner
\ No newline at end of file
+from .team_assigner import TeamAssigner
+from .team_vote_cache import TeamVoteCache
\ No newline at end of file
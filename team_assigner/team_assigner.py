@@ -1,52 +1,92 @@
 from sklearn.cluster import KMeans
+import numpy as np
+
+from .team_vote_cache import TeamVoteCache
 
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, cache_size=512, vote_window=120, max_crops=8):
         self.team_colors = {}
-        self.player_team_dict = {}
+        self.team_cache = TeamVoteCache(max_tracks=cache_size, window=vote_window, max_crops=max_crops)
     
-    def get_clustering_model(self,image):
-        # Reshape the image to 2D array
-        image_2d = image.reshape(-1,3)
-
-        # Preform K-means with 2 clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++",n_init=1)
-        kmeans.fit(image_2d)
-
-        return kmeans
-
     def get_player_color(self,frame,bbox):
-        image = frame[int(bbox[1]):int(bbox[3]),int(bbox[0]):int(bbox[2])]
-
-        top_half_image = image[0:int(image.shape[0]/2),:]
-
-        # Get Clustering model
-        kmeans = self.get_clustering_model(top_half_image)
-
-        # Get the cluster labels forr each pixel
-        labels = kmeans.labels_
-
-        # Reshape the labels to the image shape
-        clustered_image = labels.reshape(top_half_image.shape[0],top_half_image.shape[1])
-
-        # Get the player cluster
-        corner_clusters = [clustered_image[0,0],clustered_image[0,-1],clustered_image[-1,0],clustered_image[-1,-1]]
-        non_player_cluster = max(set(corner_clusters),key=corner_clusters.count)
+        return self.get_player_colors(frame,[bbox])[0]
+
+    def get_player_colors(self,frame,bboxes,n_iter=10):
+        # Top half of every crop, flattened into one pixel array with a crop index per pixel
+        height, width = frame.shape[:2]
+        images = []
+        for bbox in bboxes:
+            x1 = min(max(int(bbox[0]),0),width-1)
+            y1 = min(max(int(bbox[1]),0),height-1)
+            x2 = min(max(int(bbox[2]),x1+1),width)
+            y2 = min(max(int(bbox[3]),y1+1),height)
+            image = frame[y1:y2,x1:x2]
+            images.append(image[0:max(int(image.shape[0]/2),1),:])
+
+        num_crops = len(images)
+        if num_crops == 0:
+            return np.zeros((0,3))
+
+        shapes = np.array([image.shape[:2] for image in images])
+        sizes = shapes[:,0]*shapes[:,1]
+        offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+        crop_ids = np.repeat(np.arange(num_crops), sizes)
+        pixels = np.concatenate([image.reshape(-1,3) for image in images]).astype(np.float64)
+
+        # Corners of each crop are the background reference, as in the per-crop clustering
+        corners = np.stack([
+            offsets,
+            offsets+shapes[:,1]-1,
+            offsets+(shapes[:,0]-1)*shapes[:,1],
+            offsets+sizes-1
+        ], axis=1)
+
+        # Start from the corner color and the center of the crop, then run at most n_iter 2-means steps
+        local = np.arange(len(pixels)) - offsets[crop_ids]
+        rows, cols = local // shapes[crop_ids,1], local % shapes[crop_ids,1]
+        center = (np.abs(rows - shapes[crop_ids,0]/2) <= shapes[crop_ids,0]/4) & (np.abs(cols - shapes[crop_ids,1]/2) <= shapes[crop_ids,1]/4)
+
+        centers = np.empty((num_crops,2,3))
+        centers[:,0] = pixels[corners].mean(axis=1)
+        centers[:,1] = centers[:,0]
+        center_ids = crop_ids[center]
+        center_counts = np.bincount(center_ids, minlength=num_crops)
+        for c in range(3):
+            center_sums = np.bincount(center_ids, weights=pixels[center,c], minlength=num_crops)
+            centers[center_counts > 0,1,c] = center_sums[center_counts > 0]/center_counts[center_counts > 0]
+
+        labels = None
+        for _ in range(n_iter):
+            # Closer to center 1 than center 0 <=> projection on (c1-c0) above the midpoint
+            direction = centers[:,1]-centers[:,0]
+            midpoint = ((centers[:,1]**2).sum(axis=1) - (centers[:,0]**2).sum(axis=1))/2
+            projection = np.einsum('ij,ij->i', pixels, direction[crop_ids])
+            new_labels = (projection > midpoint[crop_ids]).astype(np.int64)
+
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+            cluster_ids = crop_ids*2 + labels
+            counts = np.bincount(cluster_ids, minlength=num_crops*2).reshape(num_crops,2)
+            sums = np.stack([np.bincount(cluster_ids, weights=pixels[:,c], minlength=num_crops*2) for c in range(3)], axis=1).reshape(num_crops,2,3)
+
+            # Empty clusters keep their previous center
+            non_empty = counts > 0
+            centers[non_empty] = sums[non_empty]/counts[non_empty][:,None]
+
+        # Background is the cluster holding most corners, a 2-2 tie goes to cluster 0
+        non_player_cluster = (labels[corners].sum(axis=1) > 2).astype(np.int64)
         player_cluster = 1 - non_player_cluster
 
-        player_color = kmeans.cluster_centers_[player_cluster]
-
-        return player_color
+        return centers[np.arange(num_crops),player_cluster]
 
 
     def assign_team_color(self,frame, player_detections):
         
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color =  self.get_player_color(frame,bbox)
-            player_colors.append(player_color)
-        
+        bboxes = [player_detection["bbox"] for player_detection in player_detections.values()]
+        player_colors = self.get_player_colors(frame,bboxes)
+
         kmeans = KMeans(n_clusters=2, init="k-means++",n_init=1)
         kmeans.fit(player_colors)
 
@@ -56,18 +96,57 @@ class TeamAssigner:
         self.team_colors[2] = kmeans.cluster_centers_[1]
 
 
-    def get_player_team(self,frame,player_bbox,player_id):
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
-
-        player_color = self.get_player_color(frame,player_bbox)
-
-        team_id = self.kmeans.predict(player_color.reshape(1,-1))[0]
-        team_id+=1
-
-        if player_id ==99:
-            team_id=1
-
-        self.player_team_dict[player_id] = team_id
-
-        return team_id
\ No newline at end of file
+    def get_player_team(self,frame,player_bbox,player_id,frame_num=0):
+        return self.get_player_teams(frame,[player_bbox],[player_id],frame_num)[0]
+
+    def get_player_teams(self,frame,player_bboxes,player_ids,frame_num=0):
+        # With a constant frame_num every track is classified from a single crop
+        teams = np.zeros(len(player_ids),dtype=np.int64)
+        crop_inds = []
+        for i, player_id in enumerate(player_ids):
+            team, needs_crop = self.team_cache.get(player_id, frame_num)
+            if team is not None:
+                teams[i] = team
+            if needs_crop:
+                crop_inds.append(i)
+
+        if len(crop_inds) == 0:
+            return teams
+
+        # Colors and team votes for every player of the frame that needs a new crop, in one batch
+        player_colors = self.get_player_colors(frame,[player_bboxes[i] for i in crop_inds])
+        distances = self.kmeans.transform(player_colors)
+        team_ids = distances.argmin(axis=1)+1
+        weights = np.abs(distances[:,0]-distances[:,1])/np.maximum(distances.sum(axis=1),1e-9)
+
+        for i, team_id, weight in zip(crop_inds, team_ids.tolist(), weights.tolist()):
+            if player_ids[i] ==99:
+                team_id=1
+                weight=1.0
+
+            teams[i] = self.team_cache.add_vote(player_ids[i], frame_num, team_id, weight)
+
+        return teams
+
+    def assign_teams_to_tracks(self, frames, tracks, start_frame=0):
+        for frame_num, frame in enumerate(frames, start_frame):
+            player_track = tracks['players'][frame_num]
+            player_ids = list(player_track.keys())
+            teams = self.get_player_teams(frame, [track['bbox'] for track in player_track.values()], player_ids, frame_num)
+
+            for player_id, team in zip(player_ids, teams.tolist()):
+                tracks["players"][frame_num][player_id]["team"] = team
+
+                tracks["players"][frame_num][player_id]["team_color"] = self.team_colors[team]
+
+    def assign_teams_to_table(self, table, frames, start_frame=0):
+        in_range = table.class_mask("players") & (table.frame >= start_frame) & (table.frame < start_frame+len(frames))
+        rows = np.flatnonzero(in_range)
+        rows = rows[np.argsort(table.frame[rows], kind='stable')]
+        bounds = np.searchsorted(table.frame[rows], np.arange(start_frame, start_frame+len(frames)+1))
+
+        for i, frame in enumerate(frames):
+            frame_rows = rows[bounds[i]:bounds[i+1]]
+            if len(frame_rows) == 0:
+                continue
+            table.team[frame_rows] = self.get_player_teams(frame, table.bbox[frame_rows], table.track_id[frame_rows].tolist(), start_frame+i)
\ No newline at end of file
@@ -0,0 +1,107 @@
+from collections import OrderedDict, deque
+
+class TeamVoteCache:
+    def __init__(self, max_tracks=512, window=120, max_crops=8, min_crops=3, sample_every=12, recheck_every=240, min_confidence=0.75):
+        self.max_tracks = max_tracks
+        self.window = window
+        self.max_crops = max_crops
+        self.min_crops = min_crops
+        self.sample_every = sample_every
+        self.recheck_every = recheck_every
+        self.min_confidence = min_confidence
+
+        # Least recently seen track first
+        self.tracks = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.crops = 0
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, track_id):
+        return track_id in self.tracks
+
+    def get(self, track_id, frame_num):
+        # Returns (team or None, whether a new crop of this track should be analyzed)
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            self.misses += 1
+            return None, True
+
+        self.tracks.move_to_end(track_id)
+        self.expire(entry, frame_num)
+
+        needs_crop = self.needs_crop(entry, frame_num)
+        if needs_crop:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return entry["team"], needs_crop
+
+    def needs_crop(self, entry, frame_num):
+        if entry["crops"] >= self.max_crops:
+            return False
+
+        since_last_crop = frame_num - entry["last_crop"]
+        if entry["crops"] < self.min_crops or entry["confidence"] < self.min_confidence:
+            return since_last_crop >= self.sample_every
+
+        # Confident tracks are still checked now and then to catch swapped ids
+        return since_last_crop >= self.recheck_every
+
+    def add_vote(self, track_id, frame_num, team, weight):
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            entry = {"votes": deque(), "team": team, "confidence": 0.0, "crops": 0, "last_crop": frame_num}
+            self.tracks[track_id] = entry
+
+            if len(self.tracks) > self.max_tracks:
+                self.tracks.popitem(last=False)
+                self.evictions += 1
+
+        self.tracks.move_to_end(track_id)
+
+        entry["votes"].append((frame_num, team, weight))
+        entry["crops"] += 1
+        entry["last_crop"] = frame_num
+        self.crops += 1
+
+        self.expire(entry, frame_num)
+        self.update_label(entry)
+
+        return entry["team"]
+
+    def expire(self, entry, frame_num):
+        # The newest vote is always kept so a track never loses its label
+        votes = entry["votes"]
+        expired = False
+        while len(votes) > 1 and votes[0][0] <= frame_num - self.window:
+            votes.popleft()
+            expired = True
+
+        if expired:
+            self.update_label(entry)
+
+    def update_label(self, entry):
+        team_weights = {}
+        for _, team, weight in entry["votes"]:
+            team_weights[team] = team_weights.get(team, 0) + weight
+
+        total_weight = sum(team_weights.values())
+        team = max(team_weights, key=team_weights.get)
+
+        entry["team"] = team
+        entry["confidence"] = team_weights[team]/total_weight if total_weight > 0 else 0.0
+
+    def stats(self):
+        return {
+            "tracks": len(self.tracks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "crops": self.crops
+        }
\ No newline at end of file
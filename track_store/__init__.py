@@ -0,0 +1 @@
+from .track_store import TrackStore
\ No newline at end of file
@@ -0,0 +1,179 @@
+import numpy as np
+import shutil
+import json
+import os
+import sys
+sys.path.append('../')
+from trackers import TrackTable
+from trackers.track_table import OBJECT_CLASSES
+
+class TrackStore:
+    def __init__(self, path):
+        # Reads an exported match, chunks are only opened when a query needs them
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+        self.num_frames = self.index["num_frames"]
+        self.columns = self.index["columns"]
+        self.chunks = self.index["chunks"]
+        self.parquet = None
+
+    @classmethod
+    def write(cls, path, table, frame_columns=None, chunk_frames=1000, file_format='npz'):
+        # One row per (frame, class, track id) as in TrackTable, split into chunks of chunk_frames frames.
+        # npz chunks are compressed and every column is read on its own, parquet puts one row group per chunk.
+        # frame_columns holds per-frame arrays such as the team in control of the ball
+        order = np.lexsort((table.track_id, table.cls, table.frame))
+        columns = {name: column[order] for name, column in table.columns().items()}
+
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        starts = list(range(0, max(table.num_frames, 1), chunk_frames))
+        bounds = np.append(np.searchsorted(columns["frame"], starts), len(order))
+        chunks = []
+        writer = None
+        row_groups = 0
+        for i, start in enumerate(starts):
+            rows = slice(bounds[i], bounds[i+1])
+            chunk = {name: column[rows] for name, column in columns.items()}
+
+            # Track ids per class let a query for one track skip the chunks it is not in
+            tracks = {obj: np.unique(chunk["track_id"][chunk["cls"] == cls_id]).tolist() for cls_id, obj in enumerate(OBJECT_CLASSES)}
+            chunks.append({"start": start, "end": min(start + chunk_frames, table.num_frames), "rows": len(chunk["frame"]), "tracks": tracks})
+
+            if file_format == 'parquet':
+                if chunks[-1]["rows"] > 0:
+                    writer = cls.write_row_group(writer, os.path.join(tmp_path, 'tracks.parquet'), chunk)
+                    chunks[-1]["row_group"] = row_groups
+                    row_groups += 1
+            else:
+                file_name = f"chunk_{i:05d}.npz"
+                np.savez_compressed(os.path.join(tmp_path, file_name), **chunk)
+                chunks[-1]["file"] = file_name
+        if writer is not None:
+            writer.close()
+
+        frame_columns = {name: np.asarray(values) for name, values in (frame_columns or {}).items()}
+        np.savez_compressed(os.path.join(tmp_path, 'frames.npz'), **frame_columns)
+
+        index = {
+            "format": file_format,
+            "num_frames": table.num_frames,
+            "chunk_frames": chunk_frames,
+            "columns": {name: {"dtype": column.dtype.str, "shape": list(column.shape[1:])} for name, column in columns.items()},
+            "frame_columns": list(frame_columns.keys()),
+            "chunks": chunks
+        }
+        with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+            json.dump(index, f)
+
+        # Readers never see a half written export
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+        return cls(path)
+
+    @staticmethod
+    def write_row_group(writer, path, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Parquet columns are flat, (N,k) columns become name_0 .. name_k-1
+        flat = {}
+        for name, column in chunk.items():
+            if column.ndim == 1:
+                flat[name] = column
+            else:
+                for k in range(column.shape[1]):
+                    flat[f"{name}_{k}"] = np.ascontiguousarray(column[:,k])
+        row_group = pa.table(flat)
+
+        if writer is None:
+            writer = pq.ParquetWriter(path, row_group.schema, compression='zstd')
+        writer.write_table(row_group, row_group_size=max(row_group.num_rows, 1))
+        return writer
+
+    def read_chunk(self, i, names):
+        if self.index["format"] == 'parquet':
+            return self.read_row_group(i, names)
+        # npz members are decompressed one by one, only the requested columns are read
+        with np.load(os.path.join(self.path, self.chunks[i]["file"])) as data:
+            return {name: data[name] for name in names}
+
+    def read_row_group(self, i, names):
+        import pyarrow.parquet as pq
+
+        if self.parquet is None:
+            self.parquet = pq.ParquetFile(os.path.join(self.path, 'tracks.parquet'))
+        flat_names = []
+        for name in names:
+            shape = self.columns[name]["shape"]
+            flat_names += [name] if len(shape) == 0 else [f"{name}_{k}" for k in range(shape[0])]
+        row_group = self.parquet.read_row_group(self.chunks[i]["row_group"], columns=flat_names)
+
+        arrays = {}
+        for name in names:
+            shape = self.columns[name]["shape"]
+            if len(shape) == 0:
+                arrays[name] = row_group.column(name).to_numpy()
+            else:
+                arrays[name] = np.stack([row_group.column(f"{name}_{k}").to_numpy() for k in range(shape[0])], axis=1)
+        return arrays
+
+    def empty(self, name):
+        column = self.columns[name]
+        return np.zeros([0] + column["shape"], dtype=np.dtype(column["dtype"]))
+
+    def query(self, columns=None, obj=None, track_id=None, team=None, start=0, end=None):
+        # Rows of frames [start, end), optionally of one class, one track id and one team, as a dict of
+        # the requested columns. Only the chunks in the frame range that can hold the track are read
+        end = self.num_frames if end is None else end
+        columns = list(self.columns.keys()) if columns is None else list(columns)
+        filters = {"frame"} | ({"cls"} if obj is not None else set()) | ({"track_id"} if track_id is not None else set()) | ({"team"} if team is not None else set())
+        names = list(dict.fromkeys(columns + sorted(filters)))
+
+        parts = {name: [] for name in columns}
+        for i, chunk in enumerate(self.chunks):
+            if chunk["end"] <= start or chunk["start"] >= end or chunk["rows"] == 0:
+                continue
+            if track_id is not None:
+                objs = [obj] if obj is not None else OBJECT_CLASSES
+                if not any(track_id in chunk["tracks"][o] for o in objs):
+                    continue
+
+            arrays = self.read_chunk(i, names)
+            mask = (arrays["frame"] >= start) & (arrays["frame"] < end)
+            if obj is not None:
+                mask &= arrays["cls"] == OBJECT_CLASSES.index(obj)
+            if track_id is not None:
+                mask &= arrays["track_id"] == track_id
+            if team is not None:
+                mask &= arrays["team"] == team
+            for name in columns:
+                parts[name].append(arrays[name][mask])
+
+        return {name: np.concatenate(parts[name]) if len(parts[name]) > 0 else self.empty(name) for name in columns}
+
+    def track(self, track_id, start=0, end=None, obj="players", columns=None):
+        # Player X between frames A and B
+        return self.query(columns, obj=obj, track_id=track_id, start=start, end=end)
+
+    def team_positions(self, team, column="transformed_position", start=0, end=None):
+        # Every position of one team's players, with the frame and track id of each row
+        return self.query(["frame", "track_id", column], obj="players", team=team, start=start, end=end)
+
+    def frame_column(self, name, start=0, end=None):
+        # Per-frame arrays stored next to the tracks, such as ball_control or camera_mvmt
+        with np.load(os.path.join(self.path, 'frames.npz')) as data:
+            return data[name][start:end]
+
+    def to_table(self):
+        # The whole match back as a TrackTable, e.g. to draw it again without re-running the pipeline
+        arrays = self.query()
+        table = TrackTable(self.num_frames, len(arrays["frame"]))
+        for name, column in arrays.items():
+            setattr(table, name, column)
+        return table
@@ -1 +1,5 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .track_table import TrackTable
+from .track_buffer import TrackBuffer
+from .track_propagator import TrackPropagator, compare_tracks
+from .ball_smoother import BallSmoother
\ No newline at end of file
@@ -0,0 +1,212 @@
+import numpy as np
+
+class BallSmoother:
+    def __init__(self, lookahead=12, accel_std=3.0, measurement_std=3.0, size_std=1.0, velocity_std=20.0, gate=25.0, reacquire=3):
+        # Constant velocity Kalman filter on the ball centre, random walk on its size
+        # State is [cx, cy, vx, vy, w, h] in pixels and pixels per frame
+        self.lookahead = lookahead
+        self.measurement_std = measurement_std
+        self.velocity_std = velocity_std
+        self.gate = gate
+        self.reacquire = reacquire
+
+        self.F = np.eye(6)
+        self.F[0,2] = self.F[1,3] = 1
+        self.H = np.zeros((4,6))
+        self.H[[0,1,2,3],[0,1,4,5]] = 1
+
+        # Piecewise constant acceleration between frames
+        self.Q = np.zeros((6,6))
+        for pos, vel in [(0,2), (1,3)]:
+            self.Q[pos,pos] = accel_std**2/4
+            self.Q[pos,vel] = self.Q[vel,pos] = accel_std**2/2
+            self.Q[vel,vel] = accel_std**2
+        self.Q[4,4] = self.Q[5,5] = size_std**2
+        self.R = np.diag([measurement_std**2, measurement_std**2, size_std**2, size_std**2])
+
+        self.reset()
+
+    def reset(self):
+        # Frames inside the lookahead window, oldest first
+        self.records = []
+        self.next_frame = 0
+        self.x = None
+        self.P = None
+        self.segment = 0
+        self.pending = []
+        self.force_init = False
+        self.replaying = False
+
+        # Last measured state that already left the window, held after the ball is lost
+        self.held = None
+
+    def init_state(self, z):
+        x = np.array([z[0], z[1], 0, 0, z[2], z[3]], dtype=np.float64)
+        P = np.diag([self.measurement_std**2, self.measurement_std**2, self.velocity_std**2, self.velocity_std**2, self.R[2,2], self.R[3,3]])
+        return x, P
+
+    def step(self, frame_num, z):
+        record = {"frame": frame_num, "z": z, "accepted": False, "reinit": False, "x_pred": None, "P_pred": None}
+
+        if z is not None and (self.x is None or self.force_init):
+            # First detection, or a re-acquisition after repeated rejections
+            self.x, self.P = self.init_state(z)
+            self.segment += 1
+            self.force_init = False
+            self.pending = []
+            record.update(accepted=True, reinit=True)
+        elif self.x is not None:
+            x_pred = self.F @ self.x
+            P_pred = self.F @ self.P @ self.F.T + self.Q
+            record.update(x_pred=x_pred, P_pred=P_pred)
+            self.x, self.P = x_pred, P_pred
+
+            if z is not None:
+                y = z - self.H @ x_pred
+                S = self.H @ P_pred @ self.H.T + self.R
+
+                # Implausible jumps are gated on the centre innovation
+                distance = y[:2] @ np.linalg.solve(S[:2,:2], y[:2])
+                if distance <= self.gate:
+                    K = P_pred @ self.H.T @ np.linalg.inv(S)
+                    self.x = x_pred + K @ y
+                    self.P = (np.eye(6) - K @ self.H) @ P_pred
+                    self.pending = []
+                    record["accepted"] = True
+                else:
+                    self.pending.append(frame_num)
+
+        record.update(x=None if self.x is None else self.x, P=self.P, segment=self.segment)
+        self.records.append(record)
+
+        # Several rejections in a row mean the ball really is somewhere else
+        if len(self.pending) >= self.reacquire and not self.replaying:
+            self.restart(self.pending[0])
+
+    def restart(self, frame_num):
+        # Re-run the window from the first rejected detection that is still in it
+        start = max(frame_num - self.records[0]["frame"], 0)
+        while self.records[start]["z"] is None:
+            start += 1
+        replay = self.records[start:]
+        del self.records[start:]
+
+        self.force_init = True
+        self.pending = []
+        self.replaying = True
+        for record in replay:
+            self.step(record["frame"], record["z"])
+        self.replaying = False
+
+        # Each restart begins later than the last one, so this ends
+        if len(self.pending) >= self.reacquire:
+            self.restart(self.pending[0])
+
+    def rts(self, records):
+        # Rauch-Tung-Striebel pass, not carried across re-initializations
+        xs = [record["x"] for record in records]
+        Ps = [record["P"] for record in records]
+        for i in range(len(records)-2, -1, -1):
+            nxt = records[i+1]
+            if xs[i] is None or nxt["reinit"] or nxt["P_pred"] is None:
+                continue
+            C = records[i]["P"] @ self.F.T @ np.linalg.inv(nxt["P_pred"])
+            xs[i] = records[i]["x"] + C @ (xs[i+1] - nxt["x_pred"])
+            Ps[i] = records[i]["P"] + C @ (Ps[i+1] - nxt["P_pred"]) @ C.T
+        return xs, Ps
+
+    def confidence(self, P):
+        return float(np.clip(self.measurement_std/np.sqrt((P[0,0] + P[1,1])/2), 0, 1))
+
+    def lead_confidence(self, P, steps):
+        # Confidence of holding a state for steps frames before it was first seen
+        for _ in range(steps):
+            P = self.F @ P @ self.F.T + self.Q
+        return self.confidence(P)
+
+    def to_bbox(self, x):
+        return [x[0] - x[4]/2, x[1] - x[5]/2, x[0] + x[4]/2, x[1] + x[5]/2]
+
+    def resolve(self, records, xs, Ps, count):
+        # Smoothed output for the first count records. Between detections of the same
+        # segment the smoothed state is used, after the last one the last measured
+        # state is held, before the first one the first measured state is held
+        outputs = []
+
+        later_measured = [False]*len(records)
+        seen = {}
+        first_state = None
+        for i in range(len(records)-1, -1, -1):
+            later_measured[i] = seen.get(records[i]["segment"], False)
+            if records[i]["accepted"]:
+                seen[records[i]["segment"]] = True
+                first_state = (i, xs[i], Ps[i])
+
+        for i in range(count):
+            record = records[i]
+            if xs[i] is None:
+                if first_state is None:
+                    outputs.append((record["frame"], None, 0.0))
+                else:
+                    j, x, P = first_state
+                    outputs.append((record["frame"], self.to_bbox(x), self.lead_confidence(P, j-i)))
+                continue
+
+            if record["accepted"]:
+                self.held = xs[i]
+            if record["accepted"] or later_measured[i] or self.held is None:
+                x = xs[i]
+            else:
+                x = self.held
+            outputs.append((record["frame"], self.to_bbox(x), self.confidence(Ps[i])))
+
+        return outputs
+
+    def update(self, frame_num, bbox=None):
+        # Feed one frame, returns (frame_num, bbox or None, confidence) for every frame
+        # that has left the lookahead window
+        while self.next_frame < frame_num:
+            self.step(self.next_frame, None)
+            self.next_frame += 1
+
+        z = None
+        if bbox is not None:
+            z = np.array([(bbox[0]+bbox[2])/2, (bbox[1]+bbox[3])/2, bbox[2]-bbox[0], bbox[3]-bbox[1]], dtype=np.float64)
+        self.step(frame_num, z)
+        self.next_frame = frame_num + 1
+
+        # Frames are held back while rejected detections might still turn into a restart
+        outputs = []
+        while len(self.records) > self.lookahead and (len(self.pending) == 0 or len(self.records) > 2*self.lookahead):
+            xs, Ps = self.rts(self.records)
+            outputs += self.resolve(self.records, xs, Ps, 1)
+            self.records.pop(0)
+        return outputs
+
+    def flush(self):
+        xs, Ps = self.rts(self.records)
+        outputs = self.resolve(self.records, xs, Ps, len(self.records))
+        self.records = []
+        return outputs
+
+    def smooth(self, num_frames, frames, bboxes):
+        # Whole video at once, one forward and one backward pass with unbounded lookahead
+        self.reset()
+        boxes = dict(zip(np.asarray(frames).tolist(), np.asarray(bboxes, dtype=np.float64)))
+        for frame_num in range(num_frames):
+            bbox = boxes.get(frame_num)
+            z = None
+            if bbox is not None and not np.isnan(bbox).any():
+                z = np.array([(bbox[0]+bbox[2])/2, (bbox[1]+bbox[3])/2, bbox[2]-bbox[0], bbox[3]-bbox[1]])
+            self.step(frame_num, z)
+        self.next_frame = num_frames
+
+        outputs = self.flush()
+        smoothed = np.full((num_frames,4), np.nan)
+        confidence = np.zeros(num_frames)
+        for frame_num, bbox, conf in outputs:
+            if bbox is not None:
+                smoothed[frame_num] = bbox
+            confidence[frame_num] = conf
+
+        return smoothed, confidence
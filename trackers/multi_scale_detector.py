@@ -0,0 +1,151 @@
+import supervision as sv
+import numpy as np
+import os
+
+def auto_detection_config(frame_shape=(1080,1920,3)):
+    # Batch and input sizes from the cores and free memory of this machine
+    cpus = os.cpu_count() or 1
+    try:
+        available_bytes = os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        available_bytes = 2<<30
+
+    if cpus >= 8:
+        imgsz = 640
+    elif cpus >= 4:
+        imgsz = 512
+    else:
+        imgsz = 416
+
+    # A frame, its letterboxed float tensor and room for the model activations
+    frame_bytes = int(np.prod(frame_shape)) + imgsz*imgsz*3*4*4
+    batch_sz = int(min(max(cpus*2, 4), 32, max(available_bytes//4//frame_bytes, 1)))
+
+    return {"batch_sz": batch_sz, "imgsz": imgsz}
+
+class MultiScaleDetector:
+    def __init__(self, model, conf=0.1, batch_sz=20, imgsz=640, tile_size=640, full_imgsz=1920, max_gap=24, lost_search_every=5):
+        # Players and referees at imgsz, the ball in full resolution tiles around where it should be
+        self.model = model
+        self.conf = conf
+        self.batch_sz = batch_sz
+        self.imgsz = imgsz
+        self.tile_size = tile_size
+        self.full_imgsz = full_imgsz
+        self.max_gap = max_gap
+        self.lost_search_every = lost_search_every
+
+        cls_names_inv = {v:k for k,v in model.names.items()}
+        self.ball_cls_id = cls_names_inv["ball"]
+
+        self.tiles = 0
+        self.tile_hits = 0
+        self.fallbacks = 0
+        self.reset()
+
+    def reset(self):
+        self.ball_center = None
+        self.ball_velocity = np.zeros(2)
+        self.ball_frame = None
+        self.last_search = None
+
+    def get_state(self):
+        # Ball search state as a flat array so it can be cached with the chunk, NaN for None
+        center = self.ball_center if self.ball_center is not None else [np.nan, np.nan]
+        ball_frame = self.ball_frame if self.ball_frame is not None else np.nan
+        last_search = self.last_search if self.last_search is not None else np.nan
+        return np.array([center[0], center[1], self.ball_velocity[0], self.ball_velocity[1], ball_frame, last_search], dtype=np.float64)
+
+    def set_state(self, state):
+        state = np.asarray(state, dtype=np.float64)
+        self.ball_center = None if np.isnan(state[0]) else state[0:2].copy()
+        self.ball_velocity = state[2:4].copy()
+        self.ball_frame = None if np.isnan(state[4]) else int(state[4])
+        self.last_search = None if np.isnan(state[5]) else int(state[5])
+
+    def predict(self, images, imgsz):
+        detections = []
+        for i in range(0, len(images), self.batch_sz):
+            detections += self.model.detect(images[i:i+self.batch_sz], self.conf, imgsz)
+        return detections
+
+    def predict_ball_center(self, frame_num):
+        if self.ball_center is None or frame_num - self.ball_frame > self.max_gap:
+            return None
+        return self.ball_center + self.ball_velocity*(frame_num - self.ball_frame)
+
+    def get_tile(self, center, frame_shape):
+        height, width = frame_shape[:2]
+        tile_w, tile_h = min(self.tile_size, width), min(self.tile_size, height)
+        x1 = int(np.clip(center[0] - tile_w//2, 0, width - tile_w))
+        y1 = int(np.clip(center[1] - tile_h//2, 0, height - tile_h))
+        return x1, y1, x1 + tile_w, y1 + tile_h
+
+    def best_ball(self, detection_sv, offset=(0,0)):
+        balls = detection_sv[detection_sv.class_id == self.ball_cls_id]
+        if len(balls) == 0:
+            return None
+        balls = balls[[int(np.argmax(balls.confidence))]]
+        balls.xyxy = balls.xyxy + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=balls.xyxy.dtype)
+        return balls
+
+    def detect(self, frames, frame_nums=None):
+        # Returns one sv.Detections per frame with players, referees and at most one ball
+        if frame_nums is None:
+            frame_nums = list(range(len(frames)))
+
+        # Batch by batch so the ball is never extrapolated further than one batch
+        detections = []
+        for i in range(0, len(frames), self.batch_sz):
+            detections += self.detect_batch(frames[i:i+self.batch_sz], frame_nums[i:i+self.batch_sz])
+        return detections
+
+    def detect_batch(self, frames, frame_nums):
+        detections = self.predict(frames, self.imgsz)
+        detections = [detection_sv[detection_sv.class_id != self.ball_cls_id] for detection_sv in detections]
+
+        # Ball positions are extrapolated from the start of the batch
+        balls = [None]*len(frames)
+        tiles = []
+        for i, frame_num in enumerate(frame_nums):
+            center = self.predict_ball_center(frame_num)
+            if center is not None:
+                tiles.append((i, self.get_tile(center, frames[i].shape)))
+
+        tile_images = [frames[i][y1:y2, x1:x2] for i, (x1, y1, x2, y2) in tiles]
+        for (i, (x1, y1, _, _)), detection_sv in zip(tiles, self.predict(tile_images, self.tile_size)):
+            balls[i] = self.best_ball(detection_sv, (x1, y1))
+        self.tiles += len(tiles)
+        self.tile_hits += sum(ball is not None for ball in balls)
+
+        # Full resolution fallback where the tile missed. While the ball is lost the whole
+        # frame is only searched every lost_search_every frames
+        tiled = {i for i, _ in tiles}
+        missing = []
+        for i, frame_num in enumerate(frame_nums):
+            if balls[i] is not None:
+                continue
+            if i in tiled or self.last_search is None or frame_num - self.last_search >= self.lost_search_every:
+                missing.append(i)
+                self.last_search = frame_num
+        for i, detection_sv in zip(missing, self.predict([frames[i] for i in missing], self.full_imgsz)):
+            balls[i] = self.best_ball(detection_sv)
+        self.fallbacks += len(missing)
+
+        for i, frame_num in enumerate(frame_nums):
+            if balls[i] is None:
+                continue
+            center = (balls[i].xyxy[0,:2] + balls[i].xyxy[0,2:]).astype(np.float64)/2
+            if self.ball_center is not None and 0 < frame_num - self.ball_frame <= self.max_gap:
+                self.ball_velocity = (center - self.ball_center)/(frame_num - self.ball_frame)
+            else:
+                self.ball_velocity = np.zeros(2)
+            self.ball_center = center
+            self.ball_frame = frame_num
+
+            detections[i] = sv.Detections.merge([detections[i], balls[i]])
+
+        return detections
+
+    def stats(self):
+        return {"tiles": self.tiles, "tile_hits": self.tile_hits, "fallbacks": self.fallbacks}
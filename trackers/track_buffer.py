@@ -0,0 +1,53 @@
+import numpy as np
+
+from .track_table import TrackTable, OBJECT_CLASSES
+
+class TrackBuffer:
+    def __init__(self, capacity=4096):
+        # Preallocated columns, doubled when full so appends stay amortized O(1)
+        self.size = 0
+        self.num_frames = 0
+        self.frame = np.zeros(capacity, dtype=np.int64)
+        self.cls = np.zeros(capacity, dtype=np.int8)
+        self.track_id = np.zeros(capacity, dtype=np.int64)
+        self.bbox = np.zeros((capacity,4))
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, size):
+        capacity = len(self.frame)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+
+        for name in ["frame", "cls", "track_id", "bbox"]:
+            column = getattr(self, name)
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append(self, frame_num, obj, track_ids, bboxes):
+        n = len(track_ids)
+        self.num_frames = max(self.num_frames, frame_num+1)
+        if n == 0:
+            return
+
+        self.reserve(self.size + n)
+        rows = slice(self.size, self.size + n)
+        self.frame[rows] = frame_num
+        self.cls[rows] = OBJECT_CLASSES.index(obj)
+        self.track_id[rows] = track_ids
+        self.bbox[rows] = bboxes
+        self.size += n
+
+    def to_table(self):
+        # Same row order as TrackTable.from_tracks: by class, then frame, then insertion
+        order = np.lexsort((self.frame[:self.size], self.cls[:self.size]))
+        table = TrackTable(self.num_frames, self.size)
+        table.frame[:] = self.frame[order]
+        table.cls[:] = self.cls[order]
+        table.track_id[:] = self.track_id[order]
+        table.bbox[:] = self.bbox[order]
+        return table
@@ -0,0 +1,148 @@
+import supervision as sv
+import numpy as np
+import cv2
+
+class TrackPropagator:
+    def __init__(self, detect_every=3, scene_change=0.15, velocity_smoothing=0.3, thumb_size=(32,18)):
+        self.detect_every = detect_every
+        self.scene_change = scene_change
+        self.velocity_smoothing = velocity_smoothing
+        self.thumb_size = thumb_size
+        self.reset()
+
+    def reset(self):
+        self.last_key_frame = None
+        self.last_key_thumb = None
+
+        # One row per box seen on the last detector frame, moved along on the frames after it
+        self.bbox = np.zeros((0,4))
+        self.key_bbox = np.zeros((0,4))
+        self.velocity = np.zeros((0,2))
+        self.class_id = np.zeros(0, dtype=np.int64)
+        self.confidence = np.zeros(0, dtype=np.float32)
+        self.key_frame = np.zeros(0, dtype=np.int64)
+        self.camera_since_key = np.zeros(2)
+
+    def get_thumb(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def get_keyframes(self, frames, start_frame=0):
+        # The detector runs every detect_every frames, or sooner when the picture changes a lot
+        keyframes = np.zeros(len(frames), dtype=bool)
+        for i, frame in enumerate(frames):
+            frame_num = start_frame + i
+            thumb = self.get_thumb(frame)
+
+            if self.last_key_frame is None or frame_num - self.last_key_frame >= self.detect_every:
+                keyframes[i] = True
+            elif np.abs(thumb - self.last_key_thumb).mean()/255 > self.scene_change:
+                keyframes[i] = True
+
+            if keyframes[i]:
+                self.last_key_frame = frame_num
+                self.last_key_thumb = thumb
+
+        return keyframes
+
+    def predict(self, camera_mvmt):
+        # Static points move by -camera_mvmt in the image, players also keep their own velocity
+        camera_mvmt = np.asarray(camera_mvmt, dtype=np.float64)
+        self.camera_since_key += camera_mvmt
+
+        shift = self.velocity - camera_mvmt
+        self.bbox = self.bbox + np.concatenate([shift, shift], axis=1)
+
+        return sv.Detections(xyxy=self.bbox.astype(np.float32), confidence=self.confidence.copy(), class_id=self.class_id.copy())
+
+    def update(self, frame_num, detection_sv, camera_mvmt, skip_class_id=None):
+        # Called on detector frames, every detection is matched to the box predicted for it
+        camera_mvmt = np.asarray(camera_mvmt, dtype=np.float64)
+        self.camera_since_key += camera_mvmt
+
+        if skip_class_id is not None:
+            detection_sv = detection_sv[detection_sv.class_id != skip_class_id]
+
+        bbox = detection_sv.xyxy.astype(np.float64).reshape(-1,4)
+        velocity = np.zeros((len(bbox),2))
+
+        if len(bbox) > 0 and len(self.bbox) > 0:
+            shift = self.velocity - camera_mvmt
+            predicted = self.bbox + np.concatenate([shift, shift], axis=1)
+
+            # Centre distance, gated by the box size so small fast objects like the ball still match
+            centers = (bbox[:,:2] + bbox[:,2:])/2
+            predicted_centers = (predicted[:,:2] + predicted[:,2:])/2
+            cost = np.linalg.norm(centers[:,None] - predicted_centers[None], axis=2)
+            size = np.maximum(bbox[:,2:] - bbox[:,:2], 1).max(axis=1)
+            cost[cost > size[:,None] + 5] = np.inf
+            cost[detection_sv.class_id[:,None] != self.class_id[None]] = np.inf
+
+            for row, prev in greedy_match(cost):
+                previous_center = (self.key_bbox[prev,:2] + self.key_bbox[prev,2:])/2
+                observed = (centers[row] - previous_center + self.camera_since_key)/max(frame_num - self.key_frame[prev], 1)
+                velocity[row] = self.velocity_smoothing*self.velocity[prev] + (1-self.velocity_smoothing)*observed
+
+        self.bbox = bbox
+        self.key_bbox = bbox
+        self.velocity = velocity
+        self.class_id = detection_sv.class_id.copy()
+        self.confidence = detection_sv.confidence.copy()
+        self.key_frame = np.full(len(bbox), frame_num, dtype=np.int64)
+        self.camera_since_key = np.zeros(2)
+
+def greedy_match(cost, max_cost=np.inf):
+    # Pairs (row, col) in order of increasing cost, each row and column used once
+    cost = np.array(cost, dtype=np.float64)
+    pairs = []
+    if cost.size == 0:
+        return pairs
+
+    while True:
+        row, col = np.unravel_index(np.argmin(cost), cost.shape)
+        if not np.isfinite(cost[row,col]) or cost[row,col] > max_cost:
+            break
+        pairs.append((int(row), int(col)))
+        cost[row,:] = np.inf
+        cost[:,col] = np.inf
+
+    return pairs
+
+def box_iou(boxes_1, boxes_2):
+    boxes_1 = np.asarray(boxes_1, dtype=np.float64).reshape(-1,4)
+    boxes_2 = np.asarray(boxes_2, dtype=np.float64).reshape(-1,4)
+    x1 = np.maximum(boxes_1[:,None,0], boxes_2[None,:,0])
+    y1 = np.maximum(boxes_1[:,None,1], boxes_2[None,:,1])
+    x2 = np.minimum(boxes_1[:,None,2], boxes_2[None,:,2])
+    y2 = np.minimum(boxes_1[:,None,3], boxes_2[None,:,3])
+    intersection = np.clip(x2-x1, 0, None)*np.clip(y2-y1, 0, None)
+    area_1 = (boxes_1[:,2]-boxes_1[:,0])*(boxes_1[:,3]-boxes_1[:,1])
+    area_2 = (boxes_2[:,2]-boxes_2[:,0])*(boxes_2[:,3]-boxes_2[:,1])
+    union = area_1[:,None] + area_2[None,:] - intersection
+    return np.where(union > 0, intersection/np.maximum(union, 1e-9), 0)
+
+def compare_tracks(reference, tracks, iou_threshold=0.5):
+    # Per class recall, precision and mean IoU of greedy one to one box matches in every frame
+    report = {}
+    for obj in reference.keys():
+        matched, ref_total, total, iou_sum = 0, 0, 0, 0.0
+        for ref_frame, frame in zip(reference[obj], tracks.get(obj, [])):
+            ref_boxes = [track_info["bbox"] for track_info in ref_frame.values()]
+            boxes = [track_info["bbox"] for track_info in frame.values()]
+            ref_total += len(ref_boxes)
+            total += len(boxes)
+            if len(ref_boxes) == 0 or len(boxes) == 0:
+                continue
+
+            ious = box_iou(ref_boxes, boxes)
+            for i, j in greedy_match(-ious, -iou_threshold):
+                matched += 1
+                iou_sum += ious[i,j]
+
+        report[obj] = {
+            "recall": matched/ref_total if ref_total > 0 else 1.0,
+            "precision": matched/total if total > 0 else 1.0,
+            "mean_iou": iou_sum/matched if matched > 0 else 0.0
+        }
+
+    return report
@@ -0,0 +1,128 @@
+import numpy as np
+
+OBJECT_CLASSES = ["players", "refs", "ball"]
+
+class TrackTable:
+    def __init__(self, num_frames=0, size=0):
+        self.num_frames = num_frames
+
+        # One row per (frame, class, track id), missing values are NaN / 0 / False
+        self.frame = np.zeros(size, dtype=np.int64)
+        self.cls = np.zeros(size, dtype=np.int8)
+        self.track_id = np.zeros(size, dtype=np.int64)
+        self.bbox = np.full((size,4), np.nan)
+        self.position = np.full((size,2), np.nan)
+        self.position_adjusted = np.full((size,2), np.nan)
+        self.transformed_position = np.full((size,2), np.nan)
+        self.speed = np.full(size, np.nan)
+        self.distance = np.full(size, np.nan)
+        self.confidence = np.full(size, np.nan)
+        self.team = np.zeros(size, dtype=np.int8)
+        self.has_ball = np.zeros(size, dtype=bool)
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        frames, classes, track_ids, bboxes, teams, confidences = [], [], [], [], [], []
+        for cls_id, obj in enumerate(OBJECT_CLASSES):
+            for frame_num, track in enumerate(tracks.get(obj, [])):
+                for track_id, track_info in track.items():
+                    frames.append(frame_num)
+                    classes.append(cls_id)
+                    track_ids.append(track_id)
+                    bboxes.append(track_info['bbox'])
+                    teams.append(track_info.get('team', 0))
+                    confidences.append(track_info.get('confidence', np.nan))
+
+        num_frames = max((len(tracks.get(obj, [])) for obj in OBJECT_CLASSES), default=0)
+        table = cls(num_frames, len(frames))
+        if len(frames) > 0:
+            table.frame[:] = frames
+            table.cls[:] = classes
+            table.track_id[:] = track_ids
+            table.bbox[:] = bboxes
+            table.team[:] = teams
+            table.confidence[:] = confidences
+
+        return table
+
+    def class_mask(self, obj):
+        return self.cls == OBJECT_CLASSES.index(obj)
+
+    def keys(self):
+        # Unique int64 key per (class, track id, frame), used for lookups across frames
+        max_id = int(self.track_id.max()) + 1 if len(self) > 0 else 1
+        return (self.cls.astype(np.int64)*max_id + self.track_id)*(self.num_frames+1) + self.frame
+
+    def take(self, mask):
+        table = TrackTable(self.num_frames)
+        for name, column in self.columns().items():
+            setattr(table, name, column[mask])
+        return table
+
+    def append(self, other):
+        for name, column in self.columns().items():
+            setattr(self, name, np.concatenate([column, getattr(other, name)]))
+
+    def replace_class(self, obj, other):
+        table = self.take(~self.class_mask(obj))
+        table.append(other)
+        for name, column in table.columns().items():
+            setattr(self, name, column)
+
+    def columns(self):
+        return {
+            "frame": self.frame,
+            "cls": self.cls,
+            "track_id": self.track_id,
+            "bbox": self.bbox,
+            "position": self.position,
+            "position_adjusted": self.position_adjusted,
+            "transformed_position": self.transformed_position,
+            "speed": self.speed,
+            "distance": self.distance,
+            "confidence": self.confidence,
+            "team": self.team,
+            "has_ball": self.has_ball,
+        }
+
+    def to_tracks(self, team_colors=None):
+        # Adapter producing the nested per-frame dict shape used by the drawing code
+        tracks = {obj: [{} for _ in range(self.num_frames)] for obj in OBJECT_CLASSES}
+
+        bboxes = self.bbox.tolist()
+        positions = self.position.tolist()
+        adjusted = self.position_adjusted.tolist()
+        transformed = self.transformed_position.tolist()
+        speeds = self.speed.tolist()
+        distances = self.distance.tolist()
+        confidences = self.confidence.tolist()
+        teams = self.team.tolist()
+        has_ball = self.has_ball.tolist()
+
+        for row, (frame_num, cls_id, track_id) in enumerate(zip(self.frame.tolist(), self.cls.tolist(), self.track_id.tolist())):
+            track_info = {"bbox": bboxes[row]}
+
+            if not np.isnan(positions[row][0]):
+                track_info["position"] = (int(positions[row][0]), int(positions[row][1]))
+            if not np.isnan(adjusted[row][0]):
+                track_info["position_adjusted"] = tuple(adjusted[row])
+            if not np.isnan(adjusted[row][0]) or not np.isnan(transformed[row][0]):
+                track_info["transformed_position"] = None if np.isnan(transformed[row][0]) else transformed[row]
+            if not np.isnan(speeds[row]):
+                track_info["speed"] = speeds[row]
+                track_info["distance"] = distances[row]
+            if not np.isnan(confidences[row]):
+                track_info["confidence"] = confidences[row]
+            if teams[row] > 0:
+                track_info["team"] = teams[row]
+                if team_colors is not None:
+                    track_info["team_color"] = team_colors[teams[row]]
+            if has_ball[row]:
+                track_info["has_ball"] = True
+
+            tracks[OBJECT_CLASSES[cls_id]][frame_num][track_id] = track_info
+
+        return tracks
@@ -1,20 +1,48 @@
-from ultralytics import YOLO
 import supervision  as sv
 import cv2
 
-import pickle
 import numpy as np
-import pandas as pd
-import os
 import sys
 
 sys.path.append('../')
 from utils import get_center_bbox, get_bbox_width, get_foot
+from result_cache import file_digest
+from inference import load_backend
+from player_ball_assignment import PossessionStats
+from .track_table import TrackTable
+from .track_buffer import TrackBuffer
+from .track_propagator import TrackPropagator
+from .ball_smoother import BallSmoother
+from .multi_scale_detector import MultiScaleDetector, auto_detection_config
 
 class Tracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, detect_every=1, scene_change=0.15, multi_scale=False, batch_sz=None, imgsz=None, backend='ultralytics', threads=None):
+        # A Tracker without a model can still post-process and draw tracks
+        self.model_path = model_path
+        self.backend = backend
+        self.model = load_backend(model_path, backend, threads) if model_path is not None else None
         self.tracker = sv.ByteTrack()
+        self.conf = 0.1
+
+        # batch_sz None is sized for this machine, imgsz None keeps the model's own input size
+        config = auto_detection_config()
+        self.batch_sz = batch_sz if batch_sz is not None else config["batch_sz"]
+        self.imgsz = imgsz
+
+        # Players and referees on a downscaled frame, the ball in full resolution tiles
+        self.multi_scale_detector = None
+        if multi_scale and self.model is not None:
+            self.multi_scale_detector = MultiScaleDetector(self.model, self.conf, self.batch_sz, imgsz if imgsz is not None else config["imgsz"])
+
+        # With detect_every > 1 the detector is skipped on most frames and boxes are propagated instead
+        self.propagator = TrackPropagator(detect_every, scene_change)
+        self.detected_frames = 0
+
+        # Kalman smoother for the ball, in batch over the table or frame by frame when streaming
+        self.ball_smoother = BallSmoother()
+
+        # Columnar copy of the tracks filled while tracking, see get_track_table, None in live mode
+        self.track_buffer = TrackBuffer()
 
     def add_position_to_tracks(self, tracks):
         for obj, obj_tracks in tracks.items():
@@ -29,32 +57,117 @@ class Tracker:
                     tracks[obj][frame_num][track_id]['position'] = position
 
 
-    def interpolate_ball(self, ball_positions):
-        ball_positions = [x.get(1,{}).get('bbox', []) for x in ball_positions]
-        ball_df = pd.DataFrame(ball_positions, columns=['x1','y1','x2','y2'])
+    def add_position_to_table(self, table):
+        bbox = table.bbox
+        table.position[:,0] = np.trunc((bbox[:,0]+bbox[:,2])/2)
+        table.position[:,1] = np.where(table.class_mask('ball'), np.trunc((bbox[:,1]+bbox[:,3])/2), np.trunc(bbox[:,3]))
 
-        ball_df = ball_df.interpolate()
-        ball_df = ball_df.bfill()
+    def interpolate_ball(self, ball_positions):
+        frames = [frame_num for frame_num, x in enumerate(ball_positions) if 1 in x]
+        bboxes = [ball_positions[frame_num][1]['bbox'] for frame_num in frames]
+        smoothed, confidence = self.ball_smoother.smooth(len(ball_positions), frames, np.array(bboxes).reshape(-1,4))
 
-        ball_positions = [{1: {"bbox":x}} for x in ball_df.to_numpy().tolist()]
+        ball_positions = [{1: {"bbox":bbox, "confidence":conf}} for bbox, conf in zip(smoothed.tolist(), confidence.tolist())]
         return ball_positions
     
+    def interpolate_ball_table(self, table):
+        ball = table.take(table.class_mask('ball'))
+        if len(ball) == 0:
+            return
+
+        # Outliers are gated out, gaps filled by the smoother and held before the first and after the last detection
+        smoothed, confidence = self.ball_smoother.smooth(table.num_frames, ball.frame, ball.bbox)
+        interpolated = TrackTable(table.num_frames, table.num_frames)
+        interpolated.frame[:] = np.arange(table.num_frames)
+        interpolated.cls[:] = ball.cls[0]
+        interpolated.track_id[:] = 1
+        interpolated.bbox[:] = smoothed
+        interpolated.confidence[:] = confidence
+
+        table.replace_class('ball', interpolated)
+
     def detect_frames(self, frames):
-        batch_sz = 20
         detections = []
-        for i in range(0,len(frames), batch_sz):
-            detections_batch = self.model.predict(frames[i:i+batch_sz],conf=0.1)
+        for i in range(0,len(frames), self.batch_sz):
+            detections_batch = self.model.detect(frames[i:i+self.batch_sz], self.conf, self.imgsz)
             detections += detections_batch
         return detections
 
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
+    def detect_chunk(self, frames, keyframes=None, start_frame=0):
+        # Only keyframes go through the model, rows keep their frame index inside the chunk
+        rows = np.arange(len(frames)) if keyframes is None else np.flatnonzero(keyframes)
+        detect_frames = [frames[i] for i in rows]
+        self.detected_frames += len(rows)
+
+        if self.multi_scale_detector is not None:
+            detections = self.multi_scale_detector.detect(detect_frames, (start_frame + rows).tolist())
+        else:
+            detections = self.detect_frames(detect_frames)
+
+        arrays = self.detections_to_arrays(detections)
+        arrays["frame"] = rows[arrays["frame"]].astype(np.int32)
+        return arrays
+
+    def detections_to_arrays(self, detections):
+        # Flat columns for a chunk of frames, rows sorted by frame
+        frames, xyxy, confidence, class_id = [], [], [], []
+        for frame_num, detection_sv in enumerate(detections):
+            frames.append(np.full(len(detection_sv), frame_num, dtype=np.int32))
+            xyxy.append(detection_sv.xyxy.astype(np.float32))
+            confidence.append(detection_sv.confidence.astype(np.float32))
+            class_id.append(detection_sv.class_id.astype(np.int64))
+
+        return {
+            "frame": np.concatenate(frames) if len(frames) > 0 else np.zeros(0, dtype=np.int32),
+            "xyxy": np.concatenate(xyxy).reshape(-1,4) if len(xyxy) > 0 else np.zeros((0,4), dtype=np.float32),
+            "confidence": np.concatenate(confidence) if len(confidence) > 0 else np.zeros(0, dtype=np.float32),
+            "class_id": np.concatenate(class_id) if len(class_id) > 0 else np.zeros(0, dtype=np.int64)
+        }
 
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path, 'rb') as f:
-                tracks = pickle.load(f)
-                return tracks
-            
-        detections = self.detect_frames(frames)
+    def arrays_to_detections(self, arrays, num_frames):
+        bounds = np.searchsorted(arrays["frame"], np.arange(num_frames+1)).tolist()
+        return [
+            sv.Detections(
+                xyxy=np.array(arrays["xyxy"][start:end]),
+                confidence=np.array(arrays["confidence"][start:end]),
+                class_id=np.array(arrays["class_id"][start:end])
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def get_object_tracks(self, frames, cache=None, video_path=None, chunk_size=100, camera_mvmt_frame=None):
+        chunks = (frames[i:i+chunk_size] for i in range(0, len(frames), chunk_size))
+        return self.get_object_tracks_chunks(chunks, cache=cache, video_path=video_path, camera_mvmt_frame=camera_mvmt_frame)
+
+    def get_object_tracks_chunks(self, chunks, cache=None, video_path=None, camera_mvmt_frame=None):
+        # camera_mvmt_frame is only used to propagate boxes when detect_every > 1
+        # Tracking state starts over, so one Tracker and its loaded model can go through several videos
+        adaptive = self.propagator.detect_every > 1
+        self.tracker = sv.ByteTrack()
+        self.detected_frames = 0
+        self.propagator.reset()
+        self.track_buffer = TrackBuffer()
+        if self.multi_scale_detector is not None:
+            self.multi_scale_detector.reset()
+
+        # Detections are cached per chunk, tracking is cheap and always re-run over them
+        key = None
+        cls_names = None
+        if cache is not None and video_path is not None:
+            params = dict(conf=self.conf, imgsz=self.imgsz)
+            if self.backend != 'ultralytics':
+                params.update(backend=self.backend)
+            if self.multi_scale_detector is not None:
+                detector = self.multi_scale_detector
+                # The ball is extrapolated within each detection batch, so the batch size changes the results
+                params.update(multi_scale=True, imgsz=detector.imgsz, tile_size=detector.tile_size, full_imgsz=detector.full_imgsz, max_gap=detector.max_gap, batch_sz=self.batch_sz)
+            if adaptive:
+                params.update(detect_every=self.propagator.detect_every, scene_change=self.propagator.scene_change)
+            stage = "detections_adaptive" if adaptive else "detections"
+            key = cache.stage_key(stage, video=file_digest(video_path), model=file_digest(self.model_path, sample_size=None), **params)
+            meta = cache.get_meta(key)
+            if meta is not None:
+                cls_names = {int(k): v for k, v in meta["names"].items()}
 
         tracks={
             "players":[],
@@ -62,45 +175,84 @@ class Tracker:
             "ball":[]
         }
 
-        for frame_num, detection in enumerate(detections):
-            cls_names = detection.names
-            cls_names_inv = {v:k for k,v in cls_names.items()}
+        # Only one chunk of frames and its detections are alive at a time
+        start_frame = 0
+        for chunk in chunks:
+            keyframes = self.propagator.get_keyframes(chunk, start_frame) if adaptive else None
+
+            arrays = None
+            if key is not None:
+                arrays = cache.get_chunk(key, start_frame, len(chunk)) if cls_names is not None else cache.miss()
+
+            # The ball search carries state across chunks, so a cached chunk also restores it
+            detector = self.multi_scale_detector
+            if arrays is not None and detector is not None:
+                if "detector_state" in arrays:
+                    detector.set_state(arrays["detector_state"])
+                else:
+                    arrays = None
+
+            if arrays is None:
+                arrays = self.detect_chunk(chunk, keyframes, start_frame)
+                cls_names = self.model.names
+                if detector is not None:
+                    arrays["detector_state"] = detector.get_state()
+                if key is not None:
+                    cache.put_meta(key, {"names": cls_names})
+                    cache.put_chunk(key, start_frame, len(chunk), arrays)
+
+            self.add_detections_to_tracks(tracks, self.arrays_to_detections(arrays, len(chunk)), cls_names, keyframes, camera_mvmt_frame)
+            start_frame += len(chunk)
 
-            detection_sv = sv.Detections.from_ultralytics(detection)
-
-            # Convert Goalkeeper to player
-            for object_ind, class_id in enumerate(detection_sv.class_id):
-                if cls_names[class_id] == "goalkeeper":
-                    detection_sv.class_id[object_ind] = cls_names_inv["player"]
-
-            # Track objects
-            detection_tracks = self.tracker.update_with_detections(detection_sv)
-
-            tracks["players"].append({})
-            tracks["refs"].append({})
-            tracks["ball"].append({})
+        return tracks
 
-            for frame_detection in detection_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
+    def get_track_table(self):
+        # Same table as TrackTable.from_tracks on the tracks returned by get_object_tracks
+        return self.track_buffer.to_table()
 
-                if cls_id == cls_names_inv["player"]:
-                    tracks["players"][frame_num][track_id] = {"bbox":bbox}
+    def add_detections_to_tracks(self, tracks, detections, cls_names, keyframes=None, camera_mvmt_frame=None, start_frame=0):
+        # tracks and camera_mvmt_frame may hold only a batch, start_frame is the video frame of its first entry
+        # Class ids are looked up once, not per frame or per object
+        cls_names_inv = {v:k for k,v in cls_names.items()}
+        player_id = cls_names_inv["player"]
+        referee_id = cls_names_inv["referee"]
+        ball_id = cls_names_inv["ball"]
+        goalkeeper_id = cls_names_inv.get("goalkeeper")
 
-                if cls_id == cls_names_inv["referee"]:
-                    tracks["refs"][frame_num][track_id] = {"bbox":bbox}
+        for i, detection_sv in enumerate(detections):
+            frame_num = len(tracks["players"])
+            camera_mvmt = camera_mvmt_frame[frame_num] if camera_mvmt_frame is not None else [0,0]
 
-            for frame_detection in detection_sv:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
+            # Between detector frames the last tracked boxes are moved along instead
+            if keyframes is not None and not keyframes[i]:
+                detection_sv = self.propagator.predict(camera_mvmt)
 
-                if cls_id == cls_names_inv["ball"]:
-                    tracks["ball"][frame_num][1] = {"bbox":bbox}
+            # Convert Goalkeeper to player
+            if goalkeeper_id is not None:
+                detection_sv.class_id[detection_sv.class_id == goalkeeper_id] = player_id
 
-        if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(tracks, f)
+            # Track objects
+            detection_tracks = self.tracker.update_with_detections(detection_sv)
+            if keyframes is not None and keyframes[i]:
+                # The ball is not propagated, the gaps are interpolated between detector frames later
+                self.propagator.update(start_frame + frame_num, detection_sv, camera_mvmt, ball_id)
+
+            for obj, cls_id in [("players", player_id), ("refs", referee_id)]:
+                mask = detection_tracks.class_id == cls_id
+                track_ids = detection_tracks.tracker_id[mask]
+                bboxes = detection_tracks.xyxy[mask]
+                tracks[obj].append(dict(zip(track_ids.tolist(), ({"bbox": bbox} for bbox in bboxes.tolist()))))
+                if self.track_buffer is not None:
+                    self.track_buffer.append(start_frame + frame_num, obj, track_ids, bboxes)
+
+            # Only the most confident ball candidate is kept
+            balls = np.flatnonzero(detection_sv.class_id == ball_id)
+            tracks["ball"].append({})
+            if len(balls) > 0:
+                ball = balls[np.argmax(detection_sv.confidence[balls])] if detection_sv.confidence is not None else balls[-1]
+                tracks["ball"][frame_num][1] = {"bbox": detection_sv.xyxy[ball].tolist()}
+                if self.track_buffer is not None:
+                    self.track_buffer.append(start_frame + frame_num, "ball", [1], detection_sv.xyxy[ball][None])
 
         return tracks
     
@@ -175,20 +327,27 @@ class Tracker:
         alpha = 0.4
         cv2.addWeighted(overlay, alpha, frame, 1-alpha, 0, frame)
 
-        team_control_now = ball_control[:frame_num+1]
+        # ball_control is PossessionStats, built once by draw, so this is a lookup instead of a slice per frame
+        if not isinstance(ball_control, PossessionStats):
+            ball_control = PossessionStats(ball_control)
 
-        team_1_control = team_control_now[team_control_now==1].shape[0]
-        team_1_perc = team_1_control/(frame_num+1)*100
-        team_2_perc = 100-team_1_perc
+        # Frames before anyone had the ball (team 0) are left out
+        team_1_control, team_2_control = ball_control.counts(frame_num)
+        controlled = max(team_1_control+team_2_control, 1)
+        team_1_perc = team_1_control/controlled*100
+        team_2_perc = team_2_control/controlled*100
 
         cv2.putText(frame, f"Team 1 Ball Control: {team_1_perc:.2f}%", (1400,900),cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
         cv2.putText(frame, f"Team 2 Ball Control: {team_2_perc:.2f}%", (1400,950),cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
 
         return frame
     
-    def draw(self, frames, tracks, ball_control):
+    def draw(self, frames, tracks, ball_control, start_frame=0):
+        if not isinstance(ball_control, PossessionStats):
+            ball_control = PossessionStats(ball_control)
+
         out_frames = []
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start_frame):
             frame = frame.copy()
 
             player_dict = tracks["players"][frame_num]
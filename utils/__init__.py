@@ -1,2 +1,3 @@
-from .video_utils import read_video, save_video
+from .video_utils import read_video, read_video_chunks, read_first_frame, get_video_fps, save_video, save_video_chunks
+from .video_writer import VideoWriter, ffmpeg_available, get_video_size
 from .bbox_utils import get_bbox_width, get_center_bbox, measure_distance, measure_xy_distance, get_foot
\ No newline at end of file
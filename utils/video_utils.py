@@ -1,4 +1,5 @@
 import cv2
+from .video_writer import VideoWriter
 
 def read_video(path):
     cap = cv2.VideoCapture(path)
@@ -10,9 +11,57 @@ def read_video(path):
         frames.append(frame)
     return frames
 
-def save_video(frames, path):
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(path, fourcc, 24, (frames[0].shape[1], frames[0].shape[0]))
-    for frame in frames:
-        out.write(frame)
-    out.release()
\ No newline at end of file
+def read_video_chunks(path, chunk_size=100, start_frame=0, end_frame=None):
+    # Yield lists of at most chunk_size frames so only one chunk is decoded at a time,
+    # from start_frame up to end_frame or the end of the video
+    cap = cv2.VideoCapture(path)
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frame_num = start_frame
+    chunk = []
+    while end_frame is None or frame_num < end_frame:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        chunk.append(frame)
+        frame_num += 1
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    cap.release()
+
+    if len(chunk) > 0:
+        yield chunk
+
+def read_first_frame(path):
+    cap = cv2.VideoCapture(path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        return None
+    return frame
+
+def get_video_fps(path, default=24):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps > 0 else default
+
+def save_video(frames, path, fps=24, codec='XVID', source_path=None):
+    # frames can be any iterable, they are encoded in the background while the next ones are produced
+    if source_path is not None:
+        writer = VideoWriter.from_source(path, source_path, codec)
+    else:
+        writer = VideoWriter(path, fps, codec=codec)
+    try:
+        for frame in frames:
+            writer.write(frame)
+    finally:
+        stats = writer.close()
+
+    print(f"Encoded {stats['frames']} frames with {stats['codec']} at {stats['encode_fps']:.1f} fps")
+    return stats
+
+def save_video_chunks(chunks, path, fps=24, codec='XVID', source_path=None):
+    # Encode chunks as they are produced instead of collecting every frame first
+    return save_video((frame for chunk in chunks for frame in chunk), path, fps, codec, source_path)
\ No newline at end of file
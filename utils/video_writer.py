@@ -0,0 +1,138 @@
+import cv2
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+def get_video_size(path):
+    cap = cv2.VideoCapture(path)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    return size if size[0] > 0 and size[1] > 0 else None
+
+class VideoWriter():
+    def __init__(self, path, fps=24, frame_size=None, codec='XVID', queue_size=32, threaded=True):
+        # codec is an OpenCV fourcc such as 'XVID', 'MJPG' or 'mp4v', or 'ffmpeg' to pipe raw frames into ffmpeg
+        if codec == 'ffmpeg' and not ffmpeg_available():
+            codec = 'mp4v' if path.lower().endswith(('.mp4', '.mov')) else 'XVID'
+            print(f"ffmpeg not found, falling back to {codec}")
+
+        self.path = path
+        self.fps = fps
+        self.frame_size = frame_size
+        self.codec = codec
+
+        self.out = None
+        self.process = None
+        self.frames = 0
+        self.encode_time = 0.0
+        self.error = None
+
+        # Frames are encoded on a background thread so the caller can keep annotating
+        self.queue = queue.Queue(maxsize=queue_size) if threaded else None
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def from_source(cls, path, source_path, codec='XVID', **kwargs):
+        # Same fps and resolution as the input container
+        cap = cv2.VideoCapture(source_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        return cls(path, fps if fps > 0 else 24, get_video_size(source_path), codec, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self, frame):
+        if self.frame_size is None:
+            self.frame_size = (frame.shape[1], frame.shape[0])
+
+        if self.codec == 'ffmpeg':
+            command = [
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                '-s', f'{self.frame_size[0]}x{self.frame_size[1]}', '-r', str(self.fps),
+                '-i', '-',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                self.path
+            ]
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*self.codec)
+            self.out = cv2.VideoWriter(self.path, fourcc, self.fps, self.frame_size)
+
+    def encode(self, frame):
+        t = time.perf_counter()
+        if self.out is None and self.process is None:
+            self.open(frame)
+
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size)
+
+        if self.process is not None:
+            self.process.stdin.write(frame.tobytes())
+        else:
+            self.out.write(frame)
+
+        self.frames += 1
+        self.encode_time += time.perf_counter() - t
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.encode(frame)
+            except Exception as e:
+                self.error = e
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+
+        if self.queue is None:
+            self.encode(frame)
+        else:
+            # The frame is encoded later, so the caller must not modify it again.
+            # Blocks when the encoder falls behind, which bounds memory
+            self.queue.put(frame)
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+        if self.out is not None:
+            self.out.release()
+            self.out = None
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+        if self.error is not None:
+            raise self.error
+
+        return self.stats()
+
+    def stats(self):
+        return {
+            "codec": self.codec,
+            "frames": self.frames,
+            "encode_time": self.encode_time,
+            "encode_fps": self.frames/self.encode_time if self.encode_time > 0 else 0.0
+        }
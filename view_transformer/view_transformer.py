@@ -1,17 +1,29 @@
 import numpy as np
+import json
 import cv2
 
+# Pixel corners of the visible pitch section for the default camera and their size in metres
+DEFAULT_CALIBRATION = {
+    "pixel_vertices": [
+        [110,1035],
+        [265,275],
+        [910,260],
+        [1640,915]
+    ],
+    "court_width": 68,
+    "court_length": 23.32
+}
+
 class ViewTransformer():
-    def __init__(self):
-        court_width = 68
-        court_length = 23.32
-
-        self.pixel_vertices = np.array([
-            [110,1035],
-            [265,275],
-            [910,260],
-            [1640,915]
-        ])
+    def __init__(self, pixel_vertices=None, court_width=None, court_length=None):
+        if pixel_vertices is None:
+            pixel_vertices = DEFAULT_CALIBRATION["pixel_vertices"]
+        if court_width is None:
+            court_width = DEFAULT_CALIBRATION["court_width"]
+        if court_length is None:
+            court_length = DEFAULT_CALIBRATION["court_length"]
+
+        self.pixel_vertices = np.array(pixel_vertices)
 
         self.target_vertices = np.array([
             [0,court_width],
@@ -25,26 +37,72 @@ class ViewTransformer():
 
         self.perspective_transformer = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
 
+    @classmethod
+    def from_calibration_file(cls, path, camera="default"):
+        # The file maps camera names to {"pixel_vertices", "court_width", "court_length"}
+        with open(path, 'r') as f:
+            calibration = json.load(f)[camera]
+
+        return cls(
+            calibration["pixel_vertices"],
+            calibration.get("court_width"),
+            calibration.get("court_length")
+        )
+
+    def points_inside(self, points):
+        # Same test as cv2.pointPolygonTest(...) >= 0 on integer points, for every point at once
+        points = np.trunc(points)
+        x, y = points[:,0:1], points[:,1:2]
+
+        x1, y1 = self.pixel_vertices[:,0], self.pixel_vertices[:,1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+        cross = (x2-x1)*(y-y1) - (y2-y1)*(x-x1)
+        on_edge = (cross == 0) & (x >= np.minimum(x1,x2)) & (x <= np.maximum(x1,x2)) & (y >= np.minimum(y1,y2)) & (y <= np.maximum(y1,y2))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = ((y1 > y) != (y2 > y)) & (x < (x2-x1)*(y-y1)/(y2-y1) + x1)
+
+        return (crosses.sum(axis=1) % 2 == 1) | on_edge.any(axis=1)
+
+    def transform_points(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1,2)
+        transformed_pts = np.full(points.shape, np.nan)
+
+        rows = np.flatnonzero(~np.isnan(points).any(axis=1))
+        rows = rows[self.points_inside(points[rows])]
+        if len(rows) == 0:
+            return transformed_pts
+
+        reshaped_pts = points[rows].reshape(-1,1,2).astype(np.float32)
+        transformed_pts[rows] = cv2.perspectiveTransform(reshaped_pts, self.perspective_transformer).reshape(-1,2)
+
+        return transformed_pts
+
     def transform_point(self, p):
-        pt = (int(p[0]), int(p[1]))
-        is_inside = cv2.pointPolygonTest(self.pixel_vertices, pt, False) >=0
-        if not is_inside:
+        transformed_pt = self.transform_points(p)
+        if np.isnan(transformed_pt).any():
             return None
-        
-        reshaped_pt = p.reshape(-1,1,2).astype(np.float32)
-        transformed_pt = cv2.perspectiveTransform(reshaped_pt, self.perspective_transformer)
 
-        return transformed_pt.reshape(-1,2) 
+        return transformed_pt
 
 
     def add_transform_to_tracks(self, tracks):
+        track_refs = []
+        positions = []
         for obj, obj_tracks in tracks.items():
             for frame_num, track in enumerate(obj_tracks):
                 for id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    transformed_pos = self.transform_point(position)
+                    track_refs.append(track_info)
+                    positions.append(track_info['position_adjusted'])
+
+        # One point-in-polygon test and one homography over the whole video
+        transformed_pts = self.transform_points(np.array(positions, dtype=np.float64).reshape(-1,2))
+
+        for track_info, transformed_pos in zip(track_refs, transformed_pts.tolist()):
+            if np.isnan(transformed_pos[0]):
+                transformed_pos = None
+            track_info['transformed_position'] = transformed_pos
 
-                    if transformed_pos is not None:
-                        transformed_pos = transformed_pos.squeeze().tolist()
-                    tracks[obj][frame_num][id]['transformed_position'] = transformed_pos
\ No newline at end of file
+    def add_transform_to_table(self, table):
+        table.transformed_position = self.transform_points(table.position_adjusted)
\ No newline at end of file